@@ -10,6 +10,7 @@ from odoo.tools.translate import _
 from odoo.exceptions import UserError
 import odoo.addons.decimal_precision as dp
 from odoo.tools import float_is_zero
+from odoo.osv import expression
 
 
 class AccountVatPeriodEndStatement(models.Model):
@@ -592,16 +593,12 @@ class AccountVatPeriodEndStatement(models.Model):
             credit_line_ids, debit_line_ids = self._get_credit_debit_lines(
                 statement)
 
-            for debit_line in statement.debit_vat_account_line_ids:
-                debit_line.unlink()
-            for credit_line in statement.credit_vat_account_line_ids:
-                credit_line.unlink()
-            for debit_vals in debit_line_ids:
-                debit_vals.update({'statement_id': statement.id})
-                debit_line_model.create(debit_vals)
-            for credit_vals in credit_line_ids:
-                credit_vals.update({'statement_id': statement.id})
-                credit_line_model.create(credit_vals)
+            statement.debit_vat_account_line_ids.unlink()
+            statement.credit_vat_account_line_ids.unlink()
+            for vals in debit_line_ids + credit_line_ids:
+                vals.update({'statement_id': statement.id})
+            debit_line_model.create(debit_line_ids)
+            credit_line_model.create(credit_line_ids)
 
             interest_amount = 0.0
             # if exits Delete line with interest
@@ -621,28 +618,95 @@ class AccountVatPeriodEndStatement(models.Model):
                 statement.interests_debit_vat_amount = interest_amount
         return True
 
-    def _set_debit_lines(self, debit_tax, debit_line_ids, statement):
-        total = 0.0
-        for period in statement.date_range_ids:
-            total += debit_tax._compute_totals_tax({
-                'from_date': period.date_start,
-                'to_date': period.date_end,
-                'registry_type': 'customer',
-            })[3]  # position 3 is deductible part
+    def _get_taxes_balance(self, taxes, statement):
+        """
+        Compute, with a single query, the balance of the tax lines
+        of `taxes` in all the periods of `statement`,
+        as the field `balance` of `account.tax` would do for each period.
+
+        :return: dictionary {tax ID: balance}
+        """
+        res = dict.fromkeys(taxes.ids, 0.0)
+        periods = statement.date_range_ids
+        if not taxes or not periods:
+            return res
+        tax = taxes[0]
+        from_date, to_date, company_ids, target_move = \
+            tax.get_context_values()
+        state_list = tax.get_target_state_list(target_move)
+        type_list = tax.get_target_type_list()
+        # Dates are the ones of the statement periods
+        domain = expression.OR([
+            tax.get_move_line_partial_domain(
+                period.date_start, period.date_end, company_ids)
+            for period in periods
+        ])
+        # Taxes are filtered in the query
+        domain = expression.AND([domain, [
+            leaf for leaf in tax.get_balance_domain(state_list, type_list)
+            if leaf != ('tax_line_id', '=', tax.id)
+        ]])
+        move_line_model = self.env['account.move.line']
+        query = move_line_model._where_calc(domain)
+        move_line_model._apply_ir_rules(query, 'read')
+        from_clause, where_clause, where_params = query.get_sql()
+        self.env.cr.execute("""
+            SELECT account_move_line.tax_line_id,
+                SUM(account_move_line.balance)
+            FROM {from_clause}
+            WHERE {where_clause}
+                AND account_move_line.tax_line_id IN %s
+            GROUP BY account_move_line.tax_line_id
+        """.format(
+            from_clause=from_clause,
+            where_clause=where_clause,
+        ), where_params + [tuple(taxes.ids)])
+        for tax_id, balance in self.env.cr.fetchall():
+            # VAT on sales (credit) - VAT on purchases (debit)
+            res[tax_id] = -float(balance or 0.0)
+        return res
+
+    def _get_tax_deductible_amount(self, tax, registry_type, balances):
+        """
+        Deductible part of `tax`, computed from `balances`
+        as `account.tax._compute_totals_tax` does.
+        """
+        if not tax.children_tax_ids:
+            deductible = balances.get(tax.id, 0.0)
+        else:
+            deductible = 0.0
+            for child in tax.children_tax_ids:
+                if child.cee_type and child.cee_type != {
+                    'customer': 'sale',
+                    'supplier': 'purchase',
+                }.get(registry_type):
+                    continue
+                if child.account_id:
+                    deductible += balances.get(child.id, 0.0)
+        if registry_type == 'supplier':
+            deductible = -deductible
+        return deductible
+
+    def _set_debit_lines(self, debit_tax, debit_line_ids, statement,
+                         balances=None):
+        if balances is None:
+            balances = self._get_taxes_balance(
+                debit_tax | debit_tax.children_tax_ids, statement)
+        total = self._get_tax_deductible_amount(
+            debit_tax, 'customer', balances)
         debit_line_ids.append({
             'account_id': debit_tax.vat_statement_account_id.id,
             'tax_id': debit_tax.id,
             'amount': total,
         })
 
-    def _set_credit_lines(self, credit_tax, credit_line_ids, statement):
-        total = 0.0
-        for period in statement.date_range_ids:
-            total += credit_tax._compute_totals_tax({
-                'from_date': period.date_start,
-                'to_date': period.date_end,
-                'registry_type': 'supplier',
-            })[3]  # position 3 is deductible part
+    def _set_credit_lines(self, credit_tax, credit_line_ids, statement,
+                          balances=None):
+        if balances is None:
+            balances = self._get_taxes_balance(
+                credit_tax | credit_tax.children_tax_ids, statement)
+        total = self._get_tax_deductible_amount(
+            credit_tax, 'supplier', balances)
         credit_line_ids.append({
             'account_id': credit_tax.vat_statement_account_id.id,
             'tax_id': credit_tax.id,
@@ -657,27 +721,36 @@ class AccountVatPeriodEndStatement(models.Model):
             ('vat_statement_account_id', '!=', False),
             ('type_tax_use', 'in', ['sale', 'purchase']),
         ])
+        if statement.account_ids:
+            taxes = taxes.filtered(
+                lambda t: t.vat_statement_account_id in statement.account_ids)
+        # Balances of all the taxes in all the periods are read at once
+        all_taxes = taxes | taxes.mapped('children_tax_ids') \
+            | taxes.mapped('children_tax_ids.children_tax_ids')
+        balances = self._get_taxes_balance(all_taxes, statement)
         for tax in taxes:
-            if (tax.vat_statement_account_id.id in statement.account_ids.ids
-                    or not statement.account_ids):
-                # se ho una tassa padre con figli cee_type, condidero le figlie
-                if any(tax_ch for tax_ch in tax.children_tax_ids
-                       if tax_ch.cee_type in ('sale', 'purchase')):
-
-                    for tax_ch in tax.children_tax_ids:
-                        if tax_ch.cee_type == 'sale':
-                            self._set_debit_lines(tax_ch,
-                                                  debit_line_ids,
-                                                  statement)
-                        elif tax_ch.cee_type == 'purchase':
-                            self._set_credit_lines(tax_ch,
-                                                   credit_line_ids,
-                                                   statement)
-
-                elif tax.type_tax_use == 'sale':
-                    self._set_debit_lines(tax, debit_line_ids, statement)
-                elif tax.type_tax_use == 'purchase':
-                    self._set_credit_lines(tax, credit_line_ids, statement)
+            # se ho una tassa padre con figli cee_type, condidero le figlie
+            if any(tax_ch for tax_ch in tax.children_tax_ids
+                   if tax_ch.cee_type in ('sale', 'purchase')):
+
+                for tax_ch in tax.children_tax_ids:
+                    if tax_ch.cee_type == 'sale':
+                        self._set_debit_lines(tax_ch,
+                                              debit_line_ids,
+                                              statement,
+                                              balances=balances)
+                    elif tax_ch.cee_type == 'purchase':
+                        self._set_credit_lines(tax_ch,
+                                               credit_line_ids,
+                                               statement,
+                                               balances=balances)
+
+            elif tax.type_tax_use == 'sale':
+                self._set_debit_lines(
+                    tax, debit_line_ids, statement, balances=balances)
+            elif tax.type_tax_use == 'purchase':
+                self._set_credit_lines(
+                    tax, credit_line_ids, statement, balances=balances)
 
         return credit_line_ids, debit_line_ids
 
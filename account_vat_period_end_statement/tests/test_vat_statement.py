@@ -361,3 +361,36 @@ class TestTax(TransactionCase):
             other_statement.previous_credit_vat_amount,
             -other_last_year_statement.authority_vat_amount,
         )
+
+    def test_statement_lines_amounts(self):
+        """
+        Amounts of the Statement Lines
+        are the deductible amounts of their Taxes in the Statement periods.
+        """
+        partner = self.env.ref('base.res_partner_4')
+        tax = self.account_tax_22_credit
+        other_tax = tax.copy()
+        self._create_vendor_bill(
+            partner, self.last_year_recent_date, 10, tax)
+        self._create_vendor_bill(
+            partner, self.last_year_recent_date, 20, tax)
+        self._create_vendor_bill(
+            partner, self.last_year_recent_date, 50, other_tax)
+
+        statement = self._get_statement(
+            self.last_year_period,
+            self.last_year_date,
+            tax.vat_statement_account_id,
+        )
+        credit_lines = statement.credit_vat_account_line_ids
+        self.assertEqual(credit_lines.mapped('tax_id'), tax | other_tax)
+        for line in credit_lines:
+            expected_amount = sum(
+                line.tax_id._compute_totals_tax({
+                    'from_date': period.date_start,
+                    'to_date': period.date_end,
+                    'registry_type': 'supplier',
+                })[3]
+                for period in statement.date_range_ids)
+            self.assertAlmostEqual(line.amount, expected_amount)
+        self.assertAlmostEqual(sum(credit_lines.mapped('amount')), 17.6)
@@ -2,10 +2,38 @@
 # Copyright 2019 Openforce Srls Unipersonale (www.openforce.it)
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
+from collections import defaultdict
+
 from odoo import _, api, fields, models
 from odoo.exceptions import UserError
 
 
+class FiscalYearIndex(object):
+    """
+    Retrieves fiscal years by date without querying the database,
+    from a set of fiscal years loaded at once.
+    """
+
+    def __init__(self, fiscal_years):
+        self.fiscal_years = fiscal_years
+        self.by_company = defaultdict(list)
+        for fiscal_year in fiscal_years.sorted('date_from'):
+            self.by_company[fiscal_year.company_id].append(fiscal_year)
+
+    def get(self, date, company, miss_raise=True):
+        """
+        Same as `account.fiscal.year.get_fiscal_year_by_date` for a single
+        fiscal year of ``company``.
+        """
+        for fiscal_year in self.by_company[company]:
+            if fiscal_year.date_from <= date <= fiscal_year.date_to:
+                return fiscal_year
+        if miss_raise:
+            date_str = fields.Date.to_string(date)
+            raise UserError(_("No fiscal year defined for date ") + date_str)
+        return self.fiscal_years.browse()
+
+
 class AccountFiscalYear(models.Model):
     _inherit = 'account.fiscal.year'
 
@@ -37,3 +65,13 @@ class AccountFiscalYear(models.Model):
         if company:
             domain.append(('company_id', 'in', company.ids))
         return domain
+
+    @api.model
+    def get_fiscal_year_index(self, companies):
+        """
+        Loads the fiscal years of ``companies`` with a single search, to be
+        retrieved by date with the returned ``FiscalYearIndex``.
+        """
+        return FiscalYearIndex(
+            self.search([('company_id', 'in', companies.ids)])
+        )
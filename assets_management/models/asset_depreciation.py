@@ -2,6 +2,8 @@
 # Copyright 2019 Openforce Srls Unipersonale (www.openforce.it)
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
+from collections import OrderedDict
+
 from odoo import _, api, fields, models
 from odoo.exceptions import ValidationError
 from odoo.tools import float_compare, float_is_zero
@@ -327,22 +329,13 @@ class AssetDepreciation(models.Model):
         # Set new date within context if necessary
         self.check_before_generate_depreciation_lines(dep_date)
 
-        new_lines = self.env['asset.depreciation.line']
-        for dep in self:
-            new_lines |= dep.generate_depreciation_lines_single(dep_date)
-
-        return new_lines
+        vals_list = self.prepare_depreciation_lines_vals(dep_date)
+        return self.env['asset.depreciation.line'].create(vals_list)
 
     def generate_depreciation_lines_single(self, dep_date):
         self.ensure_one()
-
-        dep_nr = self.get_max_depreciation_nr() + 1
-        dep = self.with_context(dep_nr=dep_nr, used_asset=self.asset_id.used)
-        dep_amount = dep.get_depreciation_amount(dep_date)
-        dep = dep.with_context(dep_amount=dep_amount)
-
-        vals = dep.prepare_depreciation_line_vals(dep_date)
-        return self.env['asset.depreciation.line'].create(vals)
+        vals_list = self.prepare_depreciation_lines_vals(dep_date)
+        return self.env['asset.depreciation.line'].create(vals_list)
 
     def generate_dismiss_account_move(self):
         self.ensure_one()
@@ -388,6 +381,30 @@ class AssetDepreciation(models.Model):
 
         return vals
 
+    def get_depreciable_amounts(self, dep_date=None):
+        """
+        Returns dict {depreciation id: depreciable amount} for every
+        depreciation in `self`, reading the lines' balances with a single
+        query
+        """
+        line_obj = self.env['asset.depreciation.line']
+        domain = [
+            ('depreciation_id', 'in', self.ids),
+            ('move_type', 'in', line_obj.get_update_move_types()),
+        ]
+        if dep_date:
+            domain.append(('date', '<=', dep_date))
+        balances = {
+            group['depreciation_id'][0]: group['balance']
+            for group in line_obj.read_group(
+                domain, ['depreciation_id', 'balance'], ['depreciation_id']
+            )
+        }
+        return {
+            dep.id: dep.amount_depreciable + balances.get(dep.id, 0.0)
+            for dep in self
+        }
+
     def get_depreciable_amount(self, dep_date=None):
         types = self.line_ids.get_update_move_types()
         return self.amount_depreciable + sum([
@@ -395,15 +412,24 @@ class AssetDepreciation(models.Model):
             if l.move_type in types and (not dep_date or l.date <= dep_date)
         ])
 
-    def get_depreciation_amount(self, dep_date):
+    def get_depreciation_amount(
+        self, dep_date, amount=None, fiscal_years=None
+    ):
+        """
+        :param amount: depreciable amount, if already known
+        :param fiscal_years: ``FiscalYearIndex`` of depreciation's company
+        """
         self.ensure_one()
         zero_dep_date = self.zero_depreciation_until
         if zero_dep_date and dep_date <= zero_dep_date:
             return 0
 
         # Get depreciable amount, multiplier and digits
-        amount = self.get_depreciable_amount(dep_date)
-        multiplier = self.get_depreciation_amount_multiplier(dep_date)
+        if amount is None:
+            amount = self.get_depreciable_amount(dep_date)
+        multiplier = self.get_depreciation_amount_multiplier(
+            dep_date, fiscal_years=fiscal_years
+        )
         digits = self.env['decimal.precision'].precision_get('Account')
         dep_amount = round(amount * multiplier, digits)
 
@@ -413,7 +439,7 @@ class AssetDepreciation(models.Model):
 
         return dep_amount
 
-    def get_depreciation_amount_multiplier(self, dep_date):
+    def get_depreciation_amount_multiplier(self, dep_date, fiscal_years=None):
         self.ensure_one()
 
         # Base multiplier
@@ -433,13 +459,11 @@ class AssetDepreciation(models.Model):
             )
 
         if self.pro_rata_temporis or self._context.get('force_prorata'):
-            fiscal_year_obj = self.env['account.fiscal.year']
-            fy_start = fiscal_year_obj.get_fiscal_year_by_date(
-                date_start, company=self.company_id
-            )
-            fy_dep = fiscal_year_obj.get_fiscal_year_by_date(
-                dep_date, company=self.company_id
-            )
+            if fiscal_years is None:
+                fiscal_years = self.env['account.fiscal.year'] \
+                    .get_fiscal_year_index(self.company_id)
+            fy_start = fiscal_years.get(date_start, self.company_id)
+            fy_dep = fiscal_years.get(dep_date, self.company_id)
             if fy_dep == fy_start:
                 # If current depreciation lies within the same fiscal year in
                 # which the asset was registered, compute multiplier as a
@@ -449,17 +473,17 @@ class AssetDepreciation(models.Model):
                 fy_start = fields.Date.from_string(fy_dep.date_from)
                 lapse = (fy_end - fy_start).days + 1
                 dep_multiplier = self.get_pro_rata_temporis_multiplier(
-                    dep_date, 'dte'
+                    dep_date, 'dte', fiscal_years=fiscal_years
                 )
                 start_multiplier = self.get_pro_rata_temporis_multiplier(
-                    self.date_start, 'dte'
+                    self.date_start, 'dte', fiscal_years=fiscal_years
                 )
                 multiplier *= start_multiplier - dep_multiplier + 1 / lapse
             else:
                 # Otherwise, simply compute multiplier with respect to how
                 # many days have passed since the beginning of the fiscal year
                 multiplier *= self.get_pro_rata_temporis_multiplier(
-                    dep_date, 'std'
+                    dep_date, 'std', fiscal_years=fiscal_years
                 )
 
         return multiplier
@@ -507,6 +531,53 @@ class AssetDepreciation(models.Model):
             'ref': _("Asset dismissal: ") + self.asset_id.make_name(),
         }
 
+    def get_lines_by_fiscal_year(self, fiscal_years, date=None):
+        """
+        Loads the lines of every depreciation in `self` with a single search
+        and groups them by fiscal year.
+
+        :param fiscal_years: ``FiscalYearIndex`` of depreciations' companies
+        :param date: if set, ignore lines after this date
+        :return: dict {depreciation: OrderedDict {fiscal year: lines}}, where
+            fiscal years are sorted by their lines' dates
+        """
+        line_obj = self.env['asset.depreciation.line']
+        domain = [('depreciation_id', 'in', self.ids)]
+        if date:
+            domain.append(('date', '<=', date))
+        line_ids_grouped = OrderedDict()
+        for line in line_obj.search(domain):
+            fiscal_year = fiscal_years.get(line.date, line.company_id)
+            line_ids_grouped.setdefault(line.depreciation_id, OrderedDict()) \
+                .setdefault(fiscal_year, []).append(line.id)
+        return {
+            dep: OrderedDict(
+                (fiscal_year, line_obj.browse(line_ids))
+                for fiscal_year, line_ids in lines_by_fiscal_year.items()
+            )
+            for dep, lines_by_fiscal_year in line_ids_grouped.items()
+        }
+
+    def get_max_depreciation_nrs(self):
+        """
+        Returns dict {depreciation id: max depreciation number} for every
+        depreciation in `self` with numbered lines, with a single query
+        """
+        line_obj = self.env['asset.depreciation.line']
+        domain = [
+            ('depreciation_id', 'in', self.ids),
+            ('move_type', 'in', line_obj.get_numbered_move_types()),
+            ('partial_dismissal', '=', False),
+        ]
+        return {
+            group['depreciation_id'][0]: group['depreciation_nr'] or 0
+            for group in line_obj.read_group(
+                domain,
+                ['depreciation_id', 'depreciation_nr:max'],
+                ['depreciation_id'],
+            )
+        }
+
     def get_max_depreciation_nr(self):
         self.ensure_one()
         num_lines = self.line_ids.filtered('requires_depreciation_nr')
@@ -515,12 +586,14 @@ class AssetDepreciation(models.Model):
             nums = [0]
         return max(nums)
 
-    def get_pro_rata_temporis_dates(self, date):
+    def get_pro_rata_temporis_dates(self, date, fiscal_years=None):
         """
         Gets useful dates for pro rata temporis computations, according to
         given date, by retrieving its fiscal year.
 
         :param date: given date for depreciation
+        :param fiscal_years: ``FiscalYearIndex`` to retrieve the fiscal year
+            from, instead of searching it
         :return: date objects triplet (dt_start, dt, dt_end)
             - dt_start: fiscal year first day
             - dt: given date
@@ -531,10 +604,13 @@ class AssetDepreciation(models.Model):
                 _("Cannot compute pro rata temporis for unknown date.")
             )
 
-        fiscal_year_obj = self.env['account.fiscal.year']
-        fiscal_year = fiscal_year_obj.get_fiscal_year_by_date(
-            date, company=self.company_id
-        )
+        if fiscal_years is not None:
+            fiscal_year = fiscal_years.get(
+                date, self.company_id, miss_raise=False
+            )
+        else:
+            fiscal_year = self.env['account.fiscal.year'] \
+                .get_fiscal_year_by_date(date, company=self.company_id)
         if not fiscal_year:
             date_str = fields.Date.from_string(date).strftime('%d/%m/%Y')
             raise ValidationError(
@@ -547,7 +623,9 @@ class AssetDepreciation(models.Model):
             fields.Date.from_string(fiscal_year.date_to)
         )
 
-    def get_pro_rata_temporis_multiplier(self, date=None, mode='std'):
+    def get_pro_rata_temporis_multiplier(
+        self, date=None, mode='std', fiscal_years=None
+    ):
         """
         Computes and returns pro rata temporis multiplier according to given
         depreciation, date, fiscal year and mode
@@ -557,12 +635,16 @@ class AssetDepreciation(models.Model):
                      year's first day to given date;
             - 'dte': date-to-end, computes multiplier using days from given
                      date to fiscal year's last day
+        :param fiscal_years: ``FiscalYearIndex`` to retrieve the fiscal year
+            from, instead of searching it
         """
         self.ensure_one()
         if not (self.pro_rata_temporis or self._context.get('force_prorata')):
             return 1
 
-        dt_start, dt, dt_end = self.get_pro_rata_temporis_dates(date)
+        dt_start, dt, dt_end = self.get_pro_rata_temporis_dates(
+            date, fiscal_years=fiscal_years
+        )
         lapse = (dt_end - dt_start).days + 1
         if mode == 'std':
             return ((dt - dt_start).days + 1) / lapse
@@ -611,6 +693,30 @@ class AssetDepreciation(models.Model):
         lines = lines or self.env['asset.depreciation.line']
         lines.filtered('requires_account_move').button_generate_account_move()
 
+    def prepare_depreciation_lines_vals(self, dep_date):
+        """
+        Prepares the values of a new depreciation line for every depreciation
+        in `self`: numbers, depreciable amounts and fiscal years of the whole
+        recordset are loaded at once, then amounts are computed in memory
+        """
+        max_nrs = self.get_max_depreciation_nrs()
+        amounts = self.get_depreciable_amounts(dep_date)
+        fiscal_years = self.env['account.fiscal.year'].get_fiscal_year_index(
+            self.mapped('company_id')
+        )
+        vals_list = []
+        for dep in self:
+            dep = dep.with_context(
+                dep_nr=max_nrs.get(dep.id, 0) + 1,
+                used_asset=dep.asset_id.used,
+            )
+            dep_amount = dep.get_depreciation_amount(
+                dep_date, amount=amounts[dep.id], fiscal_years=fiscal_years
+            )
+            dep = dep.with_context(dep_amount=dep_amount)
+            vals_list.append(dep.prepare_depreciation_line_vals(dep_date))
+        return vals_list
+
     def prepare_depreciation_line_vals(self, dep_date):
         self.ensure_one()
         if dep_date is None:
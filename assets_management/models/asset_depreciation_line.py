@@ -137,12 +137,13 @@ class AssetDepreciationLine(models.Model):
     # depreciable amount
     _update_move_types = ('in', 'out')
 
-    @api.model
-    def create(self, vals):
-        line = super().create(vals)
-        if line.need_normalize_depreciation_nr():
-            line.normalize_depreciation_nr(force=True)
-        return line
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        for line in lines:
+            if line.need_normalize_depreciation_nr():
+                line.normalize_depreciation_nr(force=True)
+        return lines
 
     @api.multi
     def write(self, vals):
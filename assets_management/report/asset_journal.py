@@ -3,8 +3,6 @@
 # Copyright 2022 Simone Rubino - TAKOBI
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
-from collections import OrderedDict
-
 from odoo import _, api, fields, models
 from odoo.exceptions import ValidationError
 from odoo.tools.pycompat import string_types
@@ -183,32 +181,25 @@ class Report(models.TransientModel):
 
     def generate_structure(self):
         deps = self.get_depreciations()
-        dep_lines = deps.mapped('line_ids')
         assets = deps.mapped('asset_id')
         if self.date:
             assets = assets.filtered(
                 lambda a: not a.purchase_date or a.purchase_date <= self.date
             )
-            dep_lines = dep_lines.filtered(lambda dl: dl.date <= self.date)
         categories = assets.mapped('category_id')
 
-        if not (categories and assets and deps and dep_lines):
+        fiscal_years = self.env['account.fiscal.year'].get_fiscal_year_index(
+            deps.mapped('company_id')
+        )
+        dep_lines_grouped = deps.get_lines_by_fiscal_year(
+            fiscal_years, self.date
+        )
+
+        if not (categories and assets and deps and dep_lines_grouped):
             raise ValidationError(
                 _("There is nothing to print according to current settings!")
             )
 
-        dep_lines_grouped = OrderedDict()
-        fiscal_year = self.env['account.fiscal.year']
-        for dep_line in dep_lines.sorted('date'):
-            dep = dep_line.depreciation_id
-            fyear = fiscal_year.get_fiscal_year_by_date(
-                dep_line.date, company=dep_line.company_id
-            )
-            key = (dep, fyear)
-            if key not in dep_lines_grouped:
-                dep_lines_grouped[key] = self.env['asset.depreciation.line']
-            dep_lines_grouped[key] += dep_line
-
         self.write({
             'report_category_ids': [
                 (0, 0, {'category_id': c.id, 'report_id': self.id})
@@ -232,18 +223,20 @@ class Report(models.TransientModel):
                 ]
             })
         for report_dep in self.report_depreciation_ids:
-            sequence = 0
-            for (dep, fyear), lines in dep_lines_grouped.items():
-                if dep == report_dep.depreciation_id:
-                    sequence += 1
-                    report_dep.write({
-                        'report_depreciation_year_line_ids': [
-                            (0, 0, {'dep_line_ids': [(6, 0, lines.ids)],
-                                    'fiscal_year_id': fyear.id,
-                                    'report_id': self.id,
-                                    'sequence': sequence})
-                        ]
-                    })
+            lines_by_fyear = dep_lines_grouped.get(
+                report_dep.depreciation_id, {}
+            )
+            report_dep.write({
+                'report_depreciation_year_line_ids': [
+                    (0, 0, {'dep_line_ids': [(6, 0, lines.ids)],
+                            'fiscal_year_id': fyear.id,
+                            'report_id': self.id,
+                            'sequence': sequence})
+                    for sequence, (fyear, lines) in enumerate(
+                        lines_by_fyear.items(), start=1
+                    )
+                ]
+            })
 
     def generate_totals(self):
         curr = self.company_id.currency_id
@@ -707,20 +700,21 @@ class ReportDepreciationLineByYear(models.TransientModel):
         gain_loss = amount_gain + amount_loss
         gain_loss_total = gain_loss
 
-        amount_depreciated = sum([
-            line.amount
-            for line in self.dep_line_ids.filtered(
-                lambda l: l.move_type == 'depreciated'
-                and not l.partial_dismissal
-            )
-        ])
-        amount_dismissal = sum([
-            line.amount
-            for line in self.dep_line_ids.filtered(
-                lambda l: l.move_type == 'depreciated'
-                and l.partial_dismissal
-            )
-        ])
+        # Read the lines in a single pass
+        amount_depreciated = amount_dismissal = 0.0
+        type_mapping = {'in': {}, 'out': {}}
+        for dep_line in self.dep_line_ids:
+            if dep_line.move_type == 'depreciated':
+                if dep_line.partial_dismissal:
+                    amount_dismissal += dep_line.amount
+                else:
+                    amount_depreciated += dep_line.amount
+            elif dep_line.move_type in ('in', 'out') \
+                    and dep_line.depreciation_line_type_id:
+                dep_type = dep_line.depreciation_line_type_id
+                if dep_type not in type_mapping[dep_line.move_type]:
+                    type_mapping[dep_line.move_type][dep_type] = 0
+                type_mapping[dep_line.move_type][dep_type] += dep_line.amount
 
         prev_year_line = report_dep.report_depreciation_year_line_ids.filtered(
             lambda l: l.sequence == self.sequence - 1
@@ -764,16 +758,6 @@ class ReportDepreciationLineByYear(models.TransientModel):
             amount_loss_total += prev_year_line.amount_loss_total
             gain_loss_total += prev_year_line.gain_loss_total
 
-        type_mapping = {'in': {}, 'out': {}}
-        for dep_line in self.dep_line_ids.filtered(
-                lambda l: l.move_type in ('in', 'out')
-                and l.depreciation_line_type_id
-        ):
-            dep_type = dep_line.depreciation_line_type_id
-            if dep_type not in type_mapping[dep_line.move_type]:
-                type_mapping[dep_line.move_type][dep_type] = 0
-            type_mapping[dep_line.move_type][dep_type] += dep_line.amount
-
         amount_in_detail = amount_out_detail = ""
         has_amount_detail = False
         if type_mapping['in']:
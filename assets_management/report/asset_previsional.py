@@ -200,35 +200,31 @@ class Report(models.TransientModel):
                 _("There is nothing to print according to current settings!")
             )
 
-        dep_lines = deps.mapped('line_ids')
-        if self.date:
-            dep_lines = dep_lines.filtered(lambda dl: dl.date <= self.date)
-
+        fiscal_year_obj = self.env['account.fiscal.year']
         fy_domain = [('company_id', '=', self.company_id.id)]
         if self.date:
             fy_domain += [('date_from', '<=', self.date)]
+        report_fiscal_years = fiscal_year_obj.search(
+            fy_domain, order='date_from asc'
+        )
+        fiscal_years = fiscal_year_obj.get_fiscal_year_index(
+            self.company_id | deps.mapped('company_id')
+        )
+        lines_by_fiscal_year = deps.get_lines_by_fiscal_year(
+            fiscal_years, self.date
+        )
         # Create an ordered dict where each key is a fiscal year, sorting
         # them for starting date => every fiscal year must have its own
         # depreciation lines or previsional ones
         dep_line_obj = self.env['asset.depreciation.line']
         dep_lines_grouped = {
-            dep: OrderedDict({
-                fy: dep_line_obj
-                for fy in self.env['account.fiscal.year'].search(
-                    fy_domain, order='date_from asc'
-                )
-            })
+            dep: OrderedDict(
+                (fy, lines_by_fiscal_year.get(dep, {}).get(fy, dep_line_obj))
+                for fy in report_fiscal_years
+            )
             for dep in deps
         }
 
-        fiscal_year = self.env['account.fiscal.year']
-        for dep_line in dep_lines:
-            dep = dep_line.depreciation_id
-            fyear = fiscal_year.get_fiscal_year_by_date(
-                dep_line.date, company=dep_line.company_id
-            )
-            dep_lines_grouped[dep][fyear] += dep_line
-
         self.write({
             'report_category_ids': [
                 (0, 0, {'category_id': c.id, 'report_id': self.id})
@@ -252,27 +248,25 @@ class Report(models.TransientModel):
                 ]
             })
         for report_dep in self.report_depreciation_ids:
-            sequence = 0
-            for dep, lines_by_fyear in dep_lines_grouped.items():
-                if dep == report_dep.depreciation_id:
-                    for fyear, lines in lines_by_fyear.items():
-                        if fyear.date_to >= dep.date_start:
-                            prev = not lines or not any(
-                                l.move_type == 'depreciated'
-                                and not l.partial_dismissal
-                                for l in lines
-                            )
-                            sequence += 1
-                            line_ids = lines.ids
-                            report_dep.write({
-                                'report_depreciation_year_line_ids': [
-                                    (0, 0, {'dep_line_ids': [(6, 0, line_ids)],
-                                            'fiscal_year_id': fyear.id,
-                                            'needs_previsional': prev,
-                                            'report_id': self.id,
-                                            'sequence': sequence})
-                                ]
-                            })
+            dep = report_dep.depreciation_id
+            year_lines_vals = []
+            for fyear, lines in dep_lines_grouped[dep].items():
+                if fyear.date_to >= dep.date_start:
+                    prev = not lines or not any(
+                        l.move_type == 'depreciated'
+                        and not l.partial_dismissal
+                        for l in lines
+                    )
+                    year_lines_vals.append(
+                        (0, 0, {'dep_line_ids': [(6, 0, lines.ids)],
+                                'fiscal_year_id': fyear.id,
+                                'needs_previsional': prev,
+                                'report_id': self.id,
+                                'sequence': len(year_lines_vals) + 1})
+                    )
+            report_dep.write({
+                'report_depreciation_year_line_ids': year_lines_vals
+            })
 
     def generate_totals(self):
         curr = self.company_id.currency_id
@@ -778,20 +772,21 @@ class ReportDepreciationLineByYear(models.TransientModel):
         gain_loss = amount_gain + amount_loss
         gain_loss_total = gain_loss
 
-        amount_depreciated = sum([
-            line.amount
-            for line in self.dep_line_ids.filtered(
-                lambda l: l.move_type == 'depreciated'
-                and not l.partial_dismissal
-            )
-        ])
-        amount_dismissal = sum([
-            line.amount
-            for line in self.dep_line_ids.filtered(
-                lambda l: l.move_type == 'depreciated'
-                and l.partial_dismissal
-            )
-        ])
+        # Read the lines in a single pass
+        amount_depreciated = amount_dismissal = 0.0
+        type_mapping = {'in': {}, 'out': {}}
+        for dep_line in self.dep_line_ids:
+            if dep_line.move_type == 'depreciated':
+                if dep_line.partial_dismissal:
+                    amount_dismissal += dep_line.amount
+                else:
+                    amount_depreciated += dep_line.amount
+            elif dep_line.move_type in ('in', 'out') \
+                    and dep_line.depreciation_line_type_id:
+                dep_type = dep_line.depreciation_line_type_id
+                if dep_type not in type_mapping[dep_line.move_type]:
+                    type_mapping[dep_line.move_type][dep_type] = 0
+                type_mapping[dep_line.move_type][dep_type] += dep_line.amount
 
         prev_year_line = report_dep.report_depreciation_year_line_ids.filtered(
             lambda l: l.sequence == self.sequence - 1
@@ -835,16 +830,6 @@ class ReportDepreciationLineByYear(models.TransientModel):
             amount_loss_total += prev_year_line.amount_loss_total
             gain_loss_total += prev_year_line.gain_loss_total
 
-        type_mapping = {'in': {}, 'out': {}}
-        for dep_line in self.dep_line_ids.filtered(
-            lambda l: l.move_type in ('in', 'out')
-            and l.depreciation_line_type_id
-        ):
-            dep_type = dep_line.depreciation_line_type_id
-            if dep_type not in type_mapping[dep_line.move_type]:
-                type_mapping[dep_line.move_type][dep_type] = 0
-            type_mapping[dep_line.move_type][dep_type] += dep_line.amount
-
         amount_in_detail = amount_out_detail = ""
         has_amount_detail = False
         if type_mapping['in']:
@@ -80,6 +80,35 @@ class TestAssets(TransactionCase):
         ).create({})
         wiz.do_generate()
 
+    def test_generate_depreciations_bulk(self):
+        """
+        Depreciations of several assets generated at once get the same
+        amounts computed depreciation by depreciation
+        """
+        assets = self._create_asset() | self._create_asset()
+        wiz = self.env['wizard.asset.generate.depreciation'].create({
+            'asset_ids': [(6, 0, assets.ids)],
+        })
+        deps = wiz.get_depreciations()
+        self.assertEqual(deps.mapped('asset_id'), assets)
+        expected_amounts = {
+            dep: dep.with_context(
+                dep_nr=1, used_asset=dep.asset_id.used
+            ).get_depreciation_amount(wiz.date_dep)
+            for dep in deps
+        }
+
+        wiz.do_generate()
+
+        for dep in deps:
+            dep_line = dep.line_ids.filtered(
+                lambda l: l.move_type == 'depreciated'
+            )
+            self.assertEqual(len(dep_line), 1)
+            self.assertEqual(dep_line.depreciation_nr, 1)
+            self.assertEqual(dep_line.date, wiz.date_dep)
+            self.assertAlmostEqual(dep_line.amount, expected_amounts[dep])
+
     def _civil_depreciate_asset(self, asset):
         # Keep only one civil depreciation
         civil_depreciation_type = self.env.ref(
@@ -168,3 +197,25 @@ class TestAssets(TransactionCase):
         total = report.report_total_ids
         self.assertEqual(total.amount_depreciation_fund_curr_year, 1000)
         self.assertEqual(total.amount_depreciation_fund_prev_year, 1000)
+
+    def test_journal_lines_by_fiscal_year(self):
+        """
+        Journal report groups depreciation lines by their fiscal year
+        """
+        asset = self._create_asset()
+        purchase_date = date(2019, 1, 1)
+        asset.purchase_date = purchase_date
+        self._civil_depreciate_asset(asset)
+
+        report_date = date(2022, 11, 7)
+        fiscal_years = self._generate_fiscal_years(purchase_date, report_date)
+        report = self._get_report(report_date, 'journal')
+
+        year_lines = report.report_depreciation_ids \
+            .report_depreciation_year_line_ids.sorted('sequence')
+        self.assertEqual(
+            year_lines.mapped('fiscal_year_id'), fiscal_years[:2]
+        )
+        self.assertEqual(
+            year_lines.mapped(lambda l: len(l.dep_line_ids)), [1, 1]
+        )
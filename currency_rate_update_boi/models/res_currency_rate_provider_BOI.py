@@ -1,10 +1,34 @@
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
 
-from datetime import timedelta
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
 import requests
+from requests.adapters import HTTPAdapter
 
 from odoo import models, fields, api
-from odoo.tools.safe_eval import safe_eval
+from odoo.tools.lru import LRU
+
+BOI_URL = "https://tassidicambio.bancaditalia.it/terzevalute-wf-web/rest/v1.0"
+BOI_TIMEOUT = 30
+
+# (service URL, date) -> {currency: rate}
+# Rates of the past days are not changed by the Bank of Italy,
+# keep them to avoid downloading them again
+daily_rates_cache = LRU(1024)
+
+
+def parse_daily_rates(content):
+    """
+    Read the rates of a `dailyRates` response of the Bank of Italy.
+
+    :return: dictionary {currency ISO code: average rate}.
+    """
+    return {
+        row['isoCode']: row['avgRate']
+        for row in json.loads(content).get('rates') or []
+    }
 
 
 class ResCurrencyRateProviderBOI(models.Model):
@@ -59,25 +83,12 @@ class ResCurrencyRateProviderBOI(models.Model):
             if base_currency not in currencies:
                 currencies.append(base_currency)
         content = {}
-
-        while date_from <= date_to:
-            date_from_str = str(date_from)
-
-            url = (
-                "https://tassidicambio.bancaditalia.it/terzevalute-wf-web/"
-                "rest/v1.0/dailyRates?referenceDate={ref_date}"
-                "&currencyIsoCode={ref_cur}&lang={lang}".format(
-                    ref_date=date_from_str,
-                    ref_cur='EUR',
-                    lang='EN',
-                ))
-            response = requests.get(url, headers={'Accept': 'application/json'})
-            curr_dict = response.content
-            content[date_from_str] = {}
-            for row in safe_eval(curr_dict)['rates']:
-                if row['isoCode'] in currencies:
-                    content[date_from_str][row['isoCode']] = row['avgRate']
-            date_from += timedelta(days=1)
+        daily_rates = self._boi_get_daily_rates(date_from, date_to)
+        for date_str, rates in daily_rates.items():
+            content[date_str] = {
+                currency: rate for currency, rate in rates.items()
+                if currency in currencies
+            }
 
         if invert_calculation:
             for k in content.keys():
@@ -86,3 +97,67 @@ class ResCurrencyRateProviderBOI(models.Model):
                     content[k][rate] = str(float(content[k][rate])/base_rate)
                 content[k]['EUR'] = str(1.0/base_rate)
         return content
+
+    @api.model
+    def _boi_get_daily_rates(self, date_from, date_to):
+        """
+        Get the rates of all the currencies for each day
+        between `date_from` and `date_to`.
+
+        Days not already in cache are downloaded using
+        up to `currency_rate_update_boi.workers` concurrent requests,
+        sharing the connections of a single session.
+        The service URL can be changed with
+        the `currency_rate_update_boi.url` parameter.
+
+        :return: dictionary {date string: {currency ISO code: rate}}.
+        """
+        get_param = self.env['ir.config_parameter'].sudo().get_param
+        url = get_param('currency_rate_update_boi.url', BOI_URL)
+        workers = max(int(get_param('currency_rate_update_boi.workers', 4)), 1)
+
+        days = []
+        while date_from <= date_to:
+            days.append(date_from)
+            date_from += timedelta(days=1)
+
+        result = {}
+        to_download = []
+        for day in days:
+            rates = daily_rates_cache.get((url, day))
+            if rates is None:
+                to_download.append(day)
+            else:
+                result[str(day)] = rates
+
+        if to_download:
+            with requests.Session() as session:
+                adapter = HTTPAdapter(
+                    pool_connections=1, pool_maxsize=workers)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+
+                def download(day):
+                    response = session.get(
+                        url + '/dailyRates',
+                        params={
+                            'referenceDate': str(day),
+                            'currencyIsoCode': 'EUR',
+                            'lang': 'EN',
+                        },
+                        headers={'Accept': 'application/json'},
+                        timeout=BOI_TIMEOUT)
+                    response.raise_for_status()
+                    return parse_daily_rates(response.content)
+
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    downloaded = list(executor.map(download, to_download))
+
+            today = date.today()
+            for day, rates in zip(to_download, downloaded):
+                result[str(day)] = rates
+                # Rates of today might not be published yet
+                if day < today:
+                    daily_rates_cache[(url, day)] = rates
+
+        return {str(day): result[str(day)] for day in days}
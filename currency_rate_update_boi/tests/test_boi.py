@@ -0,0 +1,190 @@
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+import json
+import os
+import threading
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlparse
+
+import mock
+
+from odoo.tests.common import TransactionCase
+
+from ..models.res_currency_rate_provider_BOI import (
+    daily_rates_cache, parse_daily_rates)
+
+STUB_BASE_RATES = {
+    'USD': 1,
+    'GBP': 0,
+}
+
+
+def get_stub_rate(currency, day):
+    """Rate of `currency` in `day` served by the stub server."""
+    return '%d.%04d' % (STUB_BASE_RATES[currency], day.toordinal() % 10000)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class BOIStubHandler(BaseHTTPRequestHandler):
+    """Answer `dailyRates` requests like the Bank of Italy service."""
+
+    def do_GET(self):
+        server = self.server
+        query = parse_qs(urlparse(self.path).query)
+        reference_date = query['referenceDate'][0]
+        with server.lock:
+            server.requested_days.append(reference_date)
+            server.in_flight += 1
+            server.max_in_flight = max(
+                server.max_in_flight, server.in_flight)
+            if server.in_flight >= server.expected_concurrency:
+                server.all_in_flight.set()
+        # Wait for the other requests, so that concurrency can be checked
+        server.all_in_flight.wait(5)
+
+        day = date(*map(int, reference_date.split('-')))
+        content = json.dumps({
+            'resultsInfo': {'totalRecords': len(STUB_BASE_RATES)},
+            'rates': [
+                {'isoCode': currency, 'avgRate': get_stub_rate(currency, day)}
+                for currency in STUB_BASE_RATES
+            ],
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+        with server.lock:
+            server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestBOI(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestBOI, cls).setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), BOIStubHandler)
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever)
+        cls.server_thread.daemon = True
+        cls.server_thread.start()
+        cls.url = 'http://127.0.0.1:%d/rest/v1.0' % cls.server.server_port
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.server_thread.join()
+        super(TestBOI, cls).tearDownClass()
+
+    def setUp(self):
+        super(TestBOI, self).setUp()
+        self._reset_server(expected_concurrency=1)
+        daily_rates_cache.clear()
+        self.addCleanup(daily_rates_cache.clear)
+        # The stub server must not be reached through a proxy
+        no_proxy = mock.patch.dict(os.environ, {'no_proxy': '127.0.0.1'})
+        no_proxy.start()
+        self.addCleanup(no_proxy.stop)
+        set_param = self.env['ir.config_parameter'].sudo().set_param
+        set_param('currency_rate_update_boi.url', self.url)
+        set_param('currency_rate_update_boi.workers', 4)
+        self.provider = self.env['res.currency.rate.provider'].create({
+            'service': 'BOI',
+            'currency_ids': [(6, 0, [
+                self.env.ref('base.USD').id,
+                self.env.ref('base.GBP').id,
+            ])],
+        })
+
+    def _reset_server(self, expected_concurrency):
+        server = self.server
+        server.lock = threading.Lock()
+        server.requested_days = []
+        server.in_flight = 0
+        server.max_in_flight = 0
+        server.expected_concurrency = expected_concurrency
+        server.all_in_flight = threading.Event()
+
+    def test_parse_daily_rates(self):
+        content = json.dumps({
+            'resultsInfo': {'totalRecords': 2},
+            'rates': [
+                {'country': 'STATI UNITI', 'currency': 'Dollaro USA',
+                 'isoCode': 'USD', 'uicCode': '001',
+                 'avgRate': '1.1035', 'exchangeConvention':
+                     'Quantita\' di valuta estera per 1 Euro',
+                 'exchangeConventionCode': 'C',
+                 'referenceDate': '2021-03-01'},
+                {'isoCode': 'GBP', 'avgRate': '0.8674'},
+            ],
+        }).encode()
+        self.assertEqual(
+            parse_daily_rates(content), {'USD': '1.1035', 'GBP': '0.8674'})
+        # Days without rates, e.g. holidays
+        self.assertEqual(
+            parse_daily_rates(b'{"resultsInfo": {"totalRecords": 0}}'), {})
+
+    def test_concurrent_download(self):
+        date_to = date.today() - timedelta(days=1)
+        date_from = date_to - timedelta(days=3)
+        self._reset_server(expected_concurrency=4)
+        daily_rates = self.provider._boi_get_daily_rates(date_from, date_to)
+
+        days = [date_from + timedelta(days=n) for n in range(4)]
+        self.assertEqual(
+            sorted(self.server.requested_days), [str(day) for day in days])
+        # All the days have been requested at the same time
+        self.assertEqual(self.server.max_in_flight, 4)
+        self.assertEqual(list(daily_rates), [str(day) for day in days])
+        for day in days:
+            self.assertEqual(daily_rates[str(day)], {
+                currency: get_stub_rate(currency, day)
+                for currency in STUB_BASE_RATES
+            })
+
+    def test_cache(self):
+        today = date.today()
+        date_from = today - timedelta(days=2)
+        self.provider._boi_get_daily_rates(date_from, today)
+        self.assertEqual(len(self.server.requested_days), 3)
+
+        # Past days are cached, today might not be published yet
+        self._reset_server(expected_concurrency=1)
+        daily_rates = self.provider._boi_get_daily_rates(date_from, today)
+        self.assertEqual(self.server.requested_days, [str(today)])
+        self.assertEqual(len(daily_rates), 3)
+        self.assertEqual(
+            daily_rates[str(date_from)]['USD'],
+            get_stub_rate('USD', date_from))
+
+        # The cache is bound to the service URL
+        self._reset_server(expected_concurrency=1)
+        self.env['ir.config_parameter'].sudo().set_param(
+            'currency_rate_update_boi.url', self.url + '/')
+        self.provider._boi_get_daily_rates(date_from, date_from)
+        self.assertEqual(self.server.requested_days, [str(date_from)])
+
+    def test_obtain_rates(self):
+        day = date.today() - timedelta(days=1)
+        content = self.provider._obtain_rates('EUR', ['USD'], day, day)
+        self.assertEqual(content, {
+            str(day): {'USD': get_stub_rate('USD', day)},
+        })
+
+        # Rates in another base currency are computed from EUR rates
+        content = self.provider._obtain_rates('USD', ['GBP'], day, day)
+        usd_rate = float(get_stub_rate('USD', day))
+        self.assertAlmostEqual(
+            float(content[str(day)]['GBP']),
+            float(get_stub_rate('GBP', day)) / usd_rate)
+        self.assertAlmostEqual(
+            float(content[str(day)]['EUR']), 1 / usd_rate)
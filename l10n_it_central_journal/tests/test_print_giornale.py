@@ -0,0 +1,221 @@
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+import base64
+import io
+from datetime import date
+
+import mock
+from PyPDF2 import PdfFileReader, PdfFileWriter
+
+from odoo.exceptions import UserError
+from odoo.tests import Form
+from odoo.tests.common import TransactionCase
+
+
+class TestPrintGiornale(TransactionCase):
+
+    def setUp(self):
+        super(TestPrintGiornale, self).setUp()
+        # Final print renders every part in its own cursor
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+
+        self.journal = self.env['account.journal'].create({
+            'name': 'Central journal test',
+            'code': 'CJT',
+            'type': 'general',
+        })
+        self.debit_account = self.env['account.account'].create({
+            'code': 'CJT1',
+            'name': 'Central journal debit',
+            'user_type_id': self.env.ref(
+                'account.data_account_type_current_assets').id,
+        })
+        self.credit_account = self.env['account.account'].create({
+            'code': 'CJT2',
+            'name': 'Central journal credit',
+            'user_type_id': self.env.ref(
+                'account.data_account_type_revenue').id,
+        })
+        self.daterange = self.env['date.range'].create({
+            'name': 'CJT 2015',
+            'type_id': self.env['date.range.type'].create({
+                'name': 'Central journal test',
+            }).id,
+            'date_start': '2015-01-01',
+            'date_end': '2015-12-31',
+        })
+        # Lines of the same date are printed in the same part:
+        # 4 lines in the first part, then 2 lines in each part
+        self.day_1 = date(2015, 1, 10)
+        self.day_2 = date(2015, 2, 10)
+        self.day_3 = date(2015, 3, 10)
+        self.amounts = {
+            self.day_1: 100 + 200,
+            self.day_2: 400,
+            self.day_3: 800,
+        }
+        self._create_move(self.day_1, 100)
+        self._create_move(self.day_1, 200)
+        self._create_move(self.day_2, 400)
+        self._create_move(self.day_3, 800)
+        self.rendered_forms = []
+
+    def _create_move(self, move_date, amount):
+        move = self.env['account.move'].create({
+            'journal_id': self.journal.id,
+            'date': move_date,
+            'line_ids': [
+                (0, 0, {
+                    'name': 'Debit',
+                    'account_id': self.debit_account.id,
+                    'debit': amount,
+                }),
+                (0, 0, {
+                    'name': 'Credit',
+                    'account_id': self.credit_account.id,
+                    'credit': amount,
+                }),
+            ],
+        })
+        move.post()
+        return move
+
+    def _get_wizard(self, chunk_size=2, fiscal_page_base=None):
+        wizard_form = Form(self.env['wizard.giornale'])
+        if fiscal_page_base is not None:
+            wizard_form.fiscal_page_base = fiscal_page_base
+        wizard_form.daterange = self.daterange
+        wizard_form.chunk_size = chunk_size
+        wizard_form.journal_ids.clear()
+        wizard_form.journal_ids.add(self.journal)
+        return wizard_form.save()
+
+    def _fake_render_qweb_pdf(self, report, res_ids, data=None):
+        """
+        Render the report template, that saves the progress in final print,
+        and return a PDF with a page for every 2 lines, plus one.
+        """
+        self.rendered_forms.append(dict(data['form']))
+        report.render_qweb_html(res_ids, data=data)
+        writer = PdfFileWriter()
+        for page in range(len(data['ids']) // 2 + 1):
+            writer.addBlankPage(595, 842)
+        pdf = io.BytesIO()
+        writer.write(pdf)
+        return pdf.getvalue(), 'pdf'
+
+    def _print_final(self, wizard):
+        with mock.patch.object(
+                type(self.env['ir.actions.report']), 'render_qweb_pdf',
+                autospec=True, side_effect=self._fake_render_qweb_pdf):
+            return wizard.print_giornale_final()
+
+    def _get_attachments(self):
+        return self.env['ir.attachment'].search([
+            ('res_model', '=', 'date.range'),
+            ('res_id', '=', self.daterange.id),
+        ])
+
+    def test_print_final_chunks(self):
+        wizard = self._get_wizard(fiscal_page_base=10)
+        self.assertEqual(wizard.fiscal_page_base, 10)
+        self.assertEqual(wizard.start_row, 0)
+        self.assertEqual(len(wizard._get_line_chunks()), 3)
+
+        action = self._print_final(wizard)
+        self.assertEqual(action['type'], 'ir.actions.act_url')
+
+        # Every part continues the previous one
+        self.assertEqual(
+            [form['start_row'] for form in self.rendered_forms], [0, 4, 6])
+        self.assertEqual(
+            [form['fiscal_page_base'] for form in self.rendered_forms],
+            [10, 13, 15])
+        self.assertEqual(
+            [form['progressive_debit'] for form in self.rendered_forms],
+            [0, 300, 700])
+        self.assertEqual(
+            [form['progressive_credit'] for form in self.rendered_forms],
+            [0, 300, 700])
+        self.assertEqual(
+            [form['date_move_line_to'] for form in self.rendered_forms],
+            [self.day_1, self.day_2, self.daterange.date_end])
+
+        self.assertEqual(self.daterange.date_last_print,
+                         self.daterange.date_end)
+        self.assertEqual(self.daterange.progressive_line_number, 8)
+        self.assertEqual(self.daterange.progressive_page_number, 17)
+        self.assertEqual(self.daterange.progressive_debit, 1500)
+        self.assertEqual(self.daterange.progressive_credit, 1500)
+        self.assertEqual(len(self._get_attachments()), 3)
+        report = PdfFileReader(io.BytesIO(base64.b64decode(
+            wizard.report_file)), strict=False)
+        self.assertEqual(report.getNumPages(), 7)
+
+    def test_print_final_resume(self):
+        wizard = self._get_wizard()
+        render_chunk = type(wizard)._render_chunk
+        calls = []
+
+        def fail_second_chunk(wiz, line_ids, datas_form):
+            calls.append(line_ids)
+            if len(calls) == 2:
+                raise UserError("Rendering failed")
+            return render_chunk(wiz, line_ids, datas_form)
+
+        with mock.patch.object(
+                type(wizard), '_render_chunk',
+                autospec=True, side_effect=fail_second_chunk), \
+                self.assertRaises(UserError):
+            self._print_final(wizard)
+
+        # The first part has been saved
+        self.assertEqual(self.daterange.date_last_print, self.day_1)
+        self.assertEqual(self.daterange.progressive_line_number, 4)
+        self.assertEqual(self.daterange.progressive_page_number, 3)
+        self.assertEqual(self.daterange.progressive_debit, 300)
+        self.assertEqual(len(self._get_attachments()), 1)
+
+        # The print is resumed from the day after the first part
+        wizard = self._get_wizard()
+        self.assertEqual(wizard.date_move_line_from, date(2015, 1, 11))
+        self.assertEqual(wizard.fiscal_page_base, 3)
+        self.assertEqual(wizard.progressive_debit2, 300)
+        self.assertEqual(wizard.progressive_credit, 300)
+        self.assertEqual(len(wizard._get_line_chunks()), 2)
+
+        self.rendered_forms = []
+        self._print_final(wizard)
+        self.assertEqual(
+            [form['fiscal_page_base'] for form in self.rendered_forms],
+            [3, 5])
+        self.assertEqual(
+            [form['progressive_debit'] for form in self.rendered_forms],
+            [300, 700])
+        self.assertEqual(self.daterange.date_last_print,
+                         self.daterange.date_end)
+        self.assertEqual(self.daterange.progressive_page_number, 7)
+        self.assertEqual(self.daterange.progressive_debit, 1500)
+        self.assertEqual(len(self._get_attachments()), 3)
+
+        # Nothing left to print
+        wizard = self._get_wizard()
+        self.assertEqual(wizard.last_def_date_print, self.daterange.date_end)
+        with self.assertRaises(UserError):
+            wizard.print_giornale_final()
+
+    def test_print_final_single_chunk(self):
+        # No page saved yet: the page base set by the user is kept
+        wizard = self._get_wizard(chunk_size=0, fiscal_page_base=5)
+        self.assertEqual(wizard.fiscal_page_base, 5)
+        self.assertEqual(len(wizard._get_line_chunks()), 1)
+
+        self._print_final(wizard)
+        self.assertEqual(len(self.rendered_forms), 1)
+        # The printed pages are saved also for a single part
+        self.assertEqual(self.daterange.progressive_page_number, 5 + 5)
+        self.assertEqual(self.daterange.progressive_line_number, 8)
+
+        wizard = self._get_wizard(fiscal_page_base=1)
+        self.assertEqual(wizard.fiscal_page_base, 10)
@@ -1,9 +1,14 @@
 # Copyright 2018 Gianmarco Conte (gconte@dinamicheaziendali.it)
 
+import base64
+import io
+
+from PyPDF2 import PdfFileReader
+
 from odoo import models, fields, api, _
 from odoo.exceptions import Warning as UserError
 from datetime import timedelta
-from odoo.tools.misc import flatten
+from odoo.tools.pdf import merge_pdf
 
 
 class WizardGiornale(models.TransientModel):
@@ -52,6 +57,15 @@ class WizardGiornale(models.TransientModel):
     year_footer = fields.Char(string='Year for Footer',
                               help="Value printed near number "
                                    "of page in the footer")
+    chunk_size = fields.Integer(
+        'Lines per chunk', default=10000,
+        help="Print the journal in several parts of about this number "
+             "of lines, merged in a single file. "
+             "In final print, the progress is saved after each part, "
+             "so that a failed print can be resumed. "
+             "0 to print the journal in a single part.")
+    report_file = fields.Binary('Report', readonly=True, attachment=True)
+    report_file_name = fields.Char('Report file name', readonly=True)
 
     @api.onchange('date_move_line_from_view')
     def get_year_footer(self):
@@ -81,18 +95,25 @@ class WizardGiornale(models.TransientModel):
                 self.start_row = self.daterange.progressive_line_number
             self.progressive_debit2 = self.daterange.progressive_debit
             self.progressive_credit = self.daterange.progressive_credit
+            if self.daterange.progressive_page_number:
+                self.fiscal_page_base = \
+                    self.daterange.progressive_page_number
 
             if self.last_def_date_print == self.daterange.date_end:
                 self.date_move_line_from_view = self.last_def_date_print
 
-    def get_line_ids(self):
+    def _get_move_lines(self):
+        """
+        :return: list of tuples (move line ID, date) of the lines
+            to be printed, in the order they are printed.
+        """
         wizard = self
         if wizard.target_move == 'all':
             target_type = ['posted', 'draft']
         else:
             target_type = [wizard.target_move]
         sql = """
-            SELECT aml.id FROM account_move_line aml
+            SELECT aml.id, am.date FROM account_move_line aml
             LEFT JOIN account_move am ON (am.id = aml.move_id)
             WHERE
             aml.date >= %(date_from)s
@@ -108,9 +129,33 @@ class WizardGiornale(models.TransientModel):
             'journal_ids': tuple(self.journal_ids.ids)
             }
         self.env.cr.execute(sql, params)
-        res = self.env.cr.fetchall()
-        move_line_ids = flatten(res)
-        return move_line_ids
+        return self.env.cr.fetchall()
+
+    def get_line_ids(self):
+        return [line_id for line_id, line_date in self._get_move_lines()]
+
+    def _get_line_chunks(self):
+        """
+        Split the lines to be printed in chunks of about `chunk_size` lines.
+        Lines of the same date are always in the same chunk,
+        so that the print can be resumed from the day after
+        the last date of a chunk.
+
+        :return: list of tuples (move line IDs, date of the last line).
+        """
+        chunks = []
+        line_ids = []
+        last_date = None
+        for line_id, line_date in self._get_move_lines():
+            if self.chunk_size > 0 and len(line_ids) >= self.chunk_size \
+                    and line_date != last_date:
+                chunks.append((line_ids, last_date))
+                line_ids = []
+            line_ids.append(line_id)
+            last_date = line_date
+        if line_ids:
+            chunks.append((line_ids, last_date))
+        return chunks
 
     def _prepare_datas_form(self):
         wizard = self
@@ -125,11 +170,93 @@ class WizardGiornale(models.TransientModel):
         datas_form['daterange'] = wizard.daterange.id
         return datas_form
 
+    def _render_chunk(self, line_ids, datas_form):
+        """
+        Print the lines `line_ids`; when the print is final,
+        the progress is saved in the date range.
+
+        :return: tuple (PDF content, number of pages).
+        """
+        report = self.env.ref('l10n_it_central_journal.action_report_giornale')
+        pdf = report.render_qweb_pdf(self.ids, data={
+            'ids': line_ids,
+            'model': 'account.move',
+            'form': datas_form,
+        })[0]
+        pages = PdfFileReader(io.BytesIO(pdf), strict=False).getNumPages()
+        if datas_form['print_state'] == 'def':
+            page_number = datas_form['fiscal_page_base'] + pages
+            self.daterange.progressive_page_number = page_number
+            self.env['ir.attachment'].create({
+                'name': _('General Journal %s - %s.pdf') % (
+                    self.daterange.name, datas_form['date_move_line_to']),
+                'datas': base64.b64encode(pdf),
+                'datas_fname': 'giornale_%s.pdf' % (
+                    datas_form['date_move_line_to'], ),
+                'res_model': 'date.range',
+                'res_id': self.daterange.id,
+            })
+        return pdf, pages
+
+    def _print_chunks(self, chunks, print_state):
+        """
+        Print the journal in several parts, merged in `report_file`.
+        Page numbers, row numbers and progressive amounts of each part
+        continue the ones of the previous part.
+
+        In final print each part is saved in its own transaction:
+        if a part fails, the parts already printed are attached
+        to the date range and the print can be resumed from the next one.
+        """
+        datas_form = self._prepare_datas_form()
+        datas_form['print_state'] = print_state
+        datas_form['year_footer'] = self.year_footer
+        pdfs = []
+        for index, (line_ids, end_date) in enumerate(chunks, start=1):
+            # The whole period is printed with the last part
+            datas_form['date_move_line_to'] = end_date \
+                if index < len(chunks) else self.date_move_line_to
+            if print_state == 'def':
+                with self.pool.cursor() as cr:
+                    pdf, pages = self.with_env(self.env(cr=cr))._render_chunk(
+                        line_ids, datas_form)
+            else:
+                pdf, pages = self._render_chunk(line_ids, datas_form)
+            pdfs.append(pdf)
+
+            self.env.cr.execute("""
+                SELECT COALESCE(SUM(debit), 0), COALESCE(SUM(credit), 0)
+                FROM account_move_line WHERE id IN %s
+            """, (tuple(line_ids), ))
+            debit, credit = self.env.cr.fetchone()
+            datas_form['fiscal_page_base'] += pages
+            datas_form['start_row'] += len(line_ids)
+            datas_form['progressive_debit'] += float(debit)
+            datas_form['progressive_credit'] += float(credit)
+
+        file_name = 'giornale_%s_%s.pdf' % (
+            self.date_move_line_from, self.date_move_line_to)
+        self.write({
+            'report_file': base64.b64encode(merge_pdf(pdfs)),
+            'report_file_name': file_name,
+        })
+        return {
+            'name': _('General Journal'),
+            'type': 'ir.actions.act_url',
+            'url': '/web/content/{res_model}/{res_id}/report_file/'
+                   '{file_name}?download=true'
+                   .format(res_model=self._name, res_id=self.id,
+                           file_name=file_name),
+        }
+
     def print_giornale(self):
         wizard = self
-        move_line_ids = self.get_line_ids()
-        if not move_line_ids:
+        chunks = self._get_line_chunks()
+        if not chunks:
             raise UserError(_('No documents found in the current selection'))
+        if len(chunks) > 1:
+            return self._print_chunks(chunks, 'draft')
+        move_line_ids = chunks[0][0]
         datas_form = self._prepare_datas_form()
         datas_form['print_state'] = 'draft'
         datas_form['year_footer'] = wizard.year_footer
@@ -148,22 +275,14 @@ class WizardGiornale(models.TransientModel):
                 wizard.date_move_line_from <= wizard.last_def_date_print:
             raise UserError(_('Date already printed'))
         else:
-            move_line_ids = self.get_line_ids()
-            if not move_line_ids:
+            chunks = self._get_line_chunks()
+            if not chunks:
                 raise UserError(
                     _('No documents found in the current selection'))
-            datas_form = self._prepare_datas_form()
-            datas_form['print_state'] = 'def'
-            datas_form['year_footer'] = wizard.year_footer
-            datas = {
-                'ids': move_line_ids,
-                'model': 'account.move',
-                'form': datas_form
-            }
             company = res_company_obj.search([('id', '=', self.company_id.id)])
             if not company.period_lock_date or company.period_lock_date \
                     < self.date_move_line_to:
                 company.sudo().period_lock_date = self.date_move_line_to
-            return self.env.ref(
-                'l10n_it_central_journal.action_report_giornale').\
-                report_action(self, data=datas)
+            # Always print here, even a single part,
+            # so that the number of printed pages is saved
+            return self._print_chunks(chunks, 'def')
@@ -1,4 +1,5 @@
 import logging
+import threading
 from odoo.modules.module import get_module_resource
 from lxml import etree
 
@@ -11,17 +12,42 @@ except (ImportError) as err:
     _logger.debug(err)
 
 from .binding import *  # noqa: F403
+from .lxml_reader import Reader, ReaderError
+from .lxml_writer import Writer, get_schema
 
 XSD_SCHEMA = 'Schema_del_file_xml_FatturaPA_versione_1.2.2.xsd'
 
 _xsd_schema = get_module_resource('l10n_it_fatturapa', 'bindings', 'xsd',
                                   XSD_SCHEMA)
-_root = etree.parse(_xsd_schema)
+_root = None
 
 _CreateFromDocument = CreateFromDocument  # noqa: F405
 
+# (parent element name, element name) -> mandatory,
+# filled by `collect_types` on first use
 date_types = {}
 datetime_types = {}
+_types_collected = False
+
+# Guards the lazy initialization of the module-level tables and objects,
+# which can be first used by several threads at the same time
+_init_lock = threading.RLock()
+
+_reader = None
+_writer = None
+_schema = None
+
+_elements_by_type = etree.XPath("//*[@type=$type]")
+
+
+def get_xsd_root():
+    """Parse the XSD of FatturaPA on first use."""
+    global _root
+    if _root is None:
+        with _init_lock:
+            if _root is None:
+                _root = etree.parse(_xsd_schema)
+    return _root
 
 
 def get_parent_element(e):
@@ -30,50 +56,139 @@ def get_parent_element(e):
             return ancestor
 
 
-def get_type_query(e):
-    return "//*[@type='%s']" % e.attrib['name']
-
-
 def collect_element(target, element, parent=None):
     if parent is None:
         parent = get_parent_element(element)
 
-    path = '//%s/%s' % (parent.attrib['name'], element.attrib['name'])
+    key = (parent.attrib['name'], element.attrib['name'])
     mandatory = element.attrib.get('minOccurs') != '0'
-    if path not in target:
-        target[path] = mandatory
+    if key not in target:
+        target[key] = mandatory
     else:
-        assert target[path] == mandatory, \
-            'Element %s is already present with different minOccurs value' % \
-            path
+        assert target[key] == mandatory, \
+            'Element %s/%s is already present with different minOccurs ' \
+            'value' % key
 
 
-def collect_elements_by_type_query(target, query):
-    for element in _root.xpath(query):
+def collect_elements_by_type_name(target, type_name):
+    root = get_xsd_root()
+    for element in _elements_by_type(root, type=type_name):
         parent_type = get_parent_element(element)
-        for parent in _root.xpath(get_type_query(parent_type)):
+        for parent in _elements_by_type(
+                root, type=parent_type.attrib['name']):
             collect_element(target, element, parent)
 
 
 def collect_elements_by_type(target, element_type):
-    collect_elements_by_type_query(target, get_type_query(element_type))
+    collect_elements_by_type_name(target, element_type.attrib['name'])
 
 
 def collect_types():
-    # simpleType, we look at the base of restriction
-    for element_type in _root.findall('//{*}simpleType'):
-        base = element_type.find('{*}restriction').attrib['base']
+    global date_types, datetime_types, _types_collected
+    if _types_collected:
+        return
+
+    with _init_lock:
+        if _types_collected:
+            return
+        # Tables are built apart and published when complete,
+        # so that other threads never use partial tables
+        new_date_types = {}
+        new_datetime_types = {}
+
+        # simpleType, we look at the base of restriction
+        for element_type in get_xsd_root().iterfind('.//{*}simpleType'):
+            base = element_type.find('{*}restriction').attrib['base']
 
-        if base == 'xs:date':
-            collect_elements_by_type(date_types, element_type)
-        elif base == 'xs:dateTime':
-            collect_elements_by_type(datetime_types, element_type)
+            if base == 'xs:date':
+                collect_elements_by_type(new_date_types, element_type)
+            elif base == 'xs:dateTime':
+                collect_elements_by_type(new_datetime_types, element_type)
 
-    # complexType containing xs:date children
-    collect_elements_by_type_query(date_types, "//*[@type='xs:date']")
+        # complexType containing xs:date children
+        collect_elements_by_type_name(new_date_types, 'xs:date')
 
-    # complexType containing xs:dateTime children
-    collect_elements_by_type_query(datetime_types, "//*[@type='xs:dateTime']")
+        # complexType containing xs:dateTime children
+        collect_elements_by_type_name(new_datetime_types, 'xs:dateTime')
+
+        date_types = new_date_types
+        datetime_types = new_datetime_types
+        _types_collected = True
+
+
+def _fix_date(element, tree, problems):
+    # remove timezone from type `xs:date` if any or
+    # pyxb will fail to compare with
+    result = pyxb.binding.datatypes.date(element.text.strip())
+    if result.tzinfo is not None:
+        result = result.replace(tzinfo=None)
+        element.text = result.XsdLiteral(result)
+        msg = 'removed timezone information from date only element ' \
+              '%s: %s' % (tree.getpath(element), element.text)
+        problems.append(msg)
+        _logger.warn(msg)
+
+
+def _fix_datetime(element, mandatory, tree, problems):
+    """
+    Check bogus dates accepted by ADE but not by python.
+
+    :return: True if `element` has to be removed.
+    """
+    try:
+        pyxb.binding.datatypes.dateTime(element.text)
+    except OverflowError as e:
+        element_path = tree.getpath(element)
+        if mandatory:
+            _logger.error('element %s is invalid but is mandatory: '
+                          '%s' % (element_path, element.text))
+        else:
+            msg = 'removed invalid dateTime element %s: %s (%s)' % (
+                element_path, element.text, e)
+            problems.append(msg)
+            _logger.warn(msg)
+            return True
+    return False
+
+
+def fix_document(root):
+    """
+    Fix in place the problems of `root` that prevent the parsing
+    of documents accepted by SdI.
+
+    The whole document is fixed in a single pass.
+
+    :return: list of fixed problems.
+    """
+    collect_types()
+    problems = []
+    tree = etree.ElementTree(root)
+    to_remove = []
+
+    for element in root.iter():
+        tag = element.tag
+        if not isinstance(tag, str):
+            # Comments and processing instructions
+            continue
+        if tag in ('PECDestinatario', 'Email'):
+            # fix trailing spaces
+            element.text = element.text.strip()
+            continue
+
+        parent = element.getparent()
+        if parent is None:
+            continue
+        key = (parent.tag, tag)
+        if key in date_types:
+            _fix_date(element, tree, problems)
+        elif key in datetime_types:
+            if _fix_datetime(element, datetime_types[key], tree, problems):
+                to_remove.append(element)
+
+    for element in to_remove:
+        element.getparent().remove(element)
+
+    return problems
 
 
 def CreateFromDocument(xml_string):
@@ -83,49 +198,75 @@ def CreateFromDocument(xml_string):
         _logger.warn('lxml was unable to parse xml: %s' % e)
         return _CreateFromDocument(xml_string)
 
-    problems = []
-    tree = etree.ElementTree(root)
-
-    # remove timezone from type `xs:date` if any or
-    # pyxb will fail to compare with
-    for path, mandatory in date_types.items():
-        for element in root.xpath(path):
-            result = pyxb.binding.datatypes.date(element.text.strip())
-            if result.tzinfo is not None:
-                result = result.replace(tzinfo=None)
-                element.text = result.XsdLiteral(result)
-                msg = 'removed timezone information from date only element ' \
-                      '%s: %s' % (tree.getpath(element), element.text)
-                problems.append(msg)
-                _logger.warn(msg)
-
-    # remove bogus dates accepted by ADE but not by python
-    for path, mandatory in datetime_types.items():
-        for element in root.xpath(path):
-            try:
-                pyxb.binding.datatypes.dateTime(element.text)
-            except OverflowError as e:
-                element_path = tree.getpath(element)
-                if mandatory:
-                    _logger.error('element %s is invalid but is mandatory: '
-                                  '%s' % (element_path, element.text))
-                else:
-                    element.getparent().remove(element)
-                    msg = 'removed invalid dateTime element %s: %s (%s)' % (
-                        element_path, element.text, e)
-                    problems.append(msg)
-                    _logger.warn(msg)
-
-    # fix trailing spaces in <PECDestinatario/> and <Email/>
-    for pec in root.xpath("//PECDestinatario"):
-        pec.text = pec.text.strip()
-
-    for email in root.xpath("//Email"):
-        email.text = email.text.strip()
+    problems = fix_document(root)
 
     fatturapa = _CreateFromDocument(etree.tostring(root))
     setattr(fatturapa, '_xmldoctor', problems)
     return fatturapa
 
 
-collect_types()
+def get_reader():
+    global _reader
+    if _reader is None:
+        with _init_lock:
+            if _reader is None:
+                _reader = Reader(get_xsd_root())
+    return _reader
+
+
+def CreateFromDocumentLxml(xml_string):
+    """
+    Like `CreateFromDocument`, but read the document with lxml only,
+    without building the PyXB bindings.
+
+    Documents that cannot be read this way
+    are parsed by `CreateFromDocument`,
+    that also performs a strict validation.
+    """
+    try:
+        root = etree.fromstring(xml_string)
+    except Exception:
+        return CreateFromDocument(xml_string)
+
+    problems = fix_document(root)
+
+    try:
+        fatturapa = get_reader().read(root)
+    except ReaderError as e:
+        _logger.info('lxml reader was unable to read xml, '
+                     'falling back to pyxb: %s' % e)
+        return CreateFromDocument(xml_string)
+    setattr(fatturapa, '_xmldoctor', problems)
+    return fatturapa
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _init_lock:
+            if _writer is None:
+                _writer = Writer(get_xsd_root())
+    return _writer
+
+
+def get_validation_schema():
+    global _schema
+    if _schema is None:
+        with _init_lock:
+            if _schema is None:
+                _schema = get_schema(get_xsd_root())
+    return _schema
+
+
+def ToXmlLxml(fatturapa):
+    """
+    Like `fatturapa.toxml(encoding="UTF-8")`, but serialize the document
+    with lxml, validating it against the XSD once it has been written.
+
+    :param fatturapa: PyXB binding of the document.
+    :return: bytes of the document.
+    :raise lxml.etree.DocumentInvalid: if the document is not valid.
+    """
+    xml_string = get_writer().tostring(fatturapa)
+    get_validation_schema().assertValid(etree.fromstring(xml_string))
+    return xml_string
@@ -0,0 +1,256 @@
+#  License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+"""
+Lightweight reader for FatturaPA documents.
+
+Build plain attribute-access objects straight from a lxml tree,
+exposing the same names (and value types) of the PyXB bindings,
+so that e.g. `fatt.FatturaElettronicaBody[0].DatiGenerali` works
+with both readers.
+
+The structure of the document is checked against the XSD
+(unknown, duplicated or missing mandatory elements),
+but facets (patterns, lengths, enumerations) and the order
+of the elements are not: use the PyXB bindings for strict validation.
+"""
+
+import base64
+import datetime
+import decimal
+import re
+
+XS_NS = '{http://www.w3.org/2001/XMLSchema}'
+FATTURAPA_NS = 'http://ivaservizi.agenziaentrate.gov.it/docs/xsd/fatture/v1.2'
+DS_NS = 'http://www.w3.org/2000/09/xmldsig#'
+
+ROOT_ELEMENT = 'FatturaElettronica'
+
+re_datetime = re.compile(
+    r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(\.\d+)?(Z|[+-]\d{2}:\d{2})?$')
+
+
+class ReaderError(ValueError):
+    """The document cannot be read without the PyXB bindings."""
+
+
+class Element(object):
+    """
+    Read-only node of a document read by `Reader`.
+
+    Child elements and attributes are available as attributes:
+    repeatable elements are lists, missing optional elements are `None`.
+    """
+
+    def __init__(self, type_name, values):
+        self._type_name = type_name
+        self.__dict__.update(values)
+
+    def __repr__(self):
+        return '<%s>' % self._type_name
+
+
+class ElementSpec(object):
+
+    __slots__ = ('type_name', 'mandatory', 'plural', 'default')
+
+    def __init__(self, type_name, mandatory, plural, default=None):
+        self.type_name = type_name
+        self.mandatory = mandatory
+        self.plural = plural
+        self.default = default
+
+
+def _to_string(text):
+    return text or ''
+
+
+def _to_normalized_string(text):
+    return re.sub(r'[\t\n\r]', ' ', text or '')
+
+
+def _to_token(text):
+    return ' '.join((text or '').split())
+
+
+def _to_decimal(text):
+    try:
+        return decimal.Decimal((text or '').strip())
+    except decimal.InvalidOperation:
+        raise ReaderError("Invalid decimal value %r" % text)
+
+
+def _to_integer(text):
+    try:
+        return int((text or '').strip())
+    except ValueError:
+        raise ReaderError("Invalid integer value %r" % text)
+
+
+def _to_date(text):
+    # Like PyXB, dates are returned as `datetime` objects
+    try:
+        return datetime.datetime.strptime((text or '').strip(), '%Y-%m-%d')
+    except ValueError:
+        raise ReaderError("Invalid date value %r" % text)
+
+
+def _to_datetime(text):
+    match = re_datetime.match((text or '').strip())
+    if not match:
+        raise ReaderError("Invalid dateTime value %r" % text)
+    value, fraction, tz = match.groups()
+    try:
+        result = datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%S')
+    except ValueError:
+        raise ReaderError("Invalid dateTime value %r" % text)
+    if fraction:
+        result = result.replace(
+            microsecond=int(round(float(fraction) * 1000000)) % 1000000)
+    if tz:
+        # Like PyXB, timezone-aware values are converted to UTC
+        if tz != 'Z':
+            sign = -1 if tz[0] == '-' else 1
+            offset = datetime.timedelta(
+                hours=int(tz[1:3]), minutes=int(tz[4:6]))
+            result -= sign * offset
+        result = result.replace(tzinfo=datetime.timezone.utc)
+    return result
+
+
+def _to_base64_binary(text):
+    try:
+        return base64.b64decode(''.join((text or '').split()))
+    except ValueError:
+        raise ReaderError("Invalid base64Binary value")
+
+
+CONVERTERS = {
+    'xs:string': _to_string,
+    'xs:normalizedString': _to_normalized_string,
+    'xs:token': _to_token,
+    'xs:decimal': _to_decimal,
+    'xs:integer': _to_integer,
+    'xs:date': _to_date,
+    'xs:dateTime': _to_datetime,
+    'xs:base64Binary': _to_base64_binary,
+}
+
+
+class Reader(object):
+    """
+    Read FatturaPA documents using the types defined in the XSD.
+
+    :param xsd_root: the parsed XSD of FatturaPA.
+    """
+
+    def __init__(self, xsd_root):
+        # simpleType name -> converter of its builtin base type
+        self.converters = dict(CONVERTERS)
+        # complexType name -> {element name: ElementSpec}
+        self.complex_types = {}
+        # complexType name -> {attribute name: type name}
+        self.attributes = {}
+        self._collect_simple_types(xsd_root)
+        self._collect_complex_types(xsd_root)
+        self.root_type = xsd_root.find(
+            '%selement[@name="%s"]' % (XS_NS, ROOT_ELEMENT)).get('type')
+
+    def _collect_simple_types(self, xsd_root):
+        bases = {}
+        for simple_type in xsd_root.iter(XS_NS + 'simpleType'):
+            restriction = simple_type.find(XS_NS + 'restriction')
+            bases[simple_type.get('name')] = restriction.get('base')
+        for name, base in bases.items():
+            while base in bases:
+                base = bases[base]
+            self.converters[name] = CONVERTERS[base]
+
+    def _collect_complex_types(self, xsd_root):
+        for complex_type in xsd_root.iter(XS_NS + 'complexType'):
+            type_name = complex_type.get('name')
+            elements = self.complex_types[type_name] = {}
+            for element in complex_type.iter(XS_NS + 'element'):
+                name = element.get('name')
+                if not name:
+                    # References to other schemas, i.e. ds:Signature
+                    continue
+                # Elements in alternative to other elements are optional
+                in_choice = next(
+                    element.iterancestors(XS_NS + 'choice'), None
+                ) is not None
+                elements[name] = ElementSpec(
+                    element.get('type'),
+                    mandatory=not in_choice
+                    and element.get('minOccurs') != '0',
+                    plural=element.get('maxOccurs') is not None,
+                    default=element.get('default'),
+                )
+            self.attributes[type_name] = {
+                attribute.get('name'): attribute.get('type')
+                for attribute in complex_type.iter(XS_NS + 'attribute')
+            }
+
+    def read(self, root):
+        """
+        Read the document in `root`.
+
+        :param root: lxml root element of the document.
+        :return: `Element` for the root of the document.
+        :raise ReaderError: if the structure of the document
+            does not match the XSD.
+        """
+        if root.tag != '{%s}%s' % (FATTURAPA_NS, ROOT_ELEMENT):
+            raise ReaderError("Unexpected root element %s" % root.tag)
+        return self._read_complex(root, self.root_type)
+
+    def _convert(self, type_name, text):
+        converter = self.converters.get(type_name)
+        if converter is None:
+            raise ReaderError("Unknown type %s" % type_name)
+        return converter(text)
+
+    def _read_complex(self, node, type_name):
+        specs = self.complex_types[type_name]
+        values = {}
+        for name, attribute_type in self.attributes[type_name].items():
+            text = node.get(name)
+            values[name] = None if text is None \
+                else self._convert(attribute_type, text)
+
+        for child in node:
+            tag = child.tag
+            if not isinstance(tag, str):
+                # Comments and processing instructions
+                continue
+            if tag.startswith('{'):
+                if tag.startswith('{%s}' % DS_NS):
+                    continue
+                raise ReaderError("Unexpected element %s" % tag)
+            spec = specs.get(tag)
+            if spec is None:
+                raise ReaderError(
+                    "Unexpected element %s in %s" % (tag, type_name))
+            if spec.type_name in self.complex_types:
+                value = self._read_complex(child, spec.type_name)
+            else:
+                text = child.text
+                if not text and spec.default is not None:
+                    # Empty elements get the default value of the XSD
+                    text = spec.default
+                value = self._convert(spec.type_name, text)
+            if spec.plural:
+                values.setdefault(tag, []).append(value)
+            elif tag in values:
+                raise ReaderError(
+                    "Element %s repeated in %s" % (tag, type_name))
+            else:
+                values[tag] = value
+
+        for name, spec in specs.items():
+            if name in values:
+                continue
+            if spec.mandatory:
+                raise ReaderError(
+                    "Missing element %s in %s" % (name, type_name))
+            values[name] = [] if spec.plural else None
+        return Element(type_name, values)
@@ -0,0 +1,146 @@
+#  License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+"""
+Fast serializer for FatturaPA documents built with the PyXB bindings.
+
+PyXB `toxml` validates again the whole object graph,
+then builds a DOM tree and serializes it:
+`Writer` streams the values of the bindings straight to the output
+using `lxml.etree.xmlfile`, in the order defined by the XSD.
+
+The values are already checked by PyXB when they are assigned,
+the structure of the document can be checked
+with a single XSD validation pass using `get_schema`.
+"""
+
+import copy
+import io
+from xml.sax.saxutils import quoteattr
+
+from lxml import etree
+from pyxb.binding.datatypes import decimal as pyxb_decimal
+
+XS_NS = '{http://www.w3.org/2001/XMLSchema}'
+FATTURAPA_NS = 'http://ivaservizi.agenziaentrate.gov.it/docs/xsd/fatture/v1.2'
+DS_NS = 'http://www.w3.org/2000/09/xmldsig#'
+
+ROOT_ELEMENT = 'FatturaElettronica'
+ROOT_PREFIX = 'ns1'
+
+XML_DECLARATION = b'<?xml version="1.0" encoding="UTF-8"?>'
+
+
+def get_schema(xsd_root):
+    """
+    Build the schema validating FatturaPA documents.
+
+    The XSD of the digital signature is imported from a remote location:
+    signatures are not validated so that the schema can be built offline.
+
+    :param xsd_root: the parsed XSD of FatturaPA.
+    :return: `lxml.etree.XMLSchema`.
+    """
+    xsd_root = copy.deepcopy(xsd_root)
+    schema = xsd_root.getroot()
+    for xsd_import in schema.findall(XS_NS + 'import'):
+        if xsd_import.get('namespace') == DS_NS:
+            schema.remove(xsd_import)
+    for element in schema.iter(XS_NS + 'element'):
+        if element.get('ref', '').startswith('ds:'):
+            signature = etree.Element(XS_NS + 'any', {
+                'namespace': DS_NS,
+                'processContents': 'skip',
+                'minOccurs': element.get('minOccurs', '1'),
+            })
+            signature.tail = element.tail
+            element.getparent().replace(element, signature)
+    return etree.XMLSchema(xsd_root)
+
+
+def value_as_text(value):
+    # Same as `FatturapaBDS.valueAsText` of l10n_it_fatturapa_out:
+    # decimals with a pattern are written as they have been assigned
+    if isinstance(value, pyxb_decimal) and hasattr(value, '_CF_pattern'):
+        return str(value)
+    return value.xsdLiteral()
+
+
+class Writer(object):
+    """
+    Write FatturaPA documents using the order of the elements in the XSD.
+
+    :param xsd_root: the parsed XSD of FatturaPA.
+    """
+
+    def __init__(self, xsd_root):
+        # complexType name -> [(element name, type name, plural)]
+        self.complex_types = {}
+        # complexType name -> [attribute name]
+        self.attributes = {}
+        for complex_type in xsd_root.iter(XS_NS + 'complexType'):
+            type_name = complex_type.get('name')
+            self.complex_types[type_name] = [
+                (element.get('name'), element.get('type'),
+                 element.get('maxOccurs') is not None)
+                for element in complex_type.iter(XS_NS + 'element')
+                # References to other schemas, i.e. ds:Signature
+                if element.get('name')
+            ]
+            self.attributes[type_name] = [
+                attribute.get('name')
+                for attribute in complex_type.iter(XS_NS + 'attribute')
+            ]
+        self.root_type = xsd_root.find(
+            '%selement[@name="%s"]' % (XS_NS, ROOT_ELEMENT)).get('type')
+
+    def tostring(self, binding):
+        """
+        Serialize the document in `binding`.
+
+        :param binding: PyXB binding of the root of the document.
+        :return: bytes of the UTF-8 encoded document.
+        """
+        output = io.BytesIO()
+        # Declaration and root element are written as PyXB does,
+        # lxml would write the namespace before the attributes
+        output.write(XML_DECLARATION)
+        output.write(b'<%s:%s' % (
+            ROOT_PREFIX.encode(), ROOT_ELEMENT.encode()))
+        for name, value in self._get_attributes(binding, self.root_type):
+            output.write(b' %s=%s' % (
+                name.encode(), quoteattr(value).encode('utf-8')))
+        output.write(b' xmlns:%s="%s">' % (
+            ROOT_PREFIX.encode(), FATTURAPA_NS.encode()))
+        # Children of the root element have no namespace
+        # and each of them is written as a separate document
+        for name, item, child_type in self._iter_children(
+                binding, self.root_type):
+            with etree.xmlfile(output, encoding='UTF-8') as xf:
+                self._write_element(xf, name, item, child_type)
+        output.write(b'</%s:%s>' % (
+            ROOT_PREFIX.encode(), ROOT_ELEMENT.encode()))
+        return output.getvalue()
+
+    def _get_attributes(self, binding, type_name):
+        for name in self.attributes[type_name]:
+            value = getattr(binding, name)
+            if value is not None:
+                yield name, value_as_text(value)
+
+    def _iter_children(self, binding, type_name):
+        for name, child_type, plural in self.complex_types[type_name]:
+            value = getattr(binding, name)
+            if value is None:
+                continue
+            for item in (value if plural else (value, )):
+                yield name, item, child_type
+
+    def _write_element(self, xf, name, value, type_name):
+        if type_name in self.complex_types:
+            with xf.element(
+                    name, dict(self._get_attributes(value, type_name))):
+                for child in self._iter_children(value, type_name):
+                    self._write_element(xf, *child)
+        else:
+            with xf.element(name):
+                xf.write(value_as_text(value))
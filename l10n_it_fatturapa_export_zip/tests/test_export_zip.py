@@ -0,0 +1,119 @@
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+import base64
+import io
+import os
+import zipfile
+
+from odoo.exceptions import UserError
+from odoo.addons.l10n_it_fatturapa_out.tests.fatturapa_common import \
+    FatturaPACommon
+
+
+class TestExportZip(FatturaPACommon):
+
+    def setUp(self):
+        super(TestExportZip, self).setUp()
+        self.export_wizard_model = self.env['wizard.fatturapa.export']
+
+    def _create_attachment(self, name, size=100, date_invoice=None):
+        # Different content for each file, the filestore deduplicates them
+        content = (name.encode() * size)[:size]
+        attachment = self.attach_model.create({
+            'name': name,
+            'datas_fname': name,
+            'datas': base64.b64encode(content),
+        })
+        if date_invoice:
+            invoice = self._create_invoice()
+            invoice.write({
+                'date_invoice': date_invoice,
+                'fatturapa_attachment_out_id': attachment.id,
+            })
+        return attachment
+
+    def _export(self, attachments, **values):
+        wizard = self.export_wizard_model.create(dict(values, name='test'))
+        action = wizard.with_context(
+            active_model=attachments._name,
+            active_ids=attachments.ids,
+        ).export_zip()
+        if action.get('res_id'):
+            return self.env['ir.attachment'].browse(action['res_id'])
+        return self.env['ir.attachment'].search(action['domain'])
+
+    def _get_zip_names(self, zip_att):
+        content = base64.b64decode(zip_att.datas)
+        with zipfile.ZipFile(io.BytesIO(content)) as zf:
+            return sorted(zf.namelist())
+
+    def test_export_single_zip(self):
+        att_1 = self._create_attachment('IT01234567890_00001.xml')
+        att_2 = self._create_attachment('IT01234567890_00002.xml')
+        zip_att = self._export(att_1 | att_2)
+        self.assertEqual(zip_att.datas_fname, 'test.zip')
+        self.assertEqual(
+            self._get_zip_names(zip_att),
+            ['IT01234567890_00001.xml', 'IT01234567890_00002.xml'])
+        self.assertEqual(att_1.exported_zip, zip_att)
+        self.assertEqual(att_2.exported_zip, zip_att)
+
+        with self.assertRaises(UserError):
+            self._export(att_1)
+
+    def test_export_split_by_month(self):
+        att_1 = self._create_attachment(
+            'IT01234567890_00001.xml', date_invoice='2020-02-10')
+        att_2 = self._create_attachment(
+            'IT01234567890_00002.xml', date_invoice='2020-01-31')
+        att_3 = self._create_attachment(
+            'IT01234567890_00003.xml', date_invoice='2020-02-01')
+        zip_atts = self._export(att_1 | att_2 | att_3, split_by='month')
+        self.assertEqual(
+            sorted(zip_atts.mapped('datas_fname')),
+            ['test_2020-01.zip', 'test_2020-02.zip'])
+        january_zip = zip_atts.filtered(
+            lambda z: z.datas_fname == 'test_2020-01.zip')
+        february_zip = zip_atts - january_zip
+        self.assertEqual(
+            self._get_zip_names(january_zip), ['IT01234567890_00002.xml'])
+        self.assertEqual(
+            self._get_zip_names(february_zip),
+            ['IT01234567890_00001.xml', 'IT01234567890_00003.xml'])
+        self.assertEqual(att_2.exported_zip, january_zip)
+        self.assertEqual(att_3.exported_zip, february_zip)
+
+    def test_export_split_by_size(self):
+        size = 400 * 1024
+        att_1 = self._create_attachment('IT01234567890_00001.xml', size)
+        att_2 = self._create_attachment('IT01234567890_00002.xml', size)
+        att_3 = self._create_attachment('IT01234567890_00003.xml', size)
+        zip_atts = self._export(
+            att_1 | att_2 | att_3, split_by='size', max_size=1)
+        self.assertEqual(
+            sorted(zip_atts.mapped('datas_fname')),
+            ['test_1.zip', 'test_2.zip'])
+        self.assertEqual(
+            self._get_zip_names(att_1.exported_zip),
+            ['IT01234567890_00001.xml', 'IT01234567890_00002.xml'])
+        self.assertEqual(
+            self._get_zip_names(att_3.exported_zip),
+            ['IT01234567890_00003.xml'])
+
+        # Everything fits in a single ZIP
+        att_4 = self._create_attachment('IT01234567890_00004.xml')
+        zip_att = self._export(att_4, split_by='size', max_size=1)
+        self.assertEqual(zip_att.datas_fname, 'test.zip')
+
+        att_5 = self._create_attachment('IT01234567890_00005.xml')
+        with self.assertRaises(UserError):
+            self._export(att_5, split_by='size', max_size=0)
+
+    def test_export_missing_file(self):
+        attachment = self._create_attachment('IT01234567890_00001.xml')
+        self.assertTrue(attachment.store_fname)
+        os.remove(self.env['ir.attachment']._full_path(
+            attachment.store_fname))
+        with self.assertRaises(UserError):
+            self._export(attachment)
+        self.assertFalse(attachment.exported_zip)
@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 
 import base64
-import io
+import os
+import tempfile
 import zipfile
+from collections import OrderedDict
 from datetime import datetime
 from odoo import models, api, fields, _
 from odoo.exceptions import UserError
@@ -19,6 +21,100 @@ class WizardAccountInvoiceExport(models.TransientModel):
 
     data = fields.Binary("File", readonly=True)
     name = fields.Char('Filename', default=_default_name, required=True)
+    split_by = fields.Selection([
+        ('none', 'Single ZIP'),
+        ('size', 'Size'),
+        ('month', 'Month'),
+    ], string='Split by', required=True, default='none',
+        help="Export the e-invoices in several ZIP files: "
+             "one for each month of the invoices, "
+             "or one every time the size limit is reached.")
+    max_size = fields.Integer(
+        'Max size (MB)', default=100,
+        help="Maximum size of the e-invoices contained in each ZIP file.")
+
+    def _get_export_month(self, att):
+        invoices = att.out_invoice_ids \
+            if att._name == 'fatturapa.attachment.out' else att.in_invoice_ids
+        dates = invoices.filtered('date_invoice').mapped('date_invoice')
+        export_date = min(dates) if dates else att.create_date
+        return export_date.strftime('%Y-%m')
+
+    def _get_export_groups(self, attachments):
+        """
+        Split `attachments` in the groups to be exported in the same ZIP.
+
+        :return: ordered dictionary {ZIP file name: attachments}.
+        """
+        if self.split_by == 'month':
+            groups = {}
+            for att in attachments:
+                month = self._get_export_month(att)
+                groups[month] = groups.get(month, attachments.browse()) | att
+            return OrderedDict(
+                ('%s_%s' % (self.name, month), groups[month])
+                for month in sorted(groups))
+
+        if self.split_by == 'size':
+            max_size = self.max_size * 1024 * 1024
+            if max_size <= 0:
+                raise UserError(_("Max size must be positive."))
+            groups = [attachments.browse()]
+            size = 0
+            for att in attachments:
+                if groups[-1] and size + att.file_size > max_size:
+                    groups.append(attachments.browse())
+                    size = 0
+                groups[-1] |= att
+                size += att.file_size
+            if len(groups) > 1:
+                return OrderedDict(
+                    ('%s_%d' % (self.name, number), group)
+                    for number, group in enumerate(groups, start=1))
+
+        return OrderedDict([(self.name, attachments)])
+
+    def _get_filestore_path(self, att):
+        """
+        Path of the file of `att` in the filestore,
+        False if the attachment is stored in the database
+        or its file is missing.
+        """
+        if not att.store_fname:
+            return False
+        full_path = self.env['ir.attachment']._full_path(att.store_fname)
+        return os.path.isfile(full_path) and full_path
+
+    def _write_zip(self, zip_file, attachments):
+        """
+        Write the files of `attachments` in `zip_file`,
+        reading them from the filestore when possible.
+        """
+        with zipfile.ZipFile(
+                zip_file, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for att in attachments:
+                full_path = self._get_filestore_path(att)
+                if full_path:
+                    zf.write(full_path, att.datas_fname)
+                else:
+                    zf.writestr(
+                        att.datas_fname, base64.b64decode(att.db_datas))
+
+    def _create_zip_attachment(self, zip_name, attachments):
+        with tempfile.TemporaryFile() as zip_file:
+            self._write_zip(zip_file, attachments)
+            zip_file.seek(0)
+            with tempfile.TemporaryFile() as encoded_file:
+                base64.encode(zip_file, encoded_file)
+                encoded_file.seek(0)
+                datas = encoded_file.read()
+        zip_att = self.env['ir.attachment'].create({
+            'name': zip_name + '.zip',
+            'datas_fname': zip_name + '.zip',
+            'datas': datas,
+        })
+        attachments.write({'exported_zip': zip_att.id})
+        return zip_att
 
     @api.multi
     def export_zip(self):
@@ -30,30 +126,30 @@ class WizardAccountInvoiceExport(models.TransientModel):
                 raise UserError(_(
                     "Attachment %s already exported. Remove ZIP file first"
                 ) % att.display_name)
-            if not att.datas or not att.datas_fname:
+            if not (self._get_filestore_path(att) or att.db_datas) \
+                    or not att.datas_fname:
                 raise UserError(
                     _("Attachment %s does not have XML file")
                     % att.display_name)
 
-        fp = io.BytesIO()
-        with zipfile.ZipFile(fp, mode="w") as zf:
-            for att in attachments:
-                zf.writestr(att.datas_fname, base64.b64decode(att.datas))
-        fp.seek(0)
-        data = fp.read()
-        attach_vals = {
-            'name': self.name + '.zip',
-            'datas_fname': self.name + '.zip',
-            'datas': base64.encodestring(data),
-        }
-        zip_att = self.env['ir.attachment'].create(attach_vals)
-        for att in attachments:
-            att.exported_zip = zip_att
+        zip_atts = self.env['ir.attachment']
+        for zip_name, group in self._get_export_groups(attachments).items():
+            zip_atts |= self._create_zip_attachment(zip_name, group)
+
+        if len(zip_atts) == 1:
+            return {
+                'view_type': 'form',
+                'name': _("Export E-Invoices"),
+                'res_id': zip_atts.id,
+                'view_mode': 'form',
+                'res_model': 'ir.attachment',
+                'type': 'ir.actions.act_window',
+            }
         return {
             'view_type': 'form',
             'name': _("Export E-Invoices"),
-            'res_id': zip_att.id,
-            'view_mode': 'form',
+            'domain': [('id', 'in', zip_atts.ids)],
+            'view_mode': 'tree,form',
             'res_model': 'ir.attachment',
             'type': 'ir.actions.act_window',
         }
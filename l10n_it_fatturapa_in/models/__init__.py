@@ -3,3 +3,4 @@ from . import attachment
 from . import account
 from . import partner
 from . import company
+from . import decimal_precision
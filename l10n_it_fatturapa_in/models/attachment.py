@@ -1,9 +1,11 @@
 
 import base64
 import logging
+from collections import defaultdict
 
 from odoo import fields, models, api, _
 from odoo.tools import format_date
+from odoo.tools.lru import LRU
 
 from odoo.addons.l10n_it_fatturapa.bindings import fatturapa
 
@@ -11,6 +13,24 @@ _logger = logging.getLogger(__name__)
 
 SELF_INVOICE_TYPES = ("TD16", "TD17", "TD18", "TD19", "TD20", "TD21", "TD27", "TD28")
 
+# Parsed e-bills, shared by the whole worker and keyed by the checksum
+# of the attachment content and the reader: the same XML is parsed
+# by several computed fields and by the import wizard,
+# and parsing it is expensive.
+# Values are `(invoice_obj, error message)` tuples
+# and must be treated as read-only.
+INVOICE_OBJ_CACHE_SIZE = 64
+_invoice_obj_cache = LRU(INVOICE_OBJ_CACHE_SIZE)
+
+XML_READERS = {
+    'pyxb': 'CreateFromDocument',
+    'lxml': 'CreateFromDocumentLxml',
+}
+"""
+Values of system parameter `fatturapa.in.xml.reader`
+mapped to the function of the bindings parsing the e-bill.
+"""
+
 
 class FatturaPAAttachmentIn(models.Model):
     _inherit = "fatturapa.attachment"
@@ -46,6 +66,11 @@ class FatturaPAAttachmentIn(models.Model):
         compute="_compute_e_invoice_parsing_error",
         store=True,
     )
+    e_invoice_import_error = fields.Text(
+        "Import Error", readonly=True, copy=False,
+        help="Error raised the last time this file has been imported "
+             "skipping files with errors.",
+    )
     is_self_invoice = fields.Boolean(
         "Contains self invoices", compute="_compute_is_self_invoice", store=True
     )
@@ -90,6 +115,56 @@ class FatturaPAAttachmentIn(models.Model):
 
         self._compute_registered()
 
+    @api.multi
+    def write(self, vals):
+        if 'datas' in vals:
+            self._invalidate_invoice_obj_cache()
+        return super().write(vals)
+
+    @api.multi
+    def _invalidate_invoice_obj_cache(self):
+        for att in self:
+            if att.checksum:
+                for reader in XML_READERS:
+                    _invoice_obj_cache.pop((att.checksum, reader), None)
+
+    @api.model
+    def _get_xml_reader(self):
+        """Reader of e-bills, from system parameter `fatturapa.in.xml.reader`."""
+        reader = self.env['ir.config_parameter'].sudo().get_param(
+            'fatturapa.in.xml.reader', 'pyxb')
+        if reader not in XML_READERS:
+            _logger.warning(
+                "Unknown e-bill XML reader %s, using pyxb", reader)
+            reader = 'pyxb'
+        return reader
+
+    @api.multi
+    def _parse_invoice_obj(self):
+        """
+        Parse the invoice, looking into the cache of parsed e-bills first.
+
+        :return: tuple `(invoice_obj, error)`, where `error`
+            is the message of the parsing exception or `False`.
+            Only the message is kept, so that the cache does not hold
+            tracebacks and their frames.
+        """
+        self.ensure_one()
+        reader = self._get_xml_reader()
+        cache_key = self.checksum and (self.checksum, reader)
+        if cache_key and cache_key in _invoice_obj_cache:
+            return _invoice_obj_cache[cache_key]
+
+        invoice_obj = error = False
+        try:
+            xml_string = self.get_xml_string()
+            invoice_obj = getattr(fatturapa, XML_READERS[reader])(xml_string)
+        except Exception as e:
+            error = str(e) or repr(e)
+        if cache_key:
+            _invoice_obj_cache[cache_key] = invoice_obj, error
+        return invoice_obj, error
+
     @api.multi
     def get_invoice_obj(self):
         """
@@ -100,19 +175,19 @@ class FatturaPAAttachmentIn(models.Model):
          - save the parsing error in field `e_invoice_parsing_error`
          - return `False`
 
+        The parsed invoice is cached by attachment content,
+        so it must not be modified.
+
         :rtype: lxml.etree.ElementTree or bool.
         """
         self.ensure_one()
-        invoice_obj = False
-        try:
-            xml_string = self.get_xml_string()
-            invoice_obj = fatturapa.CreateFromDocument(xml_string)
-        except Exception as e:
+        invoice_obj, error = self._parse_invoice_obj()
+        if error:
             error_msg = \
                 _("Impossible to parse XML for {att_name}: {error_msg}") \
                 .format(
                     att_name=self.display_name,
-                    error_msg=e,
+                    error_msg=error,
                 )
             _logger.warning(error_msg)
             self.e_invoice_parsing_error = error_msg
@@ -224,6 +299,43 @@ class FatturaPAAttachmentIn(models.Model):
             else:
                 att.registered = False
 
+    @api.model
+    def _get_attachments_to_import_domain(self):
+        return [
+            ('in_invoice_ids', '=', False),
+            ('is_self_invoice', '=', False),
+            ('e_invoice_parsing_error', '=', False),
+            ('e_invoice_import_error', '=', False),
+        ]
+
+    @api.model
+    def cron_import_e_invoices(self):
+        """
+        Import e-bill files that are not registered yet.
+
+        Files of the same supplier are imported together,
+        using the settings of the supplier;
+        files that cannot be imported are skipped
+        and their error is saved in `e_invoice_import_error`.
+        """
+        attachments = self.search(self._get_attachments_to_import_domain())
+        supplier_attachment_ids = defaultdict(list)
+        for attachment in attachments:
+            supplier_attachment_ids[attachment.xml_supplier_id.id] \
+                .append(attachment.id)
+
+        wizard_model = self.env['wizard.import.fatturapa']
+        for attachment_ids in supplier_attachment_ids.values():
+            wizard = wizard_model.with_context(
+                active_ids=attachment_ids,
+                active_model=self._name,
+            ).create({
+                'skip_errors': True,
+            })
+            wizard.with_context(
+                fatturapa_import_commit=True,
+            ).importFatturaPA()
+
     def extract_attachments(self, AttachmentsData, invoice_id):
         AttachModel = self.env['fatturapa.attachments']
         for attach in AttachmentsData:
@@ -0,0 +1,41 @@
+#  License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+import threading
+from contextlib import contextmanager
+
+from odoo import api, models
+
+_local = threading.local()
+
+
+@contextmanager
+def precision_override(precisions):
+    """
+    Override decimal precisions in the current thread only.
+
+    Precision of Float fields is read through a new cursor,
+    so it cannot be changed by the context or by uncommitted writes:
+    this allows e.g. importing e-bills with more digits than the
+    configured ones, without changing `decimal.precision` records
+    used by every other thread.
+
+    :param precisions: dictionary mapping
+        precision names to the digits to be used.
+    """
+    previous = getattr(_local, 'precisions', None)
+    _local.precisions = dict(previous or {}, **precisions)
+    try:
+        yield
+    finally:
+        _local.precisions = previous
+
+
+class DecimalPrecision(models.Model):
+    _inherit = 'decimal.precision'
+
+    @api.model
+    def precision_get(self, application):
+        precisions = getattr(_local, 'precisions', None)
+        if precisions and application in precisions:
+            return precisions[application]
+        return super().precision_get(application)
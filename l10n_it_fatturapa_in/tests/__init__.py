@@ -1,3 +1,4 @@
 
 from . import fatturapa_common
 from . import test_import_fatturapa_xml
+from . import test_xml_reader
@@ -5,6 +5,7 @@ from datetime import date
 from odoo.tools import mute_logger
 from .fatturapa_common import FatturapaCommon
 from odoo.exceptions import UserError, ValidationError
+from ..wizard.wizard_import_fatturapa import ImportLookupCache
 
 
 class TestDuplicatedAttachment(FatturapaCommon):
@@ -745,8 +746,19 @@ class TestFatturaPAXMLValidation(FatturapaCommon):
         self.assertTrue(
             "Untaxed amount (44480.0) does not match with e-bill untaxed amount "
             "(44519.26)" in invoice.e_invoice_validation_message)
-        # Due to multiple SQL transactions, we cannot test the correct importation.
-        # IT01234567890_FPR14.xml should be tested manually
+
+    def test_47_xml_import_decimal_digits(self):
+        precision_model = self.env['decimal.precision']
+        price_digits = precision_model.precision_get('Product Price')
+        res = self.run_wizard(
+            'test47_decimal_digits', 'IT01234567890_FPR14.xml',
+            wiz_values={'price_decimal_digits': 8})
+        invoice_id = res.get('domain')[0][2][0]
+        invoice = self.invoice_model.browse(invoice_id)
+        self.assertEqual(invoice.amount_untaxed, 44519.26)
+        # Configured precision is not changed
+        self.assertEqual(
+            precision_model.precision_get('Product Price'), price_digits)
 
     def test_48_xml_import(self):
         # bank account already exists for another partner
@@ -1080,6 +1092,61 @@ class TestFatturaPAXMLValidation(FatturapaCommon):
         invoice = self.invoice_model.browse(invoice_id)
         self.assertTrue(invoice)
 
+    def test_xml_parse_cache(self):
+        """The parsed e-bill is reused until the attachment content changes"""
+        attachment = self.create_attachment(
+            'test_parse_cache', 'IT02780790107_11004.xml')
+        fatt = attachment.get_invoice_obj()
+        self.assertTrue(fatt)
+        self.assertIs(attachment.get_invoice_obj(), fatt)
+
+        attachment.datas = self.getFile('IT05979361218_004.xml')[1]
+        new_fatt = attachment.get_invoice_obj()
+        self.assertTrue(new_fatt)
+        self.assertIsNot(new_fatt, fatt)
+        self.assertEqual(
+            new_fatt.FatturaElettronicaBody[0].DatiGenerali.
+            DatiGeneraliDocumento.Numero,
+            'FT/2015/0009')
+
+    def test_xml_import_skip_errors(self):
+        """Files with errors are skipped, the other files are imported"""
+        not_parsable = self.create_attachment(
+            'test_skip_errors_1', 'ZGEXQROO37831_anonimizzata.xml')
+        valid = self.create_attachment(
+            'test_skip_errors_2', 'IT05979361218_004.xml')
+        wizard = self.wizard_model.with_context(
+            active_ids=(not_parsable | valid).ids,
+            active_model='fatturapa.attachment.in',
+        ).create({
+            'skip_errors': True,
+        })
+        res = wizard.importFatturaPA()
+        invoices = self.invoice_model.browse(res['domain'][0][2])
+        self.assertEqual(invoices.fatturapa_attachment_in_id, valid)
+        self.assertFalse(valid.e_invoice_import_error)
+        self.assertFalse(not_parsable.in_invoice_ids)
+        self.assertIn(
+            'Cannot import an attachment that could not be parsed',
+            not_parsable.e_invoice_import_error)
+
+    def test_xml_import_lookup_cache(self):
+        """Lookups repeated in the same import are cached"""
+        lookup_cache = ImportLookupCache()
+        attachment = self.create_attachment(
+            'test_lookup_cache', 'IT05979361218_004.xml')
+        wizard = self.wizard_model.with_context(
+            active_ids=attachment.ids,
+            active_model='fatturapa.attachment.in',
+            e_invoice_lookup_cache=lookup_cache,
+        ).create({})
+        res = wizard.importFatturaPA()
+        invoice = self.invoice_model.browse(res['domain'][0][2])
+        self.assertEqual(invoice.amount_total, 1431.79)
+        # Both lines have the same tax
+        self.assertTrue(lookup_cache.hits)
+        self.assertTrue(lookup_cache.misses)
+
     def test_01_xml_link(self):
         """
         E-invoice lines are created.
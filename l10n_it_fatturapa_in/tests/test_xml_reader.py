@@ -0,0 +1,118 @@
+import logging
+import os
+import timeit
+
+from lxml import etree
+
+from odoo.modules import get_module_resource
+from odoo.tools import mute_logger
+
+from odoo.addons.l10n_it_fatturapa.bindings import fatturapa
+from odoo.addons.l10n_it_fatturapa.bindings.lxml_reader import Element
+from .fatturapa_common import FatturapaCommon
+
+BINDINGS_LOGGER = 'odoo.addons.l10n_it_fatturapa.bindings.fatturapa'
+
+_logger = logging.getLogger(__name__)
+
+
+class TestXMLReader(FatturapaCommon):
+
+    def get_test_xml_strings(self):
+        """Cleaned up content of test files that can be parsed by PyXB."""
+        attachment_model = self.env['fatturapa.attachment.in']
+        data_path = get_module_resource('l10n_it_fatturapa_in', 'tests', 'data')
+        xml_strings = {}
+        for file_name in sorted(os.listdir(data_path)):
+            if not file_name.lower().endswith('.xml'):
+                continue
+            with open(os.path.join(data_path, file_name), 'rb') as test_data:
+                data = test_data.read()
+            try:
+                with mute_logger(BINDINGS_LOGGER):
+                    xml_string = attachment_model.cleanup_xml(data)
+                    fatturapa.CreateFromDocument(xml_string)
+            except Exception:
+                continue
+            xml_strings[file_name] = xml_string
+        return xml_strings
+
+    def assertReadEqual(self, lxml_obj, pyxb_obj, path):
+        if isinstance(lxml_obj, Element):
+            for name, value in vars(lxml_obj).items():
+                if name.startswith('_'):
+                    continue
+                self.assertReadEqual(
+                    value, getattr(pyxb_obj, name), '%s/%s' % (path, name))
+        elif isinstance(lxml_obj, list):
+            self.assertEqual(len(lxml_obj), len(pyxb_obj), path)
+            for index, (lxml_item, pyxb_item) in \
+                    enumerate(zip(lxml_obj, pyxb_obj), start=1):
+                self.assertReadEqual(
+                    lxml_item, pyxb_item, '%s[%s]' % (path, index))
+        else:
+            self.assertEqual(lxml_obj, pyxb_obj, path)
+
+    def test_readers_equivalence(self):
+        """Both readers return the same values for every test file"""
+        xml_strings = self.get_test_xml_strings()
+        self.assertTrue(xml_strings)
+        for file_name, xml_string in xml_strings.items():
+            with mute_logger(BINDINGS_LOGGER):
+                lxml_obj = fatturapa.CreateFromDocumentLxml(xml_string)
+                pyxb_obj = fatturapa.CreateFromDocument(xml_string)
+            self.assertIsInstance(lxml_obj, Element, file_name)
+            self.assertReadEqual(lxml_obj, pyxb_obj, file_name)
+            self.assertEqual(
+                lxml_obj._xmldoctor, pyxb_obj._xmldoctor, file_name)
+
+    def test_readers_benchmark(self):
+        """Log the time spent by both readers on the test files,
+        timings depend on the machine so they are not asserted"""
+        xml_strings = list(self.get_test_xml_strings().values())
+        repeat = 5
+
+        def read_all(reader):
+            with mute_logger(BINDINGS_LOGGER):
+                for xml_string in xml_strings:
+                    reader(xml_string)
+
+        pyxb_time = timeit.timeit(
+            lambda: read_all(fatturapa.CreateFromDocument), number=repeat)
+        lxml_time = timeit.timeit(
+            lambda: read_all(fatturapa.CreateFromDocumentLxml),
+            number=repeat)
+        _logger.info(
+            "Reading %d e-invoice files %d times: PyXB %.3fs, lxml %.3fs",
+            len(xml_strings), repeat, pyxb_time, lxml_time)
+
+    def test_lxml_reader_fallback(self):
+        """Documents not matching the XSD are parsed by PyXB"""
+        xml_string = self.get_test_xml_strings()['IT02780790107_11004.xml']
+        root = etree.fromstring(xml_string)
+        header = root.find('FatturaElettronicaHeader')
+        etree.SubElement(header, 'UnknownElement').text = 'Unknown'
+        xml_string = etree.tostring(root)
+
+        with mute_logger(BINDINGS_LOGGER):
+            with self.assertRaises(Exception) as pyxb_error:
+                fatturapa.CreateFromDocument(xml_string)
+            with self.assertRaises(Exception) as lxml_error:
+                fatturapa.CreateFromDocumentLxml(xml_string)
+        self.assertIs(
+            type(lxml_error.exception), type(pyxb_error.exception))
+
+    def test_import_lxml_reader(self):
+        self.env['ir.config_parameter'].sudo().set_param(
+            'fatturapa.in.xml.reader', 'lxml')
+        res = self.run_wizard('test_lxml_reader', 'IT02780790107_11004.xml')
+        invoice = self.env['account.invoice'].browse(res['domain'][0][2][0])
+        self.assertIsInstance(
+            invoice.fatturapa_attachment_in_id.get_invoice_obj(), Element)
+        self.assertEqual(invoice.reference, '123')
+        self.assertEqual(invoice.date_invoice.isoformat(), '2014-12-18')
+        self.assertEqual(invoice.amount_untaxed, 34.00)
+        self.assertEqual(invoice.amount_tax, 7.48)
+        self.assertEqual(invoice.partner_id.vat, "IT02780790107")
+        self.assertEqual(
+            invoice.tax_representative_id.name, "Rappresentante fiscale")
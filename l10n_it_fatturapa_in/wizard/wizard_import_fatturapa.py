@@ -3,19 +3,25 @@
 
 import logging
 import re
-import odoo
 from odoo import models, api, fields
 from odoo.fields import first
 from odoo.osv import expression
-from odoo.tools import float_is_zero, frozendict
+from odoo.tools import float_is_zero, frozendict, split_every
 from odoo.tools.safe_eval import safe_eval
 from odoo.tools.translate import _
 from odoo.exceptions import UserError, ValidationError
 
 from odoo.addons.base_iban.models.res_partner_bank import pretty_iban
+from ..models.decimal_precision import precision_override
 
 _logger = logging.getLogger(__name__)
 
+IMPORT_CHUNK_SIZE = 50
+"""
+Number of files imported between two commits
+when errors are skipped and commits are allowed.
+"""
+
 WT_CODES_MAPPING = {
     'RT01': 'ritenuta',
     'RT02': 'ritenuta',
@@ -30,6 +36,44 @@ class PartnerDuplicatedException (UserError):
     pass
 
 
+class ImportLookupCache(object):
+    """
+    Results of the searches done while importing e-bills,
+    keyed by model, domain and order.
+
+    Only ids are stored, so that results can be used in any environment.
+    """
+
+    def __init__(self):
+        self.results = {}
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        """Forget every result, i.e. after a rollback."""
+        self.results.clear()
+
+    def search(self, model, domain, order=None, cache_empty=True):
+        """
+        Search `model` records matching `domain`.
+
+        :param cache_empty: cache the result even if no record is found;
+            it must be False for records that might be created
+            during the import.
+        """
+        key = (model._name, repr(domain), order)
+        ids = self.results.get(key)
+        if ids is not None:
+            self.hits += 1
+            return model.browse(ids)
+
+        self.misses += 1
+        records = model.search(domain, order=order)
+        if records or cache_empty:
+            self.results[key] = tuple(records.ids)
+        return records
+
+
 class WizardImportFatturapa(models.TransientModel):
     _name = "wizard.import.fatturapa"
     _description = "Import E-bill"
@@ -63,6 +107,12 @@ class WizardImportFatturapa(models.TransientModel):
         "Discounts decimal digits", required=True,
         help="Decimal digits used for discount field. See \"Prices decimal digits\"."
     )
+    skip_errors = fields.Boolean(
+        "Skip files with errors",
+        help="Files that cannot be imported are skipped "
+             "and their error is saved in the file, "
+             "the other files are imported anyway."
+    )
 
     @api.model
     def default_get(self, fields):
@@ -99,13 +149,25 @@ class WizardImportFatturapa(models.TransientModel):
                         partners[0].e_invoice_discount_decimal_digits)
         return res
 
+    def _lookup_search(self, model_name, domain, order=None, cache_empty=True):
+        """
+        Search `model_name` records matching `domain`,
+        using the lookup cache of the current import, if any.
+
+        See `ImportLookupCache.search`.
+        """
+        model = self.env[model_name]
+        lookup_cache = self.env.context.get('e_invoice_lookup_cache')
+        if lookup_cache is None:
+            return model.search(domain, order=order)
+        return lookup_cache.search(
+            model, domain, order=order, cache_empty=cache_empty)
+
     def CountryByCode(self, CountryCode):
-        country_model = self.env['res.country']
-        return country_model.search([('code', '=', CountryCode)])
+        return self._lookup_search('res.country', [('code', '=', CountryCode)])
 
     def ProvinceByCode(self, provinceCode):
-        province_model = self.env['res.country.state']
-        return province_model.search([
+        return self._lookup_search('res.country.state', [
             ('code', '=', provinceCode),
             ('country_id.code', '=', 'IT')
         ])
@@ -240,7 +302,8 @@ class WizardImportFatturapa(models.TransientModel):
         domains = self._get_partner_domains_by_vat_fc(vat, fc)
         partner_model = self.env['res.partner']
         for domain in domains:
-            partners = partner_model.search(domain)
+            partners = self._lookup_search(
+                'res.partner', domain, cache_empty=False)
             if partners:
                 break
         else:
@@ -555,7 +618,8 @@ class WizardImportFatturapa(models.TransientModel):
         if supplier_taxes_ids:
             def_purchase_tax = account_tax_model.browse(supplier_taxes_ids)[0]
         if float(AliquotaIVA) == 0.0 and Natura:
-            account_taxes = account_tax_model.search(
+            account_taxes = self._lookup_search(
+                'account.tax',
                 [
                     ('type_tax_use', '=', 'purchase'),
                     ('kind_id.code', '=', Natura),
@@ -574,7 +638,8 @@ class WizardImportFatturapa(models.TransientModel):
                     % (AliquotaIVA, Natura,
                        account_taxes[0].description))
         else:
-            account_taxes = account_tax_model.search(
+            account_taxes = self._lookup_search(
+                'account.tax',
                 [
                     ('type_tax_use', '=', 'purchase'),
                     ('amount', '=', float(AliquotaIVA)),
@@ -872,11 +937,11 @@ class WizardImportFatturapa(models.TransientModel):
         details = line.DettaglioPagamento or False
         if details:
             PaymentModel = self.env['fatturapa.payment.detail']
-            PaymentMethodModel = self.env['fatturapa.payment_method']
             BankModel = self.env['res.bank']
             PartnerBankModel = self.env['res.partner.bank']
             for dline in details:
-                method = PaymentMethodModel.search(
+                method = self._lookup_search(
+                    'fatturapa.payment_method',
                     [('code', '=', dline.ModalitaPagamento)]
                 )
                 if not method:
@@ -933,8 +998,10 @@ class WizardImportFatturapa(models.TransientModel):
                 bank = False
                 payment_bank_id = False
                 if dline.BIC:
-                    banks = BankModel.search(
-                        [('bic', '=', dline.BIC.strip())]
+                    banks = self._lookup_search(
+                        'res.bank',
+                        [('bic', '=', dline.BIC.strip())],
+                        cache_empty=False,
                     )
                     if not banks:
                         if not dline.IstitutoFinanziario:
@@ -964,7 +1031,8 @@ class WizardImportFatturapa(models.TransientModel):
                         )),
                     ]
                     payment_bank_id = False
-                    payment_banks = PartnerBankModel.search(SearchDom)
+                    payment_banks = self._lookup_search(
+                        'res.partner.bank', SearchDom, cache_empty=False)
                     if not payment_banks and not bank:
                         self.log_inconsistency(
                             _(
@@ -979,10 +1047,10 @@ class WizardImportFatturapa(models.TransientModel):
                             )
                         )
                     elif not payment_banks and bank:
-                        existing_account = PartnerBankModel.search([
+                        existing_account = self._lookup_search('res.partner.bank', [
                             ("acc_number", "=", pretty_iban(iban)),
                             ("company_id", "=", invoice.company_id.id)
-                        ])
+                        ], cache_empty=False)
                         if existing_account:
                             self.log_inconsistency(
                                 _("Bank account %s already exists") % iban)
@@ -1021,13 +1089,12 @@ class WizardImportFatturapa(models.TransientModel):
                 CedentePrestatore.StabileOrganizzazione.Nazione)
 
     def get_purchase_journal(self, company):
-        journal_model = self.env['account.journal']
-        journals = journal_model.search(
+        journals = self._lookup_search(
+            'account.journal',
             [
                 ('type', '=', 'purchase'),
                 ('company_id', '=', company.id)
-            ],
-            limit=1)
+            ])
         if not journals:
             raise UserError(
                 _(
@@ -1133,8 +1200,6 @@ class WizardImportFatturapa(models.TransientModel):
     ):
         partner_model = self.env['res.partner']
         invoice_model = self.env['account.invoice']
-        currency_model = self.env['res.currency']
-        ftpa_doctype_model = self.env['fiscal.document.type']
         rel_docs_model = self.env['fatturapa.related_document_type']
 
         company = self.env.user.company_id
@@ -1142,7 +1207,8 @@ class WizardImportFatturapa(models.TransientModel):
         pay_acc_id = partner.property_account_payable_id.id
 
         # currency 2.1.1.2
-        currency = currency_model.search(
+        currency = self._lookup_search(
+            'res.currency',
             [
                 (
                     'name', '=',
@@ -1164,7 +1230,8 @@ class WizardImportFatturapa(models.TransientModel):
         invtype = 'in_invoice'
         docType = FatturaBody.DatiGenerali.DatiGeneraliDocumento.TipoDocumento
         if docType:
-            docType_record = ftpa_doctype_model.search(
+            docType_record = self._lookup_search(
+                'fiscal.document.type',
                 [
                     ('code', '=', docType)
                 ]
@@ -1477,14 +1544,14 @@ class WizardImportFatturapa(models.TransientModel):
                 self.env['account.invoice'].browse(invoice_id).date_due = due_dates[0]
         if PaymentsData:
             PaymentDataModel = self.env['fatturapa.payment.data']
-            PaymentTermsModel = self.env['fatturapa.payment_term']
             for PaymentLine in PaymentsData:
                 cond = PaymentLine.CondizioniPagamento or False
                 if not cond:
                     raise UserError(
                         _('Payment method code not found in document.')
                     )
-                terms = PaymentTermsModel.search([('code', '=', cond)])
+                terms = self._lookup_search(
+                    'fatturapa.payment_term', [('code', '=', cond)])
                 if not terms:
                     raise UserError(
                         _('Payment method code %s is incorrect.') % cond
@@ -1508,7 +1575,7 @@ class WizardImportFatturapa(models.TransientModel):
         invoice_data['ftpa_withholding_ids'] = []
         wt_founds = []
         for Withholding in Withholdings:
-            wts = self.env['withholding.tax'].search([
+            wts = self._lookup_search('withholding.tax', [
                 ('causale_pagamento_id.code', '=', Withholding.CausalePagamento)
             ])
             if not wts:
@@ -1724,143 +1791,168 @@ class WizardImportFatturapa(models.TransientModel):
                     % (invoice.amount_untaxed, amount_untaxed)
                 )
 
-    def _set_decimal_precision(self, precision_name, field_name):
-        precision = self.env["decimal.precision"].search([
-            ("name", "=", precision_name)], limit=1)
-        different_precisions = original_precision = None
-        if precision:
-            precision_id = precision.id
-            original_precision = precision.digits
-            different_precisions = (
-                self[field_name] != original_precision)
-            if different_precisions:
-                with odoo.registry(self.env.cr.dbname).cursor() as new_cr:
-                    # We need a new env (and cursor) because 'digits' property of Float
-                    # fields is retrieved with a new LazyCursor,
-                    # see class Float at odoo.fields,
-                    # so we need to write (commit) to DB in order to make the new
-                    # precision available
-                    new_env = api.Environment(new_cr, self.env.uid, self.env.context)
-                    new_precision = new_env["decimal.precision"].browse(precision_id)
-                    new_precision.sudo().write({"digits": self[field_name]})
-                    new_cr.commit()
-        return precision, different_precisions, original_precision
-
-    def _restore_original_precision(self, precision, original_precision):
-        with odoo.registry(self.env.cr.dbname).cursor() as new_cr:
-            new_env = api.Environment(new_cr, self.env.uid, self.env.context)
-            new_price_precision = new_env["decimal.precision"].browse(precision.id)
-            new_price_precision.sudo().write({"digits": original_precision})
-            new_cr.commit()
-
-    @api.multi
-    def importFatturaPA(self):
-        self.ensure_one()
-        fatturapa_attachment_obj = self.env['fatturapa.attachment.in']
-        fatturapa_attachment_ids = self.env.context.get('active_ids', False)
-        invoice_model = self.env['account.invoice']
+    def _get_decimal_precisions(self):
+        """Precisions used in this import, by precision name."""
+        return {
+            "Product Price": self.price_decimal_digits,
+            "Product Unit of Measure": self.quantity_decimal_digits,
+            "Discount": self.discount_decimal_digits,
+        }
 
-        price_precision, different_price_precisions, original_price_precision =\
-            self._set_decimal_precision(
-                "Product Price", "price_decimal_digits")
-        qty_precision, different_qty_precisions, original_qty_precision =\
-            self._set_decimal_precision(
-                "Product Unit of Measure", "quantity_decimal_digits")
-        discount_precision, different_discount_precisions,\
-            original_discount_precision = self._set_decimal_precision(
-                "Discount", "discount_decimal_digits")
+    def _import_attachment(self, fatturapa_attachment):
+        """
+        Create the bills contained in `fatturapa_attachment`.
 
+        :return: list of ids of the created bills.
+        """
+        invoice_model = self.env['account.invoice']
         new_invoices = []
-        for fatturapa_attachment_id in fatturapa_attachment_ids:
+        self.reset_inconsistencies()
+        if fatturapa_attachment.in_invoice_ids:
+            raise UserError(
+                _("File is linked to bills yet."))
+
+        fatt = fatturapa_attachment.get_invoice_obj()
+        if not fatt:
+            raise UserError(
+                _("Cannot import an attachment that could not be parsed.\n"
+                  "Please fix the parsing error first, then try again."))
+
+        cedentePrestatore = fatt.FatturaElettronicaHeader.CedentePrestatore
+        # 1.2
+        partner_id = self.getCedPrest(cedentePrestatore)
+        # 1.3
+        TaxRappresentative = fatt.FatturaElettronicaHeader.\
+            RappresentanteFiscale
+        # 1.5
+        Intermediary = fatt.FatturaElettronicaHeader.\
+            TerzoIntermediarioOSoggettoEmittente
+
+        generic_inconsistencies = ''
+        existing_inconsistencies = self.get_inconsistencies()
+        if existing_inconsistencies:
+            generic_inconsistencies = (
+                existing_inconsistencies + '\n\n')
+
+        xmlproblems = getattr(fatt, '_xmldoctor', None)
+        if xmlproblems:  # None or []
+            generic_inconsistencies += '\n'.join(xmlproblems) + '\n\n'
+
+        # 2
+        for fattura in fatt.FatturaElettronicaBody:
+
+            # reset inconsistencies
             self.reset_inconsistencies()
-            fatturapa_attachment = fatturapa_attachment_obj.browse(
-                fatturapa_attachment_id)
-            if fatturapa_attachment.in_invoice_ids:
-                raise UserError(
-                    _("File is linked to bills yet."))
 
-            fatt = fatturapa_attachment.get_invoice_obj()
-            if not fatt:
-                raise UserError(
-                    _("Cannot import an attachment that could not be parsed.\n"
-                      "Please fix the parsing error first, then try again."))
-
-            cedentePrestatore = fatt.FatturaElettronicaHeader.CedentePrestatore
-            # 1.2
-            partner_id = self.getCedPrest(cedentePrestatore)
-            # 1.3
-            TaxRappresentative = fatt.FatturaElettronicaHeader.\
-                RappresentanteFiscale
-            # 1.5
-            Intermediary = fatt.FatturaElettronicaHeader.\
-                TerzoIntermediarioOSoggettoEmittente
-
-            generic_inconsistencies = ''
+            invoice_id = self.invoiceCreate(
+                fatt, fatturapa_attachment, fattura, partner_id)
+            invoice = invoice_model.browse(invoice_id)
+            self.set_StabileOrganizzazione(cedentePrestatore, invoice)
+            if TaxRappresentative:
+                tax_partner_id = self.getPartnerBase(
+                    TaxRappresentative.DatiAnagrafici,
+                    supplier=False,
+                    raise_if_duplicated=False,
+                )
+                invoice.write(
+                    {
+                        'tax_representative_id': tax_partner_id
+                    }
+                )
+            if Intermediary:
+                Intermediary_id = self.getPartnerBase(
+                    Intermediary.DatiAnagrafici,
+                    supplier=False,
+                    raise_if_duplicated=False,
+                    raise_if_vat_not_valid=False,
+                )
+                invoice.write(
+                    {
+                        'intermediary': Intermediary_id
+                    }
+                )
+            new_invoices.append(invoice_id)
+            self.check_invoice_amount(invoice, fattura)
+
+            invoice.set_einvoice_data(fattura)
+
             existing_inconsistencies = self.get_inconsistencies()
             if existing_inconsistencies:
-                generic_inconsistencies = (
-                    existing_inconsistencies + '\n\n')
-
-            xmlproblems = getattr(fatt, '_xmldoctor', None)
-            if xmlproblems:  # None or []
-                generic_inconsistencies += '\n'.join(xmlproblems) + '\n\n'
-
-            # 2
-            for fattura in fatt.FatturaElettronicaBody:
-
-                # reset inconsistencies
-                self.reset_inconsistencies()
-
-                invoice_id = self.invoiceCreate(
-                    fatt, fatturapa_attachment, fattura, partner_id)
-                invoice = invoice_model.browse(invoice_id)
-                self.set_StabileOrganizzazione(cedentePrestatore, invoice)
-                if TaxRappresentative:
-                    tax_partner_id = self.getPartnerBase(
-                        TaxRappresentative.DatiAnagrafici,
-                        supplier=False,
-                        raise_if_duplicated=False,
-                    )
-                    invoice.write(
-                        {
-                            'tax_representative_id': tax_partner_id
-                        }
-                    )
-                if Intermediary:
-                    Intermediary_id = self.getPartnerBase(
-                        Intermediary.DatiAnagrafici,
-                        supplier=False,
-                        raise_if_duplicated=False,
-                        raise_if_vat_not_valid=False,
-                    )
-                    invoice.write(
-                        {
-                            'intermediary': Intermediary_id
-                        }
-                    )
-                new_invoices.append(invoice_id)
-                self.check_invoice_amount(invoice, fattura)
+                invoice_inconsistencies = existing_inconsistencies
+            else:
+                invoice_inconsistencies = ''
+            invoice.inconsistencies = (
+                generic_inconsistencies + invoice_inconsistencies)
 
-                invoice.set_einvoice_data(fattura)
+        return new_invoices
 
-                existing_inconsistencies = self.get_inconsistencies()
-                if existing_inconsistencies:
-                    invoice_inconsistencies = existing_inconsistencies
+    def _import_attachments_skip_errors(self, attachments, commit=False):
+        """
+        Import every file in `attachments` in its own savepoint,
+        so that a file that cannot be imported does not prevent
+        the import of the other files.
+
+        The error of each file is saved in `e_invoice_import_error`.
+
+        :param commit: commit the imported files
+            every `IMPORT_CHUNK_SIZE` files, for long running imports.
+        :return: list of ids of the created bills.
+        """
+        attachment_model = self.env['fatturapa.attachment.in']
+        new_invoices = []
+        for attachment_ids in split_every(IMPORT_CHUNK_SIZE, attachments.ids):
+            for fatturapa_attachment in attachment_model.browse(attachment_ids):
+                try:
+                    with self.env.cr.savepoint():
+                        attachment_invoices = self._import_attachment(
+                            fatturapa_attachment)
+                except Exception as e:
+                    error = getattr(e, 'name', None) or str(e)
+                    _logger.info(
+                        "E-bill %s not imported: %s",
+                        fatturapa_attachment.display_name, error)
+                    # Discard the cache of records
+                    # that have been rolled back
+                    self.env.clear()
+                    lookup_cache = self.env.context.get(
+                        'e_invoice_lookup_cache')
+                    if lookup_cache is not None:
+                        lookup_cache.clear()
+                    fatturapa_attachment.e_invoice_import_error = error
                 else:
-                    invoice_inconsistencies = ''
-                invoice.inconsistencies = (
-                    generic_inconsistencies + invoice_inconsistencies)
-
-        if price_precision and different_price_precisions:
-            self._restore_original_precision(
-                price_precision, original_price_precision)
-        if qty_precision and different_qty_precisions:
-            self._restore_original_precision(
-                qty_precision, original_qty_precision)
-        if discount_precision and different_discount_precisions:
-            self._restore_original_precision(
-                discount_precision, original_discount_precision)
+                    new_invoices.extend(attachment_invoices)
+                    if fatturapa_attachment.e_invoice_import_error:
+                        fatturapa_attachment.e_invoice_import_error = False
+            if commit:
+                self.env.cr.commit()
+                self.invalidate_cache()
+        return new_invoices
 
+    @api.multi
+    def importFatturaPA(self):
+        self.ensure_one()
+        fatturapa_attachment_obj = self.env['fatturapa.attachment.in']
+        fatturapa_attachment_ids = self.env.context.get('active_ids', False)
+
+        lookup_cache = self.env.context.get('e_invoice_lookup_cache') \
+            or ImportLookupCache()
+        self = self.with_context(e_invoice_lookup_cache=lookup_cache)
+        attachments = fatturapa_attachment_obj.browse(fatturapa_attachment_ids)
+        with precision_override(self._get_decimal_precisions()):
+            if self.skip_errors:
+                new_invoices = self._import_attachments_skip_errors(
+                    attachments,
+                    commit=self.env.context.get('fatturapa_import_commit'),
+                )
+            else:
+                new_invoices = []
+                for fatturapa_attachment in attachments:
+                    new_invoices.extend(
+                        self._import_attachment(fatturapa_attachment))
+
+        _logger.debug(
+            "E-bills import lookups: %d cache hits, %d cache misses",
+            lookup_cache.hits, lookup_cache.misses)
         return {
             'view_type': 'form',
             'name': "Electronic Bills",
@@ -31,6 +31,7 @@
         'views/company_view.xml',
         'security/ir.model.access.csv',
         'data/l10n_it_fatturapa_out_data.xml',
+        'data/ir_cron.xml',
         'security/rules.xml',
     ],
     'installable': True,
@@ -1,6 +1,8 @@
 # Copyright 2014 Davide Corio
 # Copyright 2016 Lorenzo Battistini - Agile Business Group
 
+from collections import defaultdict
+
 from odoo import fields, models, api
 from odoo.exceptions import UserError
 from odoo.tools.translate import _
@@ -23,6 +25,23 @@ class AccountInvoice(models.Model):
         'fatturapa.attachment.out', 'E-invoice Export File',
         readonly=True, copy=False)
 
+    fatturapa_export_queued = fields.Boolean(
+        "E-invoice Export Queued", readonly=True, copy=False,
+        help="The e-invoice will be exported "
+             "by the scheduled action 'Export Queued E-invoices'.")
+    fatturapa_export_report_id = fields.Many2one(
+        'ir.actions.actions', "E-invoice Export Report",
+        readonly=True, copy=False,
+        help="Report to be included in the queued e-invoice.")
+    fatturapa_export_user_id = fields.Many2one(
+        'res.users', "E-invoice Export User",
+        readonly=True, copy=False,
+        help="User that queued the e-invoice export.")
+    fatturapa_export_error = fields.Text(
+        "E-invoice Export Error", readonly=True, copy=False,
+        help="Error of the last export by the scheduled action: "
+             "the invoice has been removed from the queue.")
+
     has_pdf_invoice_print = fields.Boolean(
         related='fatturapa_attachment_out_id.has_pdf_invoice_print',
         readonly=True)
@@ -48,6 +67,39 @@ class AccountInvoice(models.Model):
                 record.fatturapa_attachment_out_id.state
             )
 
+    @api.model
+    def cron_export_e_invoices(self, commit=True):
+        """
+        Export the queued invoices.
+
+        Invoices of the same partner are exported together
+        as in the export wizard, by the user that queued them,
+        committing after each file;
+        invoices that cannot be exported are removed from the queue,
+        the error is saved in the invoices
+        and notified to the user that queued them.
+        """
+        invoices = self.search([('fatturapa_export_queued', '=', True)])
+        queue_invoice_ids = defaultdict(list)
+        for invoice in invoices:
+            queue_invoice_ids[(
+                invoice.fatturapa_export_user_id.id,
+                invoice.fatturapa_export_report_id.id,
+            )].append(invoice.id)
+
+        wizard_model = self.env['wizard.export.fatturapa']
+        for (user_id, report_id), invoice_ids in queue_invoice_ids.items():
+            wizard = wizard_model.sudo(user_id or self.env.uid).with_context(
+                active_ids=invoice_ids,
+                active_model=self._name,
+            ).create({
+                'report_print_menu': report_id,
+            })
+            wizard.with_context(
+                fatturapa_export_commit=commit,
+                fatturapa_export_dequeue_errors=True,
+            ).exportFatturaPA()
+
     def preventive_checks(self):
         # hook for preventive checks. Override and raise exception, in case
         return
@@ -4,6 +4,17 @@
 from odoo import fields, models, api, _
 from odoo.exceptions import UserError
 
+SIGNED_FILE_EXTENSION = '.p7m'
+
+
+def get_file_name_key(file_name):
+    """Key of `file_name`, the same for the signed and unsigned file."""
+    if not file_name:
+        return False
+    if file_name.lower().endswith(SIGNED_FILE_EXTENSION):
+        file_name = file_name[:-len(SIGNED_FILE_EXTENSION)]
+    return file_name
+
 
 class FatturaPAAttachment(models.Model):
     _inherit = "fatturapa.attachment"
@@ -40,6 +51,11 @@ class FatturaPAAttachment(models.Model):
         readonly=True,
     )
     sending_date = fields.Datetime("Sent Date", readonly=True)
+    file_name_key = fields.Char(
+        "File Name Key", compute='_compute_file_name_key',
+        store=True, index=True,
+        help="File name without the signature extension, "
+             "used to find the e-invoice referenced by SdI notifications.")
     delivered_date = fields.Datetime("Delivered Date", readonly=True)
 
     _sql_constraints = [(
@@ -65,6 +81,37 @@ class FatturaPAAttachment(models.Model):
         vat = vat.replace(' ', '').replace('.', '').replace('-', '')
         return vat
 
+    @api.multi
+    @api.depends('datas_fname', 'name')
+    def _compute_file_name_key(self):
+        for att in self:
+            att.file_name_key = get_file_name_key(
+                att.datas_fname or att.name)
+
+    @api.model
+    def find_by_file_names(self, file_names):
+        """
+        Find the e-invoices of `file_names` with a single query,
+        regardless of the signature extension.
+
+        :return: dictionary mapping each file name
+            to the e-invoices having that name, if any.
+        """
+        keys = {
+            file_name: get_file_name_key(file_name)
+            for file_name in file_names
+        }
+        attachments_by_key = {}
+        for att in self.search([
+                ('file_name_key', 'in', list(set(keys.values())))]):
+            attachments_by_key.setdefault(att.file_name_key, self.browse())
+            attachments_by_key[att.file_name_key] |= att
+        return {
+            file_name: attachments_by_key[key]
+            for file_name, key in keys.items()
+            if key in attachments_by_key
+        }
+
     def file_name_exists(self, file_id):
         vat = self.get_file_vat()
         partial_fname = r'%s\_%s.' % (vat, file_id)  # escaping _ SQL
@@ -679,6 +679,53 @@ class TestFatturaPAXMLValidation(FatturaPACommon):
 
         self.assertEqual(invoice.state, 'open')
 
+    def test_find_by_file_names(self):
+        e_invoice = self._create_e_invoice()
+        file_name = e_invoice.datas_fname
+        self.assertEqual(e_invoice.file_name_key, file_name)
+        signed_file_name = file_name + '.p7m'
+        attachments = self.attach_model.find_by_file_names(
+            [file_name, signed_file_name, 'IT00000000000_00000.xml'])
+        self.assertEqual(attachments, {
+            file_name: e_invoice,
+            signed_file_name: e_invoice,
+        })
+
+        e_invoice.datas_fname = signed_file_name
+        self.assertEqual(e_invoice.file_name_key, file_name)
+        attachments = self.attach_model.find_by_file_names([file_name])
+        self.assertEqual(attachments, {file_name: e_invoice})
+
+    def test_export_background(self):
+        invoices = self._create_invoice() | self._create_invoice()
+        invoices.action_invoice_open()
+        wizard = self.wizard_model.create({'background': True})
+        wizard.with_context(active_ids=invoices.ids).exportFatturaPA()
+        self.assertTrue(all(invoices.mapped('fatturapa_export_queued')))
+        self.assertFalse(invoices.mapped('fatturapa_attachment_out_id'))
+
+        self.invoice_model.cron_export_e_invoices(commit=False)
+        self.assertFalse(any(invoices.mapped('fatturapa_export_queued')))
+        e_invoice = invoices.mapped('fatturapa_attachment_out_id')
+        self.assertEqual(len(e_invoice), 1)
+        self.assertEqual(e_invoice.out_invoice_ids, invoices)
+
+    def test_export_background_error(self):
+        invoice = self._create_invoice()
+        invoice.action_invoice_open()
+        wizard = self.wizard_model.create({'background': True})
+        wizard.with_context(active_ids=invoice.ids).exportFatturaPA()
+        self.assertTrue(invoice.fatturapa_export_queued)
+
+        invoice.partner_id.write({'vat': False, 'fiscalcode': False})
+        self.invoice_model.cron_export_e_invoices(commit=False)
+        self.assertFalse(invoice.fatturapa_export_queued)
+        self.assertFalse(invoice.fatturapa_attachment_out_id)
+        self.assertIn('VAT number', invoice.fatturapa_export_error)
+        message = invoice.message_ids[0]
+        self.assertIn('VAT number', message.body)
+        self.assertIn(self.env.user.partner_id, message.partner_ids)
+
     def _get_e_invoices(self, invoices):
         """Return the electronic invoices corresponding to `invoices`."""
         res = self.run_wizard(invoices.ids)
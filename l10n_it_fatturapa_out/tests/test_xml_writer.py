@@ -0,0 +1,89 @@
+import base64
+import logging
+import timeit
+
+from odoo.exceptions import UserError
+
+from odoo.addons.l10n_it_fatturapa.bindings.fatturapa import (
+    CreateFromDocument,
+    ToXmlLxml,
+)
+from odoo.addons.l10n_it_fatturapa_out.wizard.wizard_export_fatturapa import (
+    fatturapaBDS
+)
+from .fatturapa_common import FatturaPACommon
+
+_logger = logging.getLogger(__name__)
+
+
+class TestXMLWriter(FatturaPACommon):
+
+    def _get_e_invoice_binding(self, invoices_count):
+        invoices = self.invoice_model.browse()
+        for _index in range(invoices_count):
+            invoices |= self._create_invoice()
+        invoices.action_invoice_open()
+        wizard = self.wizard_model.create({})
+        fatturapa, _number = wizard.exportInvoiceXML(
+            self.env.user.company_id, invoices.partner_id, invoices.ids)
+        return fatturapa
+
+    def _pyxb_toxml(self, fatturapa):
+        xml_string = fatturapa.toxml(encoding="UTF-8", bds=fatturapaBDS)
+        fatturapaBDS.reset()
+        return xml_string
+
+    def test_writers_equivalence(self):
+        """Both writers return the same document"""
+        fatturapa = self._get_e_invoice_binding(3)
+        self.assertEqual(ToXmlLxml(fatturapa), self._pyxb_toxml(fatturapa))
+
+    def test_writers_equivalence_multiple_bodies(self):
+        """Both writers return the same document with many bodies,
+        which is read back with the same values"""
+        fatturapa = self._get_e_invoice_binding(20)
+        lxml_xml = ToXmlLxml(fatturapa)
+        self.assertEqual(lxml_xml, self._pyxb_toxml(fatturapa))
+        read_back = CreateFromDocument(lxml_xml)
+        self.assertEqual(len(read_back.FatturaElettronicaBody), 20)
+        self.assertEqual(
+            [body.DatiGenerali.DatiGeneraliDocumento.Numero
+             for body in read_back.FatturaElettronicaBody],
+            [body.DatiGenerali.DatiGeneraliDocumento.Numero
+             for body in fatturapa.FatturaElettronicaBody])
+
+    def test_writers_benchmark(self):
+        """Log the time spent by both writers on a document with many bodies,
+        timings depend on the machine so they are not asserted"""
+        fatturapa = self._get_e_invoice_binding(20)
+        repeat = 5
+        pyxb_time = timeit.timeit(
+            lambda: self._pyxb_toxml(fatturapa), number=repeat)
+        lxml_time = timeit.timeit(
+            lambda: ToXmlLxml(fatturapa), number=repeat)
+        _logger.info(
+            "Writing an e-invoice with %d bodies %d times: "
+            "PyXB %.3fs, lxml %.3fs",
+            len(fatturapa.FatturaElettronicaBody), repeat,
+            pyxb_time, lxml_time)
+
+    def test_export_lxml_writer(self):
+        self.env['ir.config_parameter'].sudo().set_param(
+            'fatturapa.out.xml.writer', 'lxml')
+        e_invoice = self._create_e_invoice()
+        fatturapa = CreateFromDocument(base64.b64decode(e_invoice.datas))
+        self.assertEqual(len(fatturapa.FatturaElettronicaBody), 1)
+        self.assertEqual(
+            fatturapa.FatturaElettronicaBody[0].DatiGenerali
+            .DatiGeneraliDocumento.Numero,
+            e_invoice.out_invoice_ids.number)
+
+    def test_lxml_writer_invalid(self):
+        self.env['ir.config_parameter'].sudo().set_param(
+            'fatturapa.out.xml.writer', 'lxml')
+        fatturapa = self._get_e_invoice_binding(1)
+        fatturapa.FatturaElettronicaHeader.DatiTrasmissione \
+            .CodiceDestinatario = None
+        wizard = self.wizard_model.create({})
+        with self.assertRaises(UserError):
+            wizard.saveAttachment(fatturapa, 'test_invalid')
@@ -11,6 +11,9 @@ import os
 import string
 import random
 import itertools
+import time
+
+from lxml import etree
 
 from odoo import api, fields, models
 from odoo.tools.translate import _
@@ -19,6 +22,7 @@ from odoo.addons.l10n_it_account.tools.account_tools import encode_for_export
 from odoo.tools.float_utils import float_round
 
 from odoo.addons.l10n_it_fatturapa.bindings.fatturapa import (
+    ToXmlLxml,
     FatturaElettronica,
     FatturaElettronicaHeaderType,
     DatiTrasmissioneType,
@@ -86,6 +90,9 @@ class FatturapaBDS(domutils.BindingDOMSupport):
 
 fatturapaBDS = FatturapaBDS()
 
+XML_WRITERS = ('pyxb', 'lxml')
+"""Values of system parameter `fatturapa.out.xml.writer`."""
+
 
 class WizardExportFatturapa(models.TransientModel):
     _name = "wizard.export.fatturapa"
@@ -116,16 +123,47 @@ class WizardExportFatturapa(models.TransientModel):
         comodel_name='ir.actions.actions',
         domain=_domain_ir_values,
         help='This report will be automatically included in the created XML')
+    background = fields.Boolean(
+        "Export in background",
+        help="Queue the invoices instead of exporting them now: "
+             "they will be exported by the scheduled action "
+             "'Export Queued E-invoices'.")
+
+    @api.model
+    def _get_xml_writer(self):
+        """
+        Writer of e-invoices,
+        from system parameter `fatturapa.out.xml.writer`.
+        """
+        writer = self.env['ir.config_parameter'].sudo().get_param(
+            'fatturapa.out.xml.writer', 'pyxb')
+        if writer not in XML_WRITERS:
+            _logger.warning(
+                "Unknown e-invoice XML writer %s, using pyxb", writer)
+            writer = 'pyxb'
+        return writer
+
+    def _get_xml_content(self, fatturapa):
+        """Serialize `fatturapa` using the configured writer."""
+        if self._get_xml_writer() == 'lxml':
+            try:
+                attach_str = ToXmlLxml(fatturapa)
+            except etree.DocumentInvalid as e:
+                raise UserError(
+                    _("The e-invoice file is not valid:\n%s") % str(e))
+        else:
+            attach_str = fatturapa.toxml(
+                encoding="UTF-8",
+                bds=fatturapaBDS,
+            )
+            fatturapaBDS.reset()
+        return attach_str
 
     def saveAttachment(self, fatturapa, number):
         attach_obj = self.env['fatturapa.attachment.out']
         vat = attach_obj.get_file_vat()
 
-        attach_str = fatturapa.toxml(
-            encoding="UTF-8",
-            bds=fatturapaBDS,
-        )
-        fatturapaBDS.reset()
+        attach_str = self._get_xml_content(fatturapa)
         attach_vals = {
             'name': '%s_%s.xml' % (vat, number),
             'datas_fname': '%s_%s.xml' % (vat, number),
@@ -947,11 +985,14 @@ class WizardExportFatturapa(models.TransientModel):
         else:
             fatturapa = FatturaElettronica(versione='FPR12')
 
+        # Browse the invoices together so that their fields,
+        # and the fields of their lines, are read in a single query
+        invoices = invoice_obj.with_context(context).browse(invoice_ids)
+        invoices.mapped('invoice_line_ids')
         try:
             self.with_context(context). \
                 setFatturaElettronicaHeader(company, partner, fatturapa)
-            for invoice_id in invoice_ids:
-                inv = invoice_obj.with_context(context).browse(invoice_id)
+            for inv in invoices:
                 if inv.type not in ["out_invoice", "out_refund"]:
                     raise UserError(
                         _("Impossible to generate XML: not a customer invoice"))
@@ -976,25 +1017,116 @@ class WizardExportFatturapa(models.TransientModel):
             raise UserError(str(e))
         return fatturapa, number
 
-    def exportFatturaPA(self):
+    def _export_invoice_groups(self, commit=False, dequeue_errors=False):
+        """
+        Create an e-invoice file for every group of invoices
+        returned by `group_invoices_by_partner`.
+
+        :param commit: commit after each file and skip the files
+            that cannot be created, for long running exports;
+            the invoices of skipped files are left as they are.
+        :param dequeue_errors: skip the files that cannot be created,
+            removing their invoices from the export queue
+            (see `_dequeue_invoices_error`).
+        :return: the created e-invoice files.
+        """
         invoice_obj = self.env['account.invoice']
         attachments = self.env['fatturapa.attachment.out']
         invoices_by_partner = self.group_invoices_by_partner()
         company = self.env.user.company_id
 
+        invoices_count = sum(
+            len(invoice_ids)
+            for partner_groups in invoices_by_partner.values()
+            for invoice_ids in partner_groups)
+        exported_count = 0
+        start = time.time()
         for partner in invoices_by_partner:
             context_partner = self.env.context.copy()
             context_partner.update({'lang': partner.lang})
             for invoice_ids in invoices_by_partner[partner]:
-                fatturapa, number = self.exportInvoiceXML(
-                    company, partner, invoice_ids, context=context_partner)
-
-                attach = self.saveAttachment(fatturapa, number)
+                try:
+                    with self.env.cr.savepoint():
+                        fatturapa, number = self.exportInvoiceXML(
+                            company, partner, invoice_ids,
+                            context=context_partner)
+                        attach = self.saveAttachment(fatturapa, number)
+                        invoice_obj.browse(invoice_ids).write({
+                            'fatturapa_attachment_out_id': attach.id,
+                            'fatturapa_export_queued': False,
+                            'fatturapa_export_error': False,
+                        })
+                except Exception as e:
+                    if not (commit or dequeue_errors):
+                        raise
+                    error = getattr(e, 'name', None) or str(e)
+                    _logger.error(
+                        "E-invoice of invoices %s not exported: %s",
+                        invoice_ids, error)
+                    # Discard the cache of records
+                    # that have been rolled back
+                    self.env.clear()
+                    if dequeue_errors:
+                        self._dequeue_invoices_error(
+                            invoice_obj.browse(invoice_ids), error)
+                        if commit:
+                            self.env.cr.commit()
+                    continue
                 attachments |= attach
+                exported_count += len(invoice_ids)
+                if commit:
+                    self.env.cr.commit()
+                elapsed = time.time() - start
+                _logger.info(
+                    "E-invoice export: %d/%d invoices exported "
+                    "in %d files (%.1f invoices/s)",
+                    exported_count, invoices_count, len(attachments),
+                    exported_count / elapsed if elapsed else 0.0)
+        return attachments
+
+    def _dequeue_invoices_error(self, invoices, error):
+        """
+        Remove `invoices` from the export queue, saving the export `error`
+        and notifying it to the user that queued them.
+        """
+        invoices.write({
+            'fatturapa_export_queued': False,
+            'fatturapa_export_error': error,
+        })
+        for invoice in invoices:
+            user = invoice.fatturapa_export_user_id
+            invoice.message_post(
+                body=_("E-invoice export failed: %s") % error,
+                partner_ids=user.partner_id.ids,
+            )
+
+    def _queue_invoices(self):
+        """Queue the invoices to be exported by the scheduled action."""
+        invoices = self.env['account.invoice'].browse(
+            self.env.context.get('active_ids', []))
+        for inv in invoices:
+            if inv.type not in ["out_invoice", "out_refund"]:
+                raise UserError(
+                    _("Impossible to generate XML: not a customer invoice"))
+            if inv.fatturapa_attachment_out_id:
+                raise UserError(
+                    _("E-invoice export file still present for invoice %s.")
+                    % (inv.number))
+        invoices.write({
+            'fatturapa_export_queued': True,
+            'fatturapa_export_error': False,
+            'fatturapa_export_report_id': self.report_print_menu.id,
+            'fatturapa_export_user_id': self.env.uid,
+        })
+        return {'type': 'ir.actions.act_window_close'}
 
-                for invoice_id in invoice_ids:
-                    inv = invoice_obj.browse(invoice_id)
-                    inv.write({'fatturapa_attachment_out_id': attach.id})
+    def exportFatturaPA(self):
+        if self.background:
+            return self._queue_invoices()
+        attachments = self._export_invoice_groups(
+            commit=self.env.context.get('fatturapa_export_commit', False),
+            dequeue_errors=self.env.context.get(
+                'fatturapa_export_dequeue_errors', False))
 
         action = {
             'view_type': 'form',
@@ -2,10 +2,45 @@
 # Copyright 2018 Lorenzo Battistini <https://github.com/eLBati>
 
 import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+
 from odoo import models, api, fields, _
+from odoo.tools import split_every
 
 _logger = logging.getLogger(__name__)
-MAX_POP_MESSAGES = 50
+DEFAULT_PEC_COMMIT_INTERVAL = 50
+
+re_imap_uid = re.compile(br'\bUID (\d+)')
+
+
+def parse_imap_fetch(data):
+    """
+    Parse the response of an IMAP `UID FETCH` command.
+
+    Every message is a tuple `(envelope, literal)` followed by
+    the rest of the response item, that is the closing parenthesis
+    and, depending on the server, the UID of the message.
+
+    :return: list of tuples `(uid, message)`.
+    """
+    messages = []
+    for index, item in enumerate(data):
+        if not isinstance(item, tuple):
+            continue
+        envelope, message = item
+        match = re_imap_uid.search(envelope)
+        if not match and index + 1 < len(data):
+            trailer = data[index + 1]
+            if isinstance(trailer, bytes):
+                match = re_imap_uid.search(trailer)
+        if match:
+            messages.append((match.group(1).decode(), message))
+        else:
+            _logger.warning(
+                "Cannot find UID in IMAP fetch response item %s, "
+                "message will be fetched again", envelope)
+    return messages
 
 
 class Fetchmail(models.Model):
@@ -26,116 +61,198 @@ class Fetchmail(models.Model):
         default=_default_e_inv_notify_partner_ids
     )
 
+    @api.model
+    def _get_pec_commit_interval(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param(
+            'fetchmail.pec.commit.interval', DEFAULT_PEC_COMMIT_INTERVAL))
+
     @api.multi
     def fetch_mail(self):
-        for server in self:
-            if not server.is_fatturapa_pec:
-                super(Fetchmail, server).fetch_mail()
-            else:
-                additional_context = {
-                    'fetchmail_cron_running': True
-                }
-                # Setting fetchmail_cron_running to avoid to disable cron while
-                # cron is running (otherwise it would be done by setting
-                # server.state = 'draft',
-                # see _update_cron method)
-                server = server.with_context(**additional_context)
-                MailThread = self.env['mail.thread']
-                _logger.info(
-                    'start checking for new e-invoices on %s server %s',
-                    server.type, server.name)
-                additional_context['fetchmail_server_id'] = server.id
-                additional_context['server_type'] = server.type
-                imap_server = None
-                pop_server = None
-                error_messages = list()
-                if server.type == 'imap':
-                    try:
-                        imap_server = server.connect()
-                        imap_server.select()
-                        result, data = imap_server.search(None, '(UNSEEN)')
-                        for num in data[0].split():
-                            result, data = imap_server.fetch(num, '(RFC822)')
-                            imap_server.store(num, '-FLAGS', '\\Seen')
-                            try:
-                                MailThread.with_context(
-                                    **additional_context
-                                ).message_process(
-                                    server.object_id.model, data[0][1],
-                                    save_original=server.original,
-                                    strip_attachments=(not server.attach)
-                                )
-                                # if message is processed without exceptions
-                                server.last_pec_error_message = ''
-                            except Exception as e:
-                                server.manage_pec_failure(e, error_messages)
-                                continue
-                            imap_server.store(num, '+FLAGS', '\\Seen')
-                            # We need to commit because message is processed:
-                            # Possible next exceptions, out of try, should not
-                            # rollback processed messages
-                            self._cr.commit()  # pylint: disable=invalid-commit
-                    except Exception as e:
-                        server.manage_pec_failure(e, error_messages)
-                    finally:
-                        if imap_server:
-                            imap_server.close()
-                            imap_server.logout()
-                elif server.type == 'pop':
-                    try:
-                        while True:
-                            pop_server = server.connect()
-                            (num_messages, total_size) = pop_server.stat()
-                            pop_server.list()
-                            for num in range(
-                                    1, min(MAX_POP_MESSAGES, num_messages) + 1
-                            ):
-                                (header, messages, octets) = pop_server.retr(
-                                    num)
-                                message = '\n'.join(messages)
-                                try:
-                                    MailThread.with_context(
-                                        **additional_context
-                                    ).message_process(
-                                        server.object_id.model, message,
-                                        save_original=server.original,
-                                        strip_attachments=(not server.attach)
-                                    )
-                                    pop_server.dele(num)
-                                    # See the comments in the IMAP part
-                                    server.last_pec_error_message = ''
-                                except Exception as e:
-                                    server.manage_pec_failure(
-                                        e, error_messages)
-                                    continue
-                                # pylint: disable=invalid-commit
-                                self._cr.commit()
-                            if num_messages < MAX_POP_MESSAGES:
-                                break
-                            pop_server.quit()
-                    except Exception as e:
-                        server.manage_pec_failure(e, error_messages)
-                    finally:
-                        if pop_server:
-                            pop_server.quit()
-                if error_messages:
-                    server.notify_or_log(error_messages)
-                    server.pec_error_count += 1
-                    max_retry = self.env['ir.config_parameter'].get_param(
-                        'fetchmail.pec.max.retry')
-                    if server.pec_error_count > int(max_retry):
-                        # Setting to draft prevents new e-invoices to
-                        # be sent via PEC.
-                        # Resetting server state only after N fails.
-                        # So that the system can try to fetch again after
-                        # temporary connection errors
-                        server.state = 'draft'
-                        server.notify_about_server_reset()
-                else:
-                    server.pec_error_count = 0
-            server.write({'date': fields.Datetime.now()})
+        pec_servers = self.filtered('is_fatturapa_pec')
+        for server in self - pec_servers:
+            super(Fetchmail, server).fetch_mail()
+        workers = int(self.env['ir.config_parameter'].sudo().get_param(
+            'fetchmail.pec.workers', 1))
+        if workers > 1 and len(pec_servers) > 1 \
+                and not self.pool.in_test_mode():
+            pec_servers._fetch_pec_mail_concurrently(workers)
+        else:
+            for server in pec_servers:
+                server._fetch_pec_mail()
         return True
 
+    @api.multi
+    def _fetch_pec_mail_concurrently(self, workers):
+        """
+        Fetch the messages of the PEC servers in `self` using
+        up to `workers` threads, each one with its own cursor.
+        """
+        uid = self.env.uid
+        context = self.env.context
+
+        def fetch_server_mail(server_id):
+            with api.Environment.manage(), self.pool.cursor() as cr:
+                env = api.Environment(cr, uid, context)
+                env[self._name].browse(server_id)._fetch_pec_mail()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Consume the results to raise unexpected exceptions
+            list(executor.map(fetch_server_mail, self.ids))
+
+    @api.multi
+    def _fetch_pec_mail(self):
+        self.ensure_one()
+        additional_context = {
+            'fetchmail_cron_running': True
+        }
+        # Setting fetchmail_cron_running to avoid to disable cron while
+        # cron is running (otherwise it would be done by setting
+        # server.state = 'draft',
+        # see _update_cron method)
+        server = self.with_context(**additional_context)
+        _logger.info(
+            'start checking for new e-invoices on %s server %s',
+            server.type, server.name)
+        additional_context['fetchmail_server_id'] = server.id
+        additional_context['server_type'] = server.type
+        error_messages = list()
+        if server.type == 'imap':
+            server._fetch_pec_imap_mail(additional_context, error_messages)
+        elif server.type == 'pop':
+            server._fetch_pec_pop_mail(additional_context, error_messages)
+        if error_messages:
+            server.notify_or_log(error_messages)
+            server.pec_error_count += 1
+            max_retry = self.env['ir.config_parameter'].get_param(
+                'fetchmail.pec.max.retry')
+            if server.pec_error_count > int(max_retry):
+                # Setting to draft prevents new e-invoices to
+                # be sent via PEC.
+                # Resetting server state only after N fails.
+                # So that the system can try to fetch again after
+                # temporary connection errors
+                server.state = 'draft'
+                server.notify_about_server_reset()
+        else:
+            server.pec_error_count = 0
+        server.write({'date': fields.Datetime.now()})
+
+    @api.multi
+    def _process_pec_message(self, message, message_context, error_messages):
+        """
+        Process `message` in its own savepoint.
+
+        :return: True if the message has been processed.
+        """
+        self.ensure_one()
+        try:
+            with self.env.cr.savepoint():
+                self.env['mail.thread'].with_context(
+                    **message_context
+                ).message_process(
+                    self.object_id.model, message,
+                    save_original=self.original,
+                    strip_attachments=(not self.attach)
+                )
+        except Exception as e:
+            # Discard the cache of records
+            # that have been rolled back
+            self.env.clear()
+            self.manage_pec_failure(e, error_messages)
+            return False
+        # if message is processed without exceptions
+        self.last_pec_error_message = ''
+        return True
+
+    @api.multi
+    def _fetch_pec_imap_mail(self, message_context, error_messages):
+        """
+        Fetch unseen messages by batches of UIDs.
+
+        Messages are fetched without setting the \\Seen flag,
+        that is set on every processed message of the batch
+        with a single command, after the batch has been committed.
+        """
+        self.ensure_one()
+        commit_interval = self._get_pec_commit_interval()
+        imap_server = None
+        try:
+            imap_server = self.connect()
+            imap_server.select()
+            result, data = imap_server.uid('search', None, '(UNSEEN)')
+            message_uids = [uid.decode() for uid in data[0].split()]
+            for batch_uids in split_every(commit_interval, message_uids):
+                result, data = imap_server.uid(
+                    'fetch', ','.join(batch_uids), '(BODY.PEEK[])')
+                processed_uids = [
+                    uid for uid, message in parse_imap_fetch(data)
+                    if self._process_pec_message(
+                        message, message_context, error_messages)
+                ]
+                if processed_uids:
+                    # We need to commit because messages are processed:
+                    # Possible next exceptions should not
+                    # rollback processed messages
+                    self._cr.commit()  # pylint: disable=invalid-commit
+                    imap_server.uid(
+                        'store', ','.join(processed_uids),
+                        '+FLAGS', '(\\Seen)')
+        except Exception as e:
+            self.manage_pec_failure(e, error_messages)
+        finally:
+            if imap_server:
+                imap_server.close()
+                imap_server.logout()
+
+    @api.multi
+    def _fetch_pec_pop_mail(self, message_context, error_messages):
+        """
+        Fetch the messages by batches of
+        `fetchmail.pec.commit.interval` messages.
+
+        POP3 deletes the messages marked with `DELE` only on `QUIT`,
+        so a new connection is opened for every batch:
+        the processed messages of a committed batch are deleted
+        even if a later batch fails.
+        """
+        self.ensure_one()
+        commit_interval = self._get_pec_commit_interval()
+        pop_server = None
+        # Messages that could not be processed are kept on the server,
+        # before the ones still to be fetched
+        skipped = 0
+        try:
+            while True:
+                pop_server = self.connect()
+                (num_messages, total_size) = pop_server.stat()
+                if skipped >= num_messages:
+                    break
+                batch_nums = range(
+                    skipped + 1,
+                    min(skipped + commit_interval, num_messages) + 1)
+                processed = False
+                for num in batch_nums:
+                    (header, messages, octets) = pop_server.retr(num)
+                    message = '\n'.join(messages)
+                    if self._process_pec_message(
+                            message, message_context, error_messages):
+                        pop_server.dele(num)
+                        processed = True
+                    else:
+                        skipped += 1
+                if processed:
+                    # See the comments in the IMAP part
+                    self._cr.commit()  # pylint: disable=invalid-commit
+                pop_server.quit()
+                pop_server = None
+                if batch_nums[-1] == num_messages:
+                    break
+        except Exception as e:
+            self.manage_pec_failure(e, error_messages)
+        finally:
+            if pop_server:
+                pop_server.quit()
+
     @api.multi
     def manage_pec_failure(self, exception, error_messages):
         self.ensure_one()
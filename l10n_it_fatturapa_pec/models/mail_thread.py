@@ -137,32 +137,14 @@ class MailThread(models.AbstractModel):
 
     def find_attachment_by_subject(self, subject):
         attachment_out_model = self.env['fatturapa.attachment.out']
-        if 'CONSEGNA: ' in subject:
-            att_name = subject.replace('CONSEGNA: ', '')
-            fatturapa_attachment_out = attachment_out_model \
-                .search([
-                    ('datas_fname', '=', att_name)
-                ])
-            if not fatturapa_attachment_out:
+        for subject_prefix in ('CONSEGNA: ', 'ACCETTAZIONE: '):
+            if subject_prefix in subject:
+                att_name = subject.replace(subject_prefix, '')
                 fatturapa_attachment_out = attachment_out_model \
-                    .search([
-                        ('name', '=', att_name)
-                    ])
-            if len(fatturapa_attachment_out) == 1:
-                return fatturapa_attachment_out
-        if 'ACCETTAZIONE: ' in subject:
-            att_name = subject.replace('ACCETTAZIONE: ', '')
-            fatturapa_attachment_out = attachment_out_model \
-                .search([
-                    ('datas_fname', '=', att_name)
-                ])
-            if not fatturapa_attachment_out:
-                fatturapa_attachment_out = attachment_out_model \
-                    .search([
-                        ('name', '=', att_name)
-                    ])
-            if len(fatturapa_attachment_out) == 1:
-                return fatturapa_attachment_out
+                    .find_by_file_names([att_name]).get(att_name)
+                if fatturapa_attachment_out \
+                        and len(fatturapa_attachment_out) == 1:
+                    return fatturapa_attachment_out
         return attachment_out_model.browse()
 
     def create_fatturapa_attachment_in(self, attachment, message_dict=None):
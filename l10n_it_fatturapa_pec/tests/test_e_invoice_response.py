@@ -3,11 +3,87 @@
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 from odoo.tools import mute_logger
 from .e_invoice_common import EInvoiceCommon
+from ..models.fetchmail import parse_imap_fetch
 from odoo.modules import get_module_resource
 from odoo.fields import Datetime
 import mock
 
 
+class FakeIMAP(object):
+    """Local stand-in for an IMAP server, holding messages by UID."""
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.seen = set()
+        self.commands = []
+        self.sock = mock.Mock()
+
+    def login(self, user, password):
+        return 'OK', []
+
+    def select(self, mailbox='INBOX'):
+        return 'OK', [str(len(self.messages)).encode()]
+
+    def close(self):
+        return 'OK', []
+
+    def logout(self):
+        return 'BYE', []
+
+    def uid(self, command, *args):
+        self.commands.append(command)
+        if command == 'search':
+            return 'OK', [b' '.join(
+                str(uid).encode() for uid in sorted(self.messages)
+                if uid not in self.seen)]
+        if command == 'fetch':
+            data = []
+            for num, uid in enumerate(args[0].split(','), start=1):
+                message = self.messages[int(uid)]
+                data.append((
+                    b'%d (UID %s BODY[] {%d}' % (
+                        num, uid.encode(), len(message)),
+                    message))
+                data.append(b')')
+            return 'OK', data
+        if command == 'store':
+            self.seen.update(int(uid) for uid in args[0].split(','))
+            return 'OK', []
+        raise NotImplementedError(command)
+
+
+class FakePOP(object):
+    """Local stand-in for a POP3 connection to `mailbox`,
+    a list of messages; deletions are applied on QUIT."""
+
+    def __init__(self, mailbox):
+        self.mailbox = mailbox
+        self.messages = list(mailbox)
+        self.deleted = set()
+        self.sock = mock.Mock()
+
+    def user(self, user):
+        return b'+OK'
+
+    def pass_(self, password):
+        return b'+OK'
+
+    def stat(self):
+        return len(self.messages), sum(map(len, self.messages))
+
+    def retr(self, num):
+        return b'+OK', self.messages[num - 1].split('\n'), 0
+
+    def dele(self, num):
+        self.deleted.add(num)
+        return b'+OK'
+
+    def quit(self):
+        for num in sorted(self.deleted, reverse=True):
+            del self.mailbox[num - 1]
+        return b'+OK'
+
+
 class TestEInvoiceResponse(EInvoiceCommon):
 
     def setUp(self):
@@ -163,6 +239,90 @@ class TestEInvoiceResponse(EInvoiceCommon):
         self.assertIn(xml_error, error_mails.body_html)
         self.assertIn(xml_error, self.PEC_server.last_pec_error_message)
 
+    def test_fetch_imap_batches(self):
+        """Messages are fetched by batches and marked as seen
+        only when they are processed"""
+        e_invoice = self._create_e_invoice()
+        self.set_e_invoice_file_id(e_invoice, 'IT03339130126_00009.xml')
+        e_invoice.send_to_sdi()
+        self.PEC_server.type = 'imap'
+        self.env['ir.config_parameter'].sudo().set_param(
+            'fetchmail.pec.commit.interval', 2)
+        imap_server = FakeIMAP({
+            101: self._get_file(
+                'POSTA CERTIFICATA_ Ricevuta di consegna 6782414.txt'
+            ).encode(),
+            102: self._get_file(
+                'POSTA CERTIFICATA: Invio File 7339338 (broken XML).txt'
+            ).encode(),
+            103: self._get_file(
+                'CONSEGNA_ IT03339130126_00009.xml.txt').encode(),
+        })
+
+        with mock.patch(
+                'odoo.addons.fetchmail.models.fetchmail.IMAP4',
+                return_value=imap_server), \
+                mock.patch.object(self.env.cr, 'commit') as commit, \
+                mute_logger(
+                    'odoo.addons.l10n_it_fatturapa_pec.models.fetchmail'):
+            self.PEC_server.fetch_mail()
+
+        self.assertEqual(e_invoice.state, 'validated')
+        self.assertEqual(imap_server.seen, {101, 103})
+        self.assertEqual(
+            imap_server.commands,
+            ['search', 'fetch', 'store', 'fetch', 'store'])
+        self.assertEqual(commit.call_count, 2)
+        self.assertEqual(self.PEC_server.pec_error_count, 1)
+
+    def test_parse_imap_fetch_trailing_uid(self):
+        """The UID can follow the message literal in the response"""
+        data = [
+            (b'1 (UID 101 BODY[] {3}', b'abc'), b')',
+            (b'2 (BODY[] {3}', b'def'), b' UID 102)',
+            (b'3 (BODY[] {3}', b'ghi'), b')',
+        ]
+        with mute_logger(
+                'odoo.addons.l10n_it_fatturapa_pec.models.fetchmail'):
+            messages = parse_imap_fetch(data)
+        self.assertEqual(messages, [('101', b'abc'), ('102', b'def')])
+
+    def test_fetch_pop_batches(self):
+        """Every batch is fetched in its own connection,
+        so that processed messages are deleted after each commit"""
+        e_invoice = self._create_e_invoice()
+        self.set_e_invoice_file_id(e_invoice, 'IT03339130126_00009.xml')
+        e_invoice.send_to_sdi()
+        self.env['ir.config_parameter'].sudo().set_param(
+            'fetchmail.pec.commit.interval', 2)
+        broken_message = self._get_file(
+            'POSTA CERTIFICATA: Invio File 7339338 (broken XML).txt')
+        mailbox = [
+            self._get_file(
+                'POSTA CERTIFICATA_ Ricevuta di consegna 6782414.txt'),
+            broken_message,
+            self._get_file('CONSEGNA_ IT03339130126_00009.xml.txt'),
+        ]
+        connections = []
+
+        def connect(*args, **kwargs):
+            connections.append(FakePOP(mailbox))
+            return connections[-1]
+
+        with mock.patch(
+                'odoo.addons.fetchmail.models.fetchmail.POP3',
+                side_effect=connect), \
+                mock.patch.object(self.env.cr, 'commit') as commit, \
+                mute_logger(
+                    'odoo.addons.l10n_it_fatturapa_pec.models.fetchmail'):
+            self.PEC_server.fetch_mail()
+
+        self.assertEqual(e_invoice.state, 'validated')
+        self.assertEqual(mailbox, [broken_message])
+        self.assertEqual(len(connections), 2)
+        self.assertEqual(commit.call_count, 2)
+        self.assertEqual(self.PEC_server.pec_error_count, 1)
+
     def test_process_response_MC(self):
         """Receiving a 'Mancata consegna' sets the state of the
         e-invoice to 'recipient_error'"""
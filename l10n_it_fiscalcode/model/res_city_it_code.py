@@ -1,6 +1,15 @@
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
-from odoo import models, fields, tools
+from collections import defaultdict, namedtuple
+
+from odoo import api, models, fields, tools
+
+# Data of a `res.city.it.code` record needed to find the national code,
+# the attribute names are the same of the model's fields
+CityCode = namedtuple('CityCode', [
+    'id', 'name', 'province', 'notes', 'national_code',
+    'national_code_var', 'name_var', 'creation_date', 'var_date',
+])
 
 
 class ResCityItCode(models.Model):
@@ -67,6 +76,64 @@ cadastre_code_var,province_var,name_var,creation_date,var_date
     creation_date = fields.Date('Creation date')
     var_date = fields.Date('Variation date')
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.clear_caches()
+        return super().create(vals_list)
+
+    @api.multi
+    def write(self, vals):
+        self.clear_caches()
+        return super().write(vals)
+
+    @api.multi
+    def unlink(self):
+        self.clear_caches()
+        return super().unlink()
+
+    @api.model
+    @tools.ormcache()
+    def _get_city_code_index(self):
+        """
+        Index of all the city codes, built once for each registry
+        and invalidated when any city code changes.
+
+        :return: tuple of dictionaries
+            ({(name, province): [CityCode]}, {name: [CityCode]}),
+            the history of each city is sorted by creation date,
+            variation date and notes.
+        """
+        self.env.cr.execute("""
+            SELECT id, name, province, notes, national_code,
+                national_code_var, name_var, creation_date, var_date
+            FROM res_city_it_code
+            ORDER BY creation_date, var_date, notes, id
+        """)
+        by_name_province = defaultdict(list)
+        by_name = defaultdict(list)
+        for row in self.env.cr.fetchall():
+            city = CityCode(*row)
+            by_name_province[(city.name, city.province)].append(city)
+            by_name[city.name].append(city)
+        for cities in by_name.values():
+            cities.sort(key=lambda city: city.id)
+        return dict(by_name_province), dict(by_name)
+
+    @api.model
+    def get_city_history(self, name, province):
+        """
+        History of the city `name` in `province`,
+        following the references (VED) to other cities.
+
+        :return: list of `CityCode`.
+        """
+        by_name_province, by_name = self._get_city_code_index()
+        cities = by_name_province.get((name, province), [])
+        for city in cities:
+            if city.notes == 'VED':
+                return by_name.get(city.name_var) or cities
+        return cities
+
 
 class ResCityItCodeDistinct(models.Model):
     _name = 'res.city.it.code.distinct'
@@ -51,3 +51,38 @@ class TestFiscalCode(TransactionCase):
             'is_company': False,
             'fiscalcode': '123456789',
         })
+
+    def test_fiscalcodes_batch(self):
+        wizard_model = self.env['wizard.compute.fc']
+        persons = [{
+            'surname': 'ROSSI',
+            'firstname': 'MARIO',
+            'birth_date': '1984-06-04',
+            'sex': 'M',
+            'birth_city': 'ROMA',
+            'birth_province': 'RM',
+        }, {
+            'surname': 'ROSSI',
+            'firstname': 'MARIO',
+            'birth_date': '1984-06-04',
+            'sex': 'M',
+            'birth_city': 'NOT A CITY',
+            'birth_province': 'RM',
+        }]
+        self.assertEqual(
+            wizard_model.compute_fiscalcodes(persons),
+            ['RSSMRA84H04H501X', False])
+
+        persons[0]['fiscalcode'] = 'rssmra84h04h501x'
+        persons[1]['fiscalcode'] = 'RSSMRA84H04H501X'
+        self.assertEqual(
+            wizard_model.check_fiscalcodes(persons), [True, False])
+
+        # The index is updated when a city code is added
+        self.env['res.city.it.code'].create({
+            'name': 'NOT A CITY',
+            'province': 'RM',
+            'national_code': 'H501',
+        })
+        self.assertEqual(
+            wizard_model.check_fiscalcodes(persons), [True, True])
@@ -117,20 +117,10 @@ class WizardComputeFc(models.TransientModel):
         - VED: reference to another city. This is assigned to cities that
                changed name and were then subject to other changes.
         """
-        cities = self.env['res.city.it.code'].search([
-            ('name', '=', birth_city), ('province', '=', birth_prov)],
-            order='creation_date ASC, var_date ASC, notes ASC')
-        if not cities or len(cities) == 0:
+        cities = self.env['res.city.it.code'].get_city_history(
+            birth_city, birth_prov)
+        if not cities:
             return ''
-        # Checks for any VED element
-        newcts = None
-        for ct in cities:
-            if ct.notes == 'VED':
-                newcts = self.env['res.city.it.code'].search([
-                    ('name', '=', ct.name_var)])
-                break
-        if newcts:
-            cities = newcts
         return self._check_national_codes(birth_date, cities)
 
     def _check_national_codes(self, birth_date, cities):
@@ -174,6 +164,44 @@ class WizardComputeFc(models.TransientModel):
 
         return nc
 
+    @api.model
+    def compute_fiscalcodes(self, persons):
+        """
+        Compute the fiscal codes of many persons at once.
+
+        :param persons: list of dictionaries with keys `surname`,
+            `firstname`, `birth_date`, `sex`, `birth_city` (name of the city)
+            and `birth_province` (code of the province).
+        :return: list of fiscal codes, in the same order of `persons`:
+            False when the national code of the city is not found.
+        """
+        fiscalcodes = []
+        for person in persons:
+            birth_date = fields.Date.to_date(person['birth_date'])
+            nat_code = self._get_national_code(
+                person['birth_city'], person['birth_province'], birth_date)
+            fiscalcodes.append(nat_code and build(
+                person['surname'], person['firstname'], birth_date,
+                person['sex'], nat_code) or False)
+        return fiscalcodes
+
+    @api.model
+    def check_fiscalcodes(self, persons):
+        """
+        Check that the fiscal codes of many persons
+        match the ones computed from their data.
+
+        :param persons: list of dictionaries with the keys
+            used by `compute_fiscalcodes` and `fiscalcode`.
+        :return: list of booleans, in the same order of `persons`.
+        """
+        computed = self.compute_fiscalcodes(persons)
+        return [
+            bool(fiscalcode) and
+            fiscalcode == (person['fiscalcode'] or '').upper()
+            for person, fiscalcode in zip(persons, computed)
+        ]
+
     @api.multi
     def compute_fc(self):
         active_id = self._context.get('active_id')
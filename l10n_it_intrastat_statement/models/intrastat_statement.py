@@ -1,6 +1,9 @@
 # Copyright 2019 Simone Rubino - Agile Business Group
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+import itertools
+from collections import defaultdict
+
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
 from datetime import datetime, date, timedelta
@@ -154,7 +157,8 @@ class AccountIntrastatStatement(models.Model):
                     section = statement[section_field]
                     sequence = 1
                     for line in section:
-                        line.sequence = sequence
+                        if line.sequence != sequence:
+                            line.sequence = sequence
                         sequence += 1
 
     @api.model
@@ -766,32 +770,27 @@ class AccountIntrastatStatement(models.Model):
             inv_type += ['in_invoice', 'in_refund']
         domain.append(('type', 'in', inv_type))
 
-        statement_data = dict()
         invoices = self.env['account.invoice'].search(domain)
 
+        # Partition the intrastat lines by section in a single pass
+        sections = {
+            '%s_s%s' % section_details: section_details
+            for section_details in itertools.product(
+                ['purchase', 'sale'], range(1, 5))
+        }
+        statement_data = defaultdict(list)
         for inv_intra_line in invoices.mapped('intrastat_line_ids'):
-            for section_type in ['purchase', 'sale']:
-                for section_number in range(1, 5):
-                    section_details = (section_type, section_number)
-                    statement_section = '%s_s%s' % section_details
-                    if inv_intra_line.statement_section != statement_section:
-                        continue
-                    statement_section_model_name = \
-                        self.get_section_model(*section_details)
-                    st_line = self.env[statement_section_model_name] \
-                        ._prepare_statement_line(inv_intra_line, self)
-                    if not st_line:
-                        continue
-                    statement_section_field = \
-                        self.get_section_field_name(*section_details)
-                    if statement_section_field not in statement_data:
-                        statement_data[statement_section_field] = list()
-                    st_line['sequence'] = \
-                        len(statement_data[statement_section_field]) + 1
-                    statement_data[statement_section_field] \
-                        .append((0, 0, st_line))
-
-        self.write(statement_data)
+            section_details = sections.get(inv_intra_line.statement_section)
+            if not section_details:
+                continue
+            statement_section_model_name = \
+                self.get_section_model(*section_details)
+            st_line = self.env[statement_section_model_name] \
+                ._prepare_statement_line(inv_intra_line, self)
+            if not st_line:
+                continue
+            statement_data[section_details].append(st_line)
+
         # Group refund to sale lines if they have the same period of ref
         refund_map = [
             (2, 1),  # Sale (Purchase) section 2 refunds section 1
@@ -801,12 +800,25 @@ class AccountIntrastatStatement(models.Model):
             for section_number, refund_section_number in refund_map:
                 section_details = (section_type, section_number)
                 refund_section_details = (section_type, refund_section_number)
-                section_field = self.get_section_field_name(*section_details)
-                for line in self[section_field]:
-                    refund_section_model = \
-                        self.get_section_model(*refund_section_details)
-                    to_refund_model = self.env[refund_section_model]
-                    self.refund_line(line, to_refund_model)
+                if not statement_data[section_details]:
+                    continue
+                statement_data[section_details] = self.refund_lines(
+                    statement_data[section_details],
+                    statement_data[refund_section_details],
+                    self.get_section_model(*refund_section_details))
+
+        # Create the lines of each section at once,
+        # sequences are already computed
+        for section_details, st_lines in statement_data.items():
+            if not st_lines:
+                continue
+            for sequence, st_line in enumerate(st_lines, start=1):
+                st_line.update({
+                    'statement_id': self.id,
+                    'sequence': sequence,
+                })
+            self.env[self.get_section_model(*section_details)] \
+                .create(st_lines)
         return True
 
     @staticmethod
@@ -819,51 +831,57 @@ class AccountIntrastatStatement(models.Model):
         return '%s_section%s_ids' % (section_type, section_number)
 
     @api.multi
-    def refund_line(self, line, to_ref_obj):
-        """Refund line into sale if period ref is the same of the statement"""
+    def _is_refund_in_period(self, line):
+        """True if `line` (values of a statement line)
+        refers to the period of the statement"""
         self.ensure_one()
-        to_refund = False
-        if line.year_id == self.fiscalyear:
-            if (
-                    self.period_type == 'M' and
-                    line.month == self.period_number
-            ):
-                to_refund = True
-
-            if (
-                    self.period_type == 'T' and
-                    line.quarterly == self.period_number
-            ):
-                to_refund = True
-        # Execute refund
-        if to_refund:
-            domain = [('statement_id', '=', self.id),
-                      ('partner_id', '=', line.partner_id.id),
-                      ('intrastat_code_id', '=', line.intrastat_code_id.id),
-                      ('amount_euro', '>=', line.amount_euro)]
-            line_to_refund = to_ref_obj.search(domain, limit=1)
-            if line_to_refund:
-                if line_to_refund.amount_euro < line.amount_euro:
-                    raise ValidationError(
-                        _('Invoice and credit note in the same period with'
-                          ' credit note > invoice for partner %s')
-                        % line.partner_id.name)
-                val = {
-                    'amount_euro': (
-                        line_to_refund.amount_euro - line.amount_euro)
-                }
-                if 'statistic_amount_euro' in line_to_refund:
-                    val['statistic_amount_euro'] = (
-                        line_to_refund.statistic_amount_euro -
-                        line.statistic_amount_euro
-                    )
-                if 'amount_currency' in line_to_refund:
-                    val['amount_currency'] = (
-                        line_to_refund.amount_currency -
-                        line.amount_currency)
-
-                line_to_refund.write(val)
-                line.unlink()
+        if line.get('year_id') != self.fiscalyear:
+            return False
+        if self.period_type == 'M':
+            return line.get('month') == self.period_number
+        if self.period_type == 'T':
+            return line.get('quarterly') == self.period_number
+        return False
+
+    @api.multi
+    def refund_lines(self, lines, to_ref_lines, to_ref_model_name):
+        """
+        Refund `lines` into `to_ref_lines` if period ref
+        is the same of the statement.
+
+        Both `lines` and `to_ref_lines` are lists of values
+        of statement lines, `to_ref_lines` is updated in place.
+
+        :return: the lines of `lines` that have not been refunded.
+        """
+        self.ensure_one()
+        to_ref_fields = self.env[to_ref_model_name]._fields
+        to_ref_lines_by_key = defaultdict(list)
+        for to_ref_line in to_ref_lines:
+            key = (to_ref_line.get('partner_id'),
+                   to_ref_line.get('intrastat_code_id'))
+            to_ref_lines_by_key[key].append(to_ref_line)
+
+        not_refunded_lines = []
+        for line in lines:
+            line_to_refund = None
+            if self._is_refund_in_period(line):
+                key = (line.get('partner_id'), line.get('intrastat_code_id'))
+                # First line having enough amount, like in creation order
+                line_to_refund = next((
+                    to_ref_line for to_ref_line in to_ref_lines_by_key[key]
+                    if to_ref_line['amount_euro'] >= line['amount_euro']
+                ), None)
+            if line_to_refund is None:
+                not_refunded_lines.append(line)
+                continue
+            for field_name in (
+                    'amount_euro', 'statistic_amount_euro', 'amount_currency'):
+                if field_name in to_ref_fields:
+                    line_to_refund[field_name] = \
+                        line_to_refund.get(field_name, 0) \
+                        - line.get(field_name, 0)
+        return not_refunded_lines
 
     @api.onchange('company_id')
     def change_company_id(self):
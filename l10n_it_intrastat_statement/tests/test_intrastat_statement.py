@@ -229,6 +229,32 @@ class TestIntrastatStatement (AccountingTestCase):
         self.assertSetEqual({len(line) for line in file_lines},
                             {75, 130, 119})
 
+    def test_statement_purchase_refund_lines(self):
+        """The refund is subtracted from the bill
+        and it is not added to the statement"""
+        bill = self._get_intrastat_computed_bill(price_unit=100.0)
+
+        bill_refund = bill.refund()
+        bill_refund.update({
+            'intrastat': True,
+        })
+        bill_refund.invoice_line_ids.update({
+            'price_unit': 40.0,
+        })
+        bill_refund.compute_taxes()
+        bill_refund.action_invoice_open()
+        bill_refund.compute_intrastat_lines()
+
+        statement = self.statement_model.create({
+            'period_number': bill_refund.date_invoice.month,
+        })
+        statement.compute_statement()
+
+        self.assertFalse(statement.purchase_section2_ids)
+        self.assertEqual(len(statement.purchase_section1_ids), 1)
+        self.assertEqual(statement.purchase_section1_ids.amount_euro, 60)
+        self.assertEqual(statement.purchase_section1_ids.sequence, 1)
+
     def test_statement_purchase_refund_no_subtract(self):
         bill = self._get_intrastat_computed_bill()
 
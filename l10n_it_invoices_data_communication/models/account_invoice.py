@@ -1,5 +1,7 @@
 
 
+from collections import defaultdict
+
 from odoo import fields, models, _
 from odoo.exceptions import ValidationError
 
@@ -20,17 +22,40 @@ class AccountInvoice(models.Model):
         vals['ImponibileImporto'] = vals['ImponibileImporto'] / exchange_rate
         vals['Imposta'] = vals['Imposta'] / exchange_rate
 
-    def _get_tax_comunicazione_dati_iva(self):
+    def _get_parent_taxes(self):
+        """
+        Find the parent taxes of the taxes of the invoices
+        with a single query.
+
+        :return: dictionary mapping the id of each tax
+            to its parent taxes, if any.
+        """
+        tax_model = self.env['account.tax']
+        taxes = self.mapped('tax_line_ids.tax_id')
+        parent_taxes = defaultdict(lambda: tax_model)
+        for parent in tax_model.search([
+                ('children_tax_ids', 'in', taxes.ids)]):
+            for child_tax in parent.children_tax_ids & taxes:
+                parent_taxes[child_tax.id] |= parent
+        return dict(parent_taxes)
+
+    def _get_tax_comunicazione_dati_iva(self, parent_taxes=None):
+        """
+        :param parent_taxes: parent taxes as returned by
+            `_get_parent_taxes`, to be passed when computing many invoices.
+        """
         self.ensure_one()
         fattura = self
         tax_model = self.env['account.tax']
+        if parent_taxes is None:
+            parent_taxes = fattura._get_parent_taxes()
 
         tax_lines = []
         tax_grouped = {}
         for tax_line in fattura.tax_line_ids:
             tax = tax_line.tax_id
             aliquota = tax.amount
-            parent = tax_model.search([('children_tax_ids', 'in', [tax.id])])
+            parent = parent_taxes.get(tax.id, tax_model)
             if parent:
                 main_tax = parent
                 aliquota = parent.amount
@@ -1,10 +1,11 @@
-
+from collections import defaultdict
 
 from odoo import api, fields, models, _
-from odoo.exceptions import ValidationError
+from odoo.exceptions import UserError, ValidationError
 from odoo.addons.l10n_it_account.tools.account_tools import encode_for_export
 from lxml import etree
 import re
+import tempfile
 
 
 NS_2 = 'http://ivaservizi.agenziaentrate.gov.it/docs/xsd/fatture/v2.0'
@@ -29,10 +30,19 @@ def clear_xml(xml_root):
     xml_root = etree.iterwalk(xml_root)
     for dummy, xml_element in xml_root:
         parent = xml_element.getparent()
-        if clear_xml_element(xml_element):
+        if parent is not None and clear_xml_element(xml_element):
             parent.remove(xml_element)
 
 
+def write_xml_block(xml_file, xml_block):
+    """Write `xml_block` in the `etree.xmlfile` without its empty nodes"""
+    container = etree.Element("container")
+    container.append(xml_block)
+    clear_xml(container)
+    for xml_element in container:
+        xml_file.write(xml_element, pretty_print=True)
+
+
 def check_normalized_string(value):
     normalized = True
     if not value:
@@ -400,14 +410,25 @@ class ComunicazioneDatiIva(models.Model):
             if comunicazione.dati_trasmissione == 'DTR':
                 comunicazione.compute_fatture_ricevute()
 
+    @api.model
+    def _group_fatture_by_partner(self, fatture):
+        """Group `fatture` by partner, keeping their order."""
+        fatture_ids_by_partner = defaultdict(list)
+        for fattura in fatture:
+            fatture_ids_by_partner[fattura.partner_id.id].append(fattura.id)
+        return {
+            partner_id: fatture.browse(fatture_ids)
+            for partner_id, fatture_ids in fatture_ids_by_partner.items()
+        }
+
     def _prepare_cessionari_dati_fatture(self, fatture_emesse, cessionari):
         dati_fatture = []
         posizione = 0
+        fatture_by_partner = self._group_fatture_by_partner(fatture_emesse)
+        parent_taxes = fatture_emesse._get_parent_taxes()
         for cessionario in cessionari:
-            fatture = fatture_emesse.filtered(
-                lambda fe:
-                fe.partner_id.id ==
-                    cessionario.id)
+            fatture = fatture_by_partner.get(
+                cessionario.id, fatture_emesse.browse())
             vals_fatture = []
             for fattura in fatture:
                 posizione += 1
@@ -420,7 +441,8 @@ class ComunicazioneDatiIva(models.Model):
                     'dati_fattura_Numero': self._parse_fattura_numero(
                         fattura.number),
                     'dati_fattura_iva_ids':
-                        fattura._get_tax_comunicazione_dati_iva()
+                        fattura._get_tax_comunicazione_dati_iva(
+                            parent_taxes=parent_taxes)
                 }
                 val = self._prepare_fattura_emessa(val, fattura)
                 vals_fatture.append((0, 0, val))
@@ -478,12 +500,12 @@ class ComunicazioneDatiIva(models.Model):
     def _prepare_cedenti_dati_fatture(self, fatture_ricevute, cedenti):
         dati_fatture = []
         posizione = 0
+        fatture_by_partner = self._group_fatture_by_partner(fatture_ricevute)
+        parent_taxes = fatture_ricevute._get_parent_taxes()
         for cedente in cedenti:
             # Fatture
-            fatture = fatture_ricevute.filtered(
-                lambda fr:
-                fr.partner_id.id ==
-                    cedente.id)
+            fatture = fatture_by_partner.get(
+                cedente.id, fatture_ricevute.browse())
             vals_fatture = []
             for fattura in fatture:
                 posizione += 1
@@ -498,7 +520,8 @@ class ComunicazioneDatiIva(models.Model):
                     'dati_fattura_Numero': self._parse_fattura_numero(
                         fattura.reference) or '',
                     'dati_fattura_iva_ids':
-                        fattura._get_tax_comunicazione_dati_iva()
+                        fattura._get_tax_comunicazione_dati_iva(
+                            parent_taxes=parent_taxes)
                 }
                 val = self._prepare_fattura_ricevuta(val, fattura)
                 vals_fatture.append((0, 0, val))
@@ -564,8 +587,8 @@ class ComunicazioneDatiIva(models.Model):
                 fatture_emesse = self.mapped(
                     'fatture_emesse_ids.fatture_emesse_body_ids.invoice_id')
                 cessionari = fatture_emesse.mapped('partner_id')
-                first_set_ids = cessionari.ids[:len(cessionari) / 2]
-                second_set_ids = cessionari.ids[len(cessionari) / 2:]
+                first_set_ids = cessionari.ids[:len(cessionari) // 2]
+                second_set_ids = cessionari.ids[len(cessionari) // 2:]
                 first_set_cessionari = self.env['res.partner'].browse(
                     first_set_ids)
                 second_set_cessionari = self.env['res.partner'].browse(
@@ -598,7 +621,7 @@ class ComunicazioneDatiIva(models.Model):
                         fe.partner_id.id ==
                             cessionario.id)
                     if len(fatture) > 1000:
-                        new_set_ids = fatture.ids[:len(fatture) / 2]
+                        new_set_ids = fatture.ids[:len(fatture) // 2]
                         new_partial_set = self.env['account.invoice'].browse(
                             new_set_ids)
                         new_set |= new_partial_set
@@ -628,8 +651,8 @@ class ComunicazioneDatiIva(models.Model):
                     'fatture_ricevute_ids.fatture_ricevute_body_ids.'
                     'invoice_id')
                 cedenti = fatture_ricevute.mapped('partner_id')
-                first_set_ids = cedenti.ids[:len(cedenti) / 2]
-                second_set_ids = cedenti.ids[len(cedenti) / 2:]
+                first_set_ids = cedenti.ids[:len(cedenti) // 2]
+                second_set_ids = cedenti.ids[len(cedenti) // 2:]
                 first_set_cedenti = self.env['res.partner'].browse(
                     first_set_ids)
                 second_set_cedenti = self.env['res.partner'].browse(
@@ -663,7 +686,7 @@ class ComunicazioneDatiIva(models.Model):
                         fr.partner_id.id ==
                             cedente.id)
                     if len(fatture) > 1000:
-                        new_set_ids = fatture.ids[:len(fatture) / 2]
+                        new_set_ids = fatture.ids[:len(fatture) // 2]
                         new_partial_set = self.env['account.invoice'].browse(
                             new_set_ids)
                         new_set |= new_partial_set
@@ -1145,6 +1168,12 @@ class ComunicazioneDatiIva(models.Model):
         """
         Controllo congruità dati della comunicazione
         """
+        self.ensure_one()
+        if not self.check_1k_limit():
+            raise UserError(_(
+                "Communication %s exceeds the limits of "
+                "1000 partners per file or 1000 invoices per partner, "
+                "please split it.") % self.identificativo)
         return True
 
     def _export_xml_get_dati_fattura(self):
@@ -1199,9 +1228,15 @@ class ComunicazioneDatiIva(models.Model):
         # ----- 2 - DTE
         x_2_dte = etree.Element(
             etree.QName("DTE"))
+        x_2_dte.append(self._export_xml_get_dte_cedente())
+        for partner_invoice in self.fatture_emesse_ids:
+            x_2_dte.append(self._export_xml_get_dte_partner(
+                partner_invoice, partner_invoice.fatture_emesse_body_ids))
+        return x_2_dte
+
+    def _export_xml_get_dte_cedente(self):
         # -----     2.1 - Cedente Prestatore DTE
-        x_2_1_cedente_prestatore = etree.SubElement(
-            x_2_dte,
+        x_2_1_cedente_prestatore = etree.Element(
             etree.QName("CedentePrestatoreDTE"))
         # -----         2.1.1 - IdentificativiFiscali
         x_2_1_1_identificativi_fiscali = etree.SubElement(
@@ -1349,273 +1384,278 @@ class ComunicazioneDatiIva(models.Model):
             x_2_1_2_6_rappresentante_fiscale,
             etree.QName("Cognome"))
         x_2_1_2_6_4_cognome.text = self.cedente_rf_Cognome or ''
-
-        for partner_invoice in self.fatture_emesse_ids:
-            # -----     2.2 - Cessionario Committente DTE
-            x_2_2_cessionario_committente = etree.SubElement(
-                x_2_dte,
-                etree.QName("CessionarioCommittenteDTE"))
-            # -----         2.2.1 - IdentificativiFiscali
-            x_2_2_1_identificativi_fiscali = etree.SubElement(
-                x_2_2_cessionario_committente,
-                etree.QName("IdentificativiFiscali"))
-            if partner_invoice.cessionario_IdFiscaleIVA_IdPaese and \
-                    partner_invoice.cessionario_IdFiscaleIVA_IdCodice:
-                # -----             2.2.1.1 - Id Fiscale IVA
-                x_2_2_1_1_id_fiscale_iva = etree.SubElement(
-                    x_2_2_1_identificativi_fiscali,
-                    etree.QName("IdFiscaleIVA"))
-                # -----                 2.2.1.1.1 - Id Paese
-                x_2_2_1_1_1_id_paese = etree.SubElement(
-                    x_2_2_1_1_id_fiscale_iva,
-                    etree.QName("IdPaese"))
-                x_2_2_1_1_1_id_paese.text = \
-                    partner_invoice.cessionario_IdFiscaleIVA_IdPaese or ''
-                # -----                 2.2.1.1.2 - Id Codice
-                x_2_2_1_1_2_id_codice = etree.SubElement(
-                    x_2_2_1_1_id_fiscale_iva,
-                    etree.QName("IdCodice"))
-                x_2_2_1_1_2_id_codice.text = \
-                    partner_invoice.cessionario_IdFiscaleIVA_IdCodice or ''
-            # -----             2.2.1.2 - Codice Fiscale
-            x_2_2_1_2_codice_fiscale = etree.SubElement(
+        return x_2_1_cedente_prestatore
+
+    def _export_xml_get_dte_partner(self, partner_invoice, invoices):
+        # -----     2.2 - Cessionario Committente DTE
+        x_2_2_cessionario_committente = etree.Element(
+            etree.QName("CessionarioCommittenteDTE"))
+        # -----         2.2.1 - IdentificativiFiscali
+        x_2_2_1_identificativi_fiscali = etree.SubElement(
+            x_2_2_cessionario_committente,
+            etree.QName("IdentificativiFiscali"))
+        if partner_invoice.cessionario_IdFiscaleIVA_IdPaese and \
+                partner_invoice.cessionario_IdFiscaleIVA_IdCodice:
+            # -----             2.2.1.1 - Id Fiscale IVA
+            x_2_2_1_1_id_fiscale_iva = etree.SubElement(
                 x_2_2_1_identificativi_fiscali,
-                etree.QName("CodiceFiscale"))
-            x_2_2_1_2_codice_fiscale.text = \
-                partner_invoice.cessionario_CodiceFiscale or ''
-            # -----         2.2.2 - AltriDatiIdentificativi
-            x_2_2_2_altri_identificativi = etree.SubElement(
-                x_2_2_cessionario_committente,
-                etree.QName("AltriDatiIdentificativi"))
-            # -----             2.2.2.1 - Denominazione
-            x_2_2_2_1_altri_identificativi_denominazione = etree.SubElement(
-                x_2_2_2_altri_identificativi,
-                etree.QName("Denominazione"))
-            x_2_2_2_1_altri_identificativi_denominazione.text = \
-                encode_for_export(partner_invoice.cessionario_Denominazione or '', 80)
-            # -----             2.2.2.2 - Nome
-            x_2_2_2_2_nome = etree.SubElement(
-                x_2_2_2_altri_identificativi,
-                etree.QName("Nome"))
-            x_2_2_2_2_nome.text = \
-                encode_for_export(partner_invoice.cessionario_Nome or '', 60)
-            # -----             2.2.2.3 - Cognome
-            x_2_2_2_3_cognome = etree.SubElement(
-                x_2_2_2_altri_identificativi,
-                etree.QName("Cognome"))
-            x_2_2_2_3_cognome.text = \
-                encode_for_export(partner_invoice.cessionario_Cognome or '', 60)
-            # -----             2.2.2.4 - Sede
-            x_2_2_2_4_sede = etree.SubElement(
-                x_2_2_2_altri_identificativi,
-                etree.QName("Sede"))
-            # -----                 2.2.2.4.1 - Indirizzo
-            x_2_2_2_4_1_indirizzo = etree.SubElement(
-                x_2_2_2_4_sede,
-                etree.QName("Indirizzo"))
-            x_2_2_2_4_1_indirizzo.text = \
-                encode_for_export(partner_invoice.cessionario_sede_Indirizzo or '', 60)
-            # -----                 2.2.2.4.2 - Numero Civico
-            x_2_2_2_4_2_numero_civico = etree.SubElement(
-                x_2_2_2_4_sede,
-                etree.QName("NumeroCivico"))
-            x_2_2_2_4_2_numero_civico.text = \
-                encode_for_export(
-                    partner_invoice.cessionario_sede_NumeroCivico or '', 8,
-                    encoding='ascii')
-            # -----                 2.2.2.4.3 - CAP
-            x_2_2_2_4_3_cap = etree.SubElement(
-                x_2_2_2_4_sede,
-                etree.QName("CAP"))
-            x_2_2_2_4_3_cap.text = \
-                encode_for_export(partner_invoice.cessionario_sede_Cap or '', 5,
-                                  encoding='ascii')
-            # -----                 2.2.2.4.4 - Comune
-            x_2_2_2_4_4_comune = etree.SubElement(
-                x_2_2_2_4_sede,
-                etree.QName("Comune"))
-            x_2_2_2_4_4_comune.text = \
-                encode_for_export(partner_invoice.cessionario_sede_Comune or '', 60)
-            # -----                 2.2.2.4.5 - Provincia
-            x_2_2_2_4_5_provincia = etree.SubElement(
-                x_2_2_2_4_sede,
-                etree.QName("Provincia"))
-            x_2_2_2_4_5_provincia.text = \
-                partner_invoice.cessionario_sede_Provincia or ''
-            # -----                 2.2.2.4.6 - Nazione
-            x_2_2_2_4_6_nazione = etree.SubElement(
-                x_2_2_2_4_sede,
-                etree.QName("Nazione"))
-            x_2_2_2_4_6_nazione.text = \
-                partner_invoice.cessionario_sede_Nazione or ''
-            # -----             2.2.2.5 - Stabile Organizzazione
-            x_2_2_2_5_stabile_organizzazione = etree.SubElement(
-                x_2_2_2_altri_identificativi,
-                etree.QName("StabileOrganizzazione"))
-            # -----                 2.2.2.5.1 - Indirizzo
-            x_2_2_2_5_1_indirizzo = etree.SubElement(
-                x_2_2_2_5_stabile_organizzazione,
-                etree.QName("Indirizzo"))
-            x_2_2_2_5_1_indirizzo.text = \
-                encode_for_export(partner_invoice.cessionario_so_Indirizzo or '', 60)
-            # -----                 2.2.2.5.2 - Numero Civico
-            x_2_2_2_5_2_numero_civico = etree.SubElement(
-                x_2_2_2_5_stabile_organizzazione,
-                etree.QName("NumeroCivico"))
-            x_2_2_2_5_2_numero_civico.text = \
-                encode_for_export(partner_invoice.cessionario_so_NumeroCivico or '', 8,
-                                  encoding='ascii')
-            # -----                 2.2.2.5.3 - CAP
-            x_2_2_2_5_3_cap = etree.SubElement(
-                x_2_2_2_5_stabile_organizzazione,
-                etree.QName("CAP"))
-            x_2_2_2_5_3_cap.text = \
-                encode_for_export(partner_invoice.cessionario_so_Cap or '', 5,
-                                  encoding='ascii')
-            # -----                 2.2.2.5.4 - Comune
-            x_2_2_2_5_4_comune = etree.SubElement(
-                x_2_2_2_5_stabile_organizzazione,
-                etree.QName("Comune"))
-            x_2_2_2_5_4_comune.text = \
-                encode_for_export(partner_invoice.cessionario_so_Comune or '', 60)
-            # -----                 2.2.2.5.5 - Provincia
-            x_2_2_2_5_5_provincia = etree.SubElement(
-                x_2_2_2_5_stabile_organizzazione,
-                etree.QName("Provincia"))
-            x_2_2_2_5_5_provincia.text = \
-                partner_invoice.cessionario_so_Provincia or ''
-            # -----                 2.2.2.5.6 - Nazione
-            x_2_2_2_5_6_nazione = etree.SubElement(
-                x_2_2_2_5_stabile_organizzazione,
-                etree.QName("Nazione"))
-            x_2_2_2_5_6_nazione.text = \
-                partner_invoice.cessionario_so_Nazione or ''
-            # -----             2.2.2.6 - Rappresentante Fiscale
-            x_2_2_2_6_rappresentante_fiscale = etree.SubElement(
-                x_2_2_2_altri_identificativi,
-                etree.QName("RappresentanteFiscale"))
-            # -----                 2.2.2.6.1 - Id Fiscale IVA
-            x_2_2_2_6_1_id_fiscale_iva = etree.SubElement(
-                x_2_2_2_6_rappresentante_fiscale,
                 etree.QName("IdFiscaleIVA"))
-            x_2_2_2_6_rappresentante_fiscale.text = \
-                partner_invoice.cessionario_rf_IdFiscaleIVA_IdPaese or ''
-            # -----                     2.2.2.6.1.1 - Id Paese
-            x_2_2_2_6_1_1_id_paese = etree.SubElement(
-                x_2_2_2_6_1_id_fiscale_iva,
+            # -----                 2.2.1.1.1 - Id Paese
+            x_2_2_1_1_1_id_paese = etree.SubElement(
+                x_2_2_1_1_id_fiscale_iva,
                 etree.QName("IdPaese"))
-            x_2_2_2_6_1_1_id_paese.text = \
-                partner_invoice.cessionario_rf_IdFiscaleIVA_IdPaese or ''
-            # -----                     2.2.2.6.1.2 - Id Codice
-            x_2_2_2_6_1_2_id_codice = etree.SubElement(
-                x_2_2_2_6_1_id_fiscale_iva,
+            x_2_2_1_1_1_id_paese.text = \
+                partner_invoice.cessionario_IdFiscaleIVA_IdPaese or ''
+            # -----                 2.2.1.1.2 - Id Codice
+            x_2_2_1_1_2_id_codice = etree.SubElement(
+                x_2_2_1_1_id_fiscale_iva,
                 etree.QName("IdCodice"))
-            x_2_2_2_6_1_2_id_codice.text = \
-                partner_invoice.cessionario_rf_IdFiscaleIVA_IdCodice or ''
-            # -----                 2.2.2.6.2 - Denominazione
-            x_2_2_2_6_2_denominazione = etree.SubElement(
-                x_2_2_2_6_rappresentante_fiscale,
-                etree.QName("Denominazione"))
-            x_2_2_2_6_2_denominazione.text = \
-                encode_for_export(
-                    partner_invoice.cessionario_rf_Denominazione or '', 80)
-            # -----                 2.2.2.6.3 - Nome
-            x_2_2_2_6_3_nome = etree.SubElement(
-                x_2_2_2_6_rappresentante_fiscale,
-                etree.QName("Nome"))
-            x_2_2_2_6_3_nome.text = \
-                encode_for_export(partner_invoice.cessionario_rf_Nome or '', 60)
-            # -----                 2.2.2.6.4 - Cognome
-            x_2_2_2_6_4_cognome = etree.SubElement(
-                x_2_2_2_6_rappresentante_fiscale,
-                etree.QName("Cognome"))
-            x_2_2_2_6_4_cognome.text = \
-                encode_for_export(partner_invoice.cessionario_rf_Cognome or '', 60)
-
-            for invoice in partner_invoice.fatture_emesse_body_ids:
-                # -----         2.2.3 - Dati Fattura Body DTE
-                x_2_2_3_dati_fattura_body_dte = etree.SubElement(
-                    x_2_2_cessionario_committente,
-                    etree.QName("DatiFatturaBodyDTE"))
-                # -----             2.2.3.1 - Dati Generali
-                x_2_2_3_1_dati_generali = etree.SubElement(
-                    x_2_2_3_dati_fattura_body_dte,
-                    etree.QName("DatiGenerali"))
-                # -----                 2.2.3.1.1 - Tipo Documento
-                x_2_2_3_1_1_tipo_documento = etree.SubElement(
-                    x_2_2_3_1_dati_generali,
-                    etree.QName("TipoDocumento"))
-                x_2_2_3_1_1_tipo_documento.text = \
-                    invoice.dati_fattura_TipoDocumento.code or ''
-                # -----                 2.2.3.1.2 - Data
-                x_2_2_3_1_2_data = etree.SubElement(
-                    x_2_2_3_1_dati_generali,
-                    etree.QName("Data"))
-                x_2_2_3_1_2_data.text = \
-                    fields.Date.to_string(invoice.dati_fattura_Data) or ''
-                # -----                 2.2.3.1.3 - Numero
-                x_2_2_3_1_2_numero = etree.SubElement(
-                    x_2_2_3_1_dati_generali,
-                    etree.QName("Numero"))
-                x_2_2_3_1_2_numero.text = invoice.dati_fattura_Numero or ''
-
-                for tax in invoice.dati_fattura_iva_ids:
-                    # -----             2.2.3.2 - Dati Riepilogo
-                    x_2_2_3_2_riepilogo = etree.SubElement(
-                        x_2_2_3_dati_fattura_body_dte,
-                        etree.QName("DatiRiepilogo"))
-                    # -----                 2.2.3.2.1 - Imponibile Importo
-                    x_2_2_3_2_1_imponibile_importo = etree.SubElement(
-                        x_2_2_3_2_riepilogo,
-                        etree.QName("ImponibileImporto"))
-                    x_2_2_3_2_1_imponibile_importo.text = \
-                        format_decimal(tax.ImponibileImporto)
-                    # -----                 2.2.3.2.2 - Dati IVA
-                    x_2_2_3_2_2_dati_iva = etree.SubElement(
-                        x_2_2_3_2_riepilogo,
-                        etree.QName("DatiIVA"))
-                    # -----                     2.2.3.2.2.1 - Imposta
-                    x_2_2_3_2_2_1_imposta = etree.SubElement(
-                        x_2_2_3_2_2_dati_iva,
-                        etree.QName("Imposta"))
-                    x_2_2_3_2_2_1_imposta.text = format_decimal(tax.Imposta)
-                    # -----                     2.2.3.2.2.2 - Aliquota
-                    x_2_2_3_2_2_2_aliquota = etree.SubElement(
-                        x_2_2_3_2_2_dati_iva,
-                        etree.QName("Aliquota"))
-                    x_2_2_3_2_2_2_aliquota.text = format_decimal(tax.Aliquota)
-                    # -----                 2.2.3.2.3 - Natura
-                    x_2_2_3_2_3_natura = etree.SubElement(
-                        x_2_2_3_2_riepilogo,
-                        etree.QName("Natura"))
-                    x_2_2_3_2_3_natura.text = \
-                        tax.Natura_id.code if tax.Natura_id else ''
-                    # -----                 2.2.3.2.4 - Detraibile
-                    x_2_2_3_2_4_detraibile = etree.SubElement(
-                        x_2_2_3_2_riepilogo,
-                        etree.QName("Detraibile"))
-                    x_2_2_3_2_4_detraibile.text = format_decimal(
-                        tax.Detraibile)
-                    # -----                 2.2.3.2.5 - Deducibile
-                    x_2_2_3_2_5_deducibile = etree.SubElement(
-                        x_2_2_3_2_riepilogo,
-                        etree.QName("Deducibile"))
-                    x_2_2_3_2_5_deducibile.text = tax.Deducibile or ''
-                    # -----                 2.2.3.2.6 - Esigibilita IVA
-                    x_2_2_3_2_6_esagibilita_iva = etree.SubElement(
-                        x_2_2_3_2_riepilogo,
-                        etree.QName("EsigibilitaIVA"))
-                    x_2_2_3_2_6_esagibilita_iva.text = tax.EsigibilitaIVA or ''
+            x_2_2_1_1_2_id_codice.text = \
+                partner_invoice.cessionario_IdFiscaleIVA_IdCodice or ''
+        # -----             2.2.1.2 - Codice Fiscale
+        x_2_2_1_2_codice_fiscale = etree.SubElement(
+            x_2_2_1_identificativi_fiscali,
+            etree.QName("CodiceFiscale"))
+        x_2_2_1_2_codice_fiscale.text = \
+            partner_invoice.cessionario_CodiceFiscale or ''
+        # -----         2.2.2 - AltriDatiIdentificativi
+        x_2_2_2_altri_identificativi = etree.SubElement(
+            x_2_2_cessionario_committente,
+            etree.QName("AltriDatiIdentificativi"))
+        # -----             2.2.2.1 - Denominazione
+        x_2_2_2_1_altri_identificativi_denominazione = etree.SubElement(
+            x_2_2_2_altri_identificativi,
+            etree.QName("Denominazione"))
+        x_2_2_2_1_altri_identificativi_denominazione.text = \
+            encode_for_export(partner_invoice.cessionario_Denominazione or '', 80)
+        # -----             2.2.2.2 - Nome
+        x_2_2_2_2_nome = etree.SubElement(
+            x_2_2_2_altri_identificativi,
+            etree.QName("Nome"))
+        x_2_2_2_2_nome.text = \
+            encode_for_export(partner_invoice.cessionario_Nome or '', 60)
+        # -----             2.2.2.3 - Cognome
+        x_2_2_2_3_cognome = etree.SubElement(
+            x_2_2_2_altri_identificativi,
+            etree.QName("Cognome"))
+        x_2_2_2_3_cognome.text = \
+            encode_for_export(partner_invoice.cessionario_Cognome or '', 60)
+        # -----             2.2.2.4 - Sede
+        x_2_2_2_4_sede = etree.SubElement(
+            x_2_2_2_altri_identificativi,
+            etree.QName("Sede"))
+        # -----                 2.2.2.4.1 - Indirizzo
+        x_2_2_2_4_1_indirizzo = etree.SubElement(
+            x_2_2_2_4_sede,
+            etree.QName("Indirizzo"))
+        x_2_2_2_4_1_indirizzo.text = \
+            encode_for_export(partner_invoice.cessionario_sede_Indirizzo or '', 60)
+        # -----                 2.2.2.4.2 - Numero Civico
+        x_2_2_2_4_2_numero_civico = etree.SubElement(
+            x_2_2_2_4_sede,
+            etree.QName("NumeroCivico"))
+        x_2_2_2_4_2_numero_civico.text = \
+            encode_for_export(
+                partner_invoice.cessionario_sede_NumeroCivico or '', 8,
+                encoding='ascii')
+        # -----                 2.2.2.4.3 - CAP
+        x_2_2_2_4_3_cap = etree.SubElement(
+            x_2_2_2_4_sede,
+            etree.QName("CAP"))
+        x_2_2_2_4_3_cap.text = \
+            encode_for_export(partner_invoice.cessionario_sede_Cap or '', 5,
+                              encoding='ascii')
+        # -----                 2.2.2.4.4 - Comune
+        x_2_2_2_4_4_comune = etree.SubElement(
+            x_2_2_2_4_sede,
+            etree.QName("Comune"))
+        x_2_2_2_4_4_comune.text = \
+            encode_for_export(partner_invoice.cessionario_sede_Comune or '', 60)
+        # -----                 2.2.2.4.5 - Provincia
+        x_2_2_2_4_5_provincia = etree.SubElement(
+            x_2_2_2_4_sede,
+            etree.QName("Provincia"))
+        x_2_2_2_4_5_provincia.text = \
+            partner_invoice.cessionario_sede_Provincia or ''
+        # -----                 2.2.2.4.6 - Nazione
+        x_2_2_2_4_6_nazione = etree.SubElement(
+            x_2_2_2_4_sede,
+            etree.QName("Nazione"))
+        x_2_2_2_4_6_nazione.text = \
+            partner_invoice.cessionario_sede_Nazione or ''
+        # -----             2.2.2.5 - Stabile Organizzazione
+        x_2_2_2_5_stabile_organizzazione = etree.SubElement(
+            x_2_2_2_altri_identificativi,
+            etree.QName("StabileOrganizzazione"))
+        # -----                 2.2.2.5.1 - Indirizzo
+        x_2_2_2_5_1_indirizzo = etree.SubElement(
+            x_2_2_2_5_stabile_organizzazione,
+            etree.QName("Indirizzo"))
+        x_2_2_2_5_1_indirizzo.text = \
+            encode_for_export(partner_invoice.cessionario_so_Indirizzo or '', 60)
+        # -----                 2.2.2.5.2 - Numero Civico
+        x_2_2_2_5_2_numero_civico = etree.SubElement(
+            x_2_2_2_5_stabile_organizzazione,
+            etree.QName("NumeroCivico"))
+        x_2_2_2_5_2_numero_civico.text = \
+            encode_for_export(partner_invoice.cessionario_so_NumeroCivico or '', 8,
+                              encoding='ascii')
+        # -----                 2.2.2.5.3 - CAP
+        x_2_2_2_5_3_cap = etree.SubElement(
+            x_2_2_2_5_stabile_organizzazione,
+            etree.QName("CAP"))
+        x_2_2_2_5_3_cap.text = \
+            encode_for_export(partner_invoice.cessionario_so_Cap or '', 5,
+                              encoding='ascii')
+        # -----                 2.2.2.5.4 - Comune
+        x_2_2_2_5_4_comune = etree.SubElement(
+            x_2_2_2_5_stabile_organizzazione,
+            etree.QName("Comune"))
+        x_2_2_2_5_4_comune.text = \
+            encode_for_export(partner_invoice.cessionario_so_Comune or '', 60)
+        # -----                 2.2.2.5.5 - Provincia
+        x_2_2_2_5_5_provincia = etree.SubElement(
+            x_2_2_2_5_stabile_organizzazione,
+            etree.QName("Provincia"))
+        x_2_2_2_5_5_provincia.text = \
+            partner_invoice.cessionario_so_Provincia or ''
+        # -----                 2.2.2.5.6 - Nazione
+        x_2_2_2_5_6_nazione = etree.SubElement(
+            x_2_2_2_5_stabile_organizzazione,
+            etree.QName("Nazione"))
+        x_2_2_2_5_6_nazione.text = \
+            partner_invoice.cessionario_so_Nazione or ''
+        # -----             2.2.2.6 - Rappresentante Fiscale
+        x_2_2_2_6_rappresentante_fiscale = etree.SubElement(
+            x_2_2_2_altri_identificativi,
+            etree.QName("RappresentanteFiscale"))
+        # -----                 2.2.2.6.1 - Id Fiscale IVA
+        x_2_2_2_6_1_id_fiscale_iva = etree.SubElement(
+            x_2_2_2_6_rappresentante_fiscale,
+            etree.QName("IdFiscaleIVA"))
+        x_2_2_2_6_rappresentante_fiscale.text = \
+            partner_invoice.cessionario_rf_IdFiscaleIVA_IdPaese or ''
+        # -----                     2.2.2.6.1.1 - Id Paese
+        x_2_2_2_6_1_1_id_paese = etree.SubElement(
+            x_2_2_2_6_1_id_fiscale_iva,
+            etree.QName("IdPaese"))
+        x_2_2_2_6_1_1_id_paese.text = \
+            partner_invoice.cessionario_rf_IdFiscaleIVA_IdPaese or ''
+        # -----                     2.2.2.6.1.2 - Id Codice
+        x_2_2_2_6_1_2_id_codice = etree.SubElement(
+            x_2_2_2_6_1_id_fiscale_iva,
+            etree.QName("IdCodice"))
+        x_2_2_2_6_1_2_id_codice.text = \
+            partner_invoice.cessionario_rf_IdFiscaleIVA_IdCodice or ''
+        # -----                 2.2.2.6.2 - Denominazione
+        x_2_2_2_6_2_denominazione = etree.SubElement(
+            x_2_2_2_6_rappresentante_fiscale,
+            etree.QName("Denominazione"))
+        x_2_2_2_6_2_denominazione.text = \
+            encode_for_export(
+                partner_invoice.cessionario_rf_Denominazione or '', 80)
+        # -----                 2.2.2.6.3 - Nome
+        x_2_2_2_6_3_nome = etree.SubElement(
+            x_2_2_2_6_rappresentante_fiscale,
+            etree.QName("Nome"))
+        x_2_2_2_6_3_nome.text = \
+            encode_for_export(partner_invoice.cessionario_rf_Nome or '', 60)
+        # -----                 2.2.2.6.4 - Cognome
+        x_2_2_2_6_4_cognome = etree.SubElement(
+            x_2_2_2_6_rappresentante_fiscale,
+            etree.QName("Cognome"))
+        x_2_2_2_6_4_cognome.text = \
+            encode_for_export(partner_invoice.cessionario_rf_Cognome or '', 60)
 
-        return x_2_dte
+        for invoice in invoices:
+            # -----         2.2.3 - Dati Fattura Body DTE
+            x_2_2_3_dati_fattura_body_dte = etree.SubElement(
+                x_2_2_cessionario_committente,
+                etree.QName("DatiFatturaBodyDTE"))
+            # -----             2.2.3.1 - Dati Generali
+            x_2_2_3_1_dati_generali = etree.SubElement(
+                x_2_2_3_dati_fattura_body_dte,
+                etree.QName("DatiGenerali"))
+            # -----                 2.2.3.1.1 - Tipo Documento
+            x_2_2_3_1_1_tipo_documento = etree.SubElement(
+                x_2_2_3_1_dati_generali,
+                etree.QName("TipoDocumento"))
+            x_2_2_3_1_1_tipo_documento.text = \
+                invoice.dati_fattura_TipoDocumento.code or ''
+            # -----                 2.2.3.1.2 - Data
+            x_2_2_3_1_2_data = etree.SubElement(
+                x_2_2_3_1_dati_generali,
+                etree.QName("Data"))
+            x_2_2_3_1_2_data.text = \
+                fields.Date.to_string(invoice.dati_fattura_Data) or ''
+            # -----                 2.2.3.1.3 - Numero
+            x_2_2_3_1_2_numero = etree.SubElement(
+                x_2_2_3_1_dati_generali,
+                etree.QName("Numero"))
+            x_2_2_3_1_2_numero.text = invoice.dati_fattura_Numero or ''
+
+            for tax in invoice.dati_fattura_iva_ids:
+                # -----             2.2.3.2 - Dati Riepilogo
+                x_2_2_3_2_riepilogo = etree.SubElement(
+                    x_2_2_3_dati_fattura_body_dte,
+                    etree.QName("DatiRiepilogo"))
+                # -----                 2.2.3.2.1 - Imponibile Importo
+                x_2_2_3_2_1_imponibile_importo = etree.SubElement(
+                    x_2_2_3_2_riepilogo,
+                    etree.QName("ImponibileImporto"))
+                x_2_2_3_2_1_imponibile_importo.text = \
+                    format_decimal(tax.ImponibileImporto)
+                # -----                 2.2.3.2.2 - Dati IVA
+                x_2_2_3_2_2_dati_iva = etree.SubElement(
+                    x_2_2_3_2_riepilogo,
+                    etree.QName("DatiIVA"))
+                # -----                     2.2.3.2.2.1 - Imposta
+                x_2_2_3_2_2_1_imposta = etree.SubElement(
+                    x_2_2_3_2_2_dati_iva,
+                    etree.QName("Imposta"))
+                x_2_2_3_2_2_1_imposta.text = format_decimal(tax.Imposta)
+                # -----                     2.2.3.2.2.2 - Aliquota
+                x_2_2_3_2_2_2_aliquota = etree.SubElement(
+                    x_2_2_3_2_2_dati_iva,
+                    etree.QName("Aliquota"))
+                x_2_2_3_2_2_2_aliquota.text = format_decimal(tax.Aliquota)
+                # -----                 2.2.3.2.3 - Natura
+                x_2_2_3_2_3_natura = etree.SubElement(
+                    x_2_2_3_2_riepilogo,
+                    etree.QName("Natura"))
+                x_2_2_3_2_3_natura.text = \
+                    tax.Natura_id.code if tax.Natura_id else ''
+                # -----                 2.2.3.2.4 - Detraibile
+                x_2_2_3_2_4_detraibile = etree.SubElement(
+                    x_2_2_3_2_riepilogo,
+                    etree.QName("Detraibile"))
+                x_2_2_3_2_4_detraibile.text = format_decimal(
+                    tax.Detraibile)
+                # -----                 2.2.3.2.5 - Deducibile
+                x_2_2_3_2_5_deducibile = etree.SubElement(
+                    x_2_2_3_2_riepilogo,
+                    etree.QName("Deducibile"))
+                x_2_2_3_2_5_deducibile.text = tax.Deducibile or ''
+                # -----                 2.2.3.2.6 - Esigibilita IVA
+                x_2_2_3_2_6_esagibilita_iva = etree.SubElement(
+                    x_2_2_3_2_riepilogo,
+                    etree.QName("EsigibilitaIVA"))
+                x_2_2_3_2_6_esagibilita_iva.text = tax.EsigibilitaIVA or ''
+        return x_2_2_cessionario_committente
 
     def _export_xml_get_dtr(self):
         # ----- 3 - DTR
         x_3_dtr = etree.Element(
             etree.QName("DTR"))
+        x_3_dtr.append(self._export_xml_get_dtr_cessionario())
+        for partner_invoice in self.fatture_ricevute_ids:
+            x_3_dtr.append(self._export_xml_get_dtr_partner(
+                partner_invoice, partner_invoice.fatture_ricevute_body_ids))
+        return x_3_dtr
+
+    def _export_xml_get_dtr_cessionario(self):
         # -----     2.1 - Cessionario Committente DTR
-        x_3_1_cessionario_committente = etree.SubElement(
-            x_3_dtr,
+        x_3_1_cessionario_committente = etree.Element(
             etree.QName("CessionarioCommittenteDTR"))
         # -----         2.1.1 - IdentificativiFiscali
         x_3_1_1_identificativi_fiscali = etree.SubElement(
@@ -1765,268 +1805,267 @@ class ComunicazioneDatiIva(models.Model):
             x_3_1_2_6_rappresentante_fiscale,
             etree.QName("Cognome"))
         x_3_1_2_6_4_cognome.text = self.cessionario_rf_Cognome or ''
-
-        for partner_invoice in self.fatture_ricevute_ids:
-            # -----     2.2 - Cessionario Committente DTE
-            x_3_2_cedente_prestatore = etree.SubElement(
-                x_3_dtr,
-                etree.QName("CedentePrestatoreDTR"))
-            # -----         2.2.1 - IdentificativiFiscali
-            x_3_2_1_identificativi_fiscali = etree.SubElement(
-                x_3_2_cedente_prestatore,
-                etree.QName("IdentificativiFiscali"))
-            if partner_invoice.cedente_IdFiscaleIVA_IdPaese and \
-                    partner_invoice.cedente_IdFiscaleIVA_IdCodice:
-                # -----             2.2.1.1 - Id Fiscale IVA
-                x_3_2_1_1_id_fiscale_iva = etree.SubElement(
-                    x_3_2_1_identificativi_fiscali,
-                    etree.QName("IdFiscaleIVA"))
-                # -----                 2.2.1.1.1 - Id Paese
-                x_3_2_1_1_1_id_paese = etree.SubElement(
-                    x_3_2_1_1_id_fiscale_iva,
-                    etree.QName("IdPaese"))
-                x_3_2_1_1_1_id_paese.text = \
-                    partner_invoice.cedente_IdFiscaleIVA_IdPaese or ''
-                # -----                 2.2.1.1.2 - Id Codice
-                x_3_2_1_1_2_id_codice = etree.SubElement(
-                    x_3_2_1_1_id_fiscale_iva,
-                    etree.QName("IdCodice"))
-                x_3_2_1_1_2_id_codice.text = \
-                    partner_invoice.cedente_IdFiscaleIVA_IdCodice or ''
-            # -----             2.2.1.2 - Codice Fiscale
-            x_3_2_1_2_codice_fiscale = etree.SubElement(
+        return x_3_1_cessionario_committente
+
+    def _export_xml_get_dtr_partner(self, partner_invoice, invoices):
+        # -----     2.2 - Cessionario Committente DTE
+        x_3_2_cedente_prestatore = etree.Element(
+            etree.QName("CedentePrestatoreDTR"))
+        # -----         2.2.1 - IdentificativiFiscali
+        x_3_2_1_identificativi_fiscali = etree.SubElement(
+            x_3_2_cedente_prestatore,
+            etree.QName("IdentificativiFiscali"))
+        if partner_invoice.cedente_IdFiscaleIVA_IdPaese and \
+                partner_invoice.cedente_IdFiscaleIVA_IdCodice:
+            # -----             2.2.1.1 - Id Fiscale IVA
+            x_3_2_1_1_id_fiscale_iva = etree.SubElement(
                 x_3_2_1_identificativi_fiscali,
-                etree.QName("CodiceFiscale"))
-            x_3_2_1_2_codice_fiscale.text = \
-                partner_invoice.cedente_CodiceFiscale or ''
-            # -----         2.2.2 - AltriDatiIdentificativi
-            x_3_2_2_altri_identificativi = etree.SubElement(
-                x_3_2_cedente_prestatore,
-                etree.QName("AltriDatiIdentificativi"))
-            # -----             2.2.2.1 - Denominazione
-            x_3_2_2_1_altri_identificativi_denominazione = etree.SubElement(
-                x_3_2_2_altri_identificativi,
-                etree.QName("Denominazione"))
-            x_3_2_2_1_altri_identificativi_denominazione.text = \
-                encode_for_export(partner_invoice.cedente_Denominazione or '', 80)
-            # -----             2.2.2.2 - Nome
-            x_3_2_2_2_nome = etree.SubElement(
-                x_3_2_2_altri_identificativi,
-                etree.QName("Nome"))
-            x_3_2_2_2_nome.text = \
-                encode_for_export(partner_invoice.cedente_Nome or '', 60)
-            # -----             2.2.2.3 - Cognome
-            x_3_2_2_3_cognome = etree.SubElement(
-                x_3_2_2_altri_identificativi,
-                etree.QName("Cognome"))
-            x_3_2_2_3_cognome.text = \
-                encode_for_export(partner_invoice.cedente_Cognome or '', 60)
-            # -----             2.2.2.4 - Sede
-            x_3_2_2_4_sede = etree.SubElement(
-                x_3_2_2_altri_identificativi,
-                etree.QName("Sede"))
-            # -----                 2.2.2.4.1 - Indirizzo
-            x_3_2_2_4_1_indirizzo = etree.SubElement(
-                x_3_2_2_4_sede,
-                etree.QName("Indirizzo"))
-            x_3_2_2_4_1_indirizzo.text = \
-                encode_for_export(partner_invoice.cedente_sede_Indirizzo or '', 60)
-            # -----                 2.2.2.4.2 - Numero Civico
-            x_3_2_2_4_2_numero_civico = etree.SubElement(
-                x_3_2_2_4_sede,
-                etree.QName("NumeroCivico"))
-            x_3_2_2_4_2_numero_civico.text = \
-                encode_for_export(partner_invoice.cedente_sede_NumeroCivico or '', 8,
-                                  encoding='ascii')
-            # -----                 2.2.2.4.3 - CAP
-            x_3_2_2_4_3_cap = etree.SubElement(
-                x_3_2_2_4_sede,
-                etree.QName("CAP"))
-            x_3_2_2_4_3_cap.text = \
-                encode_for_export(partner_invoice.cedente_sede_Cap or '', 5,
-                                  encoding='ascii')
-            # -----                 2.2.2.4.4 - Comune
-            x_3_2_2_4_4_comune = etree.SubElement(
-                x_3_2_2_4_sede,
-                etree.QName("Comune"))
-            x_3_2_2_4_4_comune.text = \
-                encode_for_export(partner_invoice.cedente_sede_Comune or '', 60)
-            # -----                 2.2.2.4.5 - Provincia
-            x_3_2_2_4_5_provincia = etree.SubElement(
-                x_3_2_2_4_sede,
-                etree.QName("Provincia"))
-            x_3_2_2_4_5_provincia.text = \
-                partner_invoice.cedente_sede_Provincia or ''
-            # -----                 2.2.2.4.6 - Nazione
-            x_3_2_2_4_6_nazione = etree.SubElement(
-                x_3_2_2_4_sede,
-                etree.QName("Nazione"))
-            x_3_2_2_4_6_nazione.text = \
-                partner_invoice.cedente_sede_Nazione or ''
-            # -----             2.2.2.5 - Stabile Organizzazione
-            x_3_2_2_5_stabile_organizzazione = etree.SubElement(
-                x_3_2_2_altri_identificativi,
-                etree.QName("StabileOrganizzazione"))
-            # -----                 2.2.2.5.1 - Indirizzo
-            x_3_2_2_5_1_indirizzo = etree.SubElement(
-                x_3_2_2_5_stabile_organizzazione,
-                etree.QName("Indirizzo"))
-            x_3_2_2_5_1_indirizzo.text = \
-                encode_for_export(partner_invoice.cedente_so_Indirizzo or '', 60)
-            # -----                 2.2.2.5.2 - Numero Civico
-            x_3_2_2_5_2_numero_civico = etree.SubElement(
-                x_3_2_2_5_stabile_organizzazione,
-                etree.QName("NumeroCivico"))
-            x_3_2_2_5_2_numero_civico.text = \
-                encode_for_export(partner_invoice.cedente_so_NumeroCivico or '', 8,
-                                  encoding='ascii')
-            # -----                 2.2.2.5.3 - CAP
-            x_3_2_2_5_3_cap = etree.SubElement(
-                x_3_2_2_5_stabile_organizzazione,
-                etree.QName("CAP"))
-            x_3_2_2_5_3_cap.text = \
-                encode_for_export(partner_invoice.cedente_so_Cap or '', 5,
-                                  encoding='ascii')
-            # -----                 2.2.2.5.4 - Comune
-            x_3_2_2_5_4_comune = etree.SubElement(
-                x_3_2_2_5_stabile_organizzazione,
-                etree.QName("Comune"))
-            x_3_2_2_5_4_comune.text = \
-                encode_for_export(partner_invoice.cedente_so_Comune or '', 60)
-            # -----                 2.2.2.5.5 - Provincia
-            x_3_2_2_5_5_provincia = etree.SubElement(
-                x_3_2_2_5_stabile_organizzazione,
-                etree.QName("Provincia"))
-            x_3_2_2_5_5_provincia.text = \
-                partner_invoice.cedente_so_Provincia or ''
-            # -----                 2.2.2.5.6 - Nazione
-            x_3_2_2_5_6_nazione = etree.SubElement(
-                x_3_2_2_5_stabile_organizzazione,
-                etree.QName("Nazione"))
-            x_3_2_2_5_6_nazione.text = \
-                partner_invoice.cedente_so_Nazione or ''
-            # -----             2.2.2.6 - Rappresentante Fiscale
-            x_3_2_2_6_rappresentante_fiscale = etree.SubElement(
-                x_3_2_2_altri_identificativi,
-                etree.QName("RappresentanteFiscale"))
-            # -----                 2.2.2.6.1 - Id Fiscale IVA
-            x_3_2_2_6_1_id_fiscale_iva = etree.SubElement(
-                x_3_2_2_6_rappresentante_fiscale,
                 etree.QName("IdFiscaleIVA"))
-            x_3_2_2_6_rappresentante_fiscale.text = \
-                partner_invoice.cedente_rf_IdFiscaleIVA_IdPaese or ''
-            # -----                     2.2.2.6.1.1 - Id Paese
-            x_3_2_2_6_1_1_id_paese = etree.SubElement(
-                x_3_2_2_6_1_id_fiscale_iva,
+            # -----                 2.2.1.1.1 - Id Paese
+            x_3_2_1_1_1_id_paese = etree.SubElement(
+                x_3_2_1_1_id_fiscale_iva,
                 etree.QName("IdPaese"))
-            x_3_2_2_6_1_1_id_paese.text = \
-                partner_invoice.cedente_rf_IdFiscaleIVA_IdPaese or ''
-            # -----                     2.2.2.6.1.2 - Id Codice
-            x_3_2_2_6_1_2_id_codice = etree.SubElement(
-                x_3_2_2_6_1_id_fiscale_iva,
+            x_3_2_1_1_1_id_paese.text = \
+                partner_invoice.cedente_IdFiscaleIVA_IdPaese or ''
+            # -----                 2.2.1.1.2 - Id Codice
+            x_3_2_1_1_2_id_codice = etree.SubElement(
+                x_3_2_1_1_id_fiscale_iva,
                 etree.QName("IdCodice"))
-            x_3_2_2_6_1_2_id_codice.text = \
-                partner_invoice.cedente_rf_IdFiscaleIVA_IdCodice or ''
-            # -----                 2.2.2.6.2 - Denominazione
-            x_3_2_2_6_2_denominazione = etree.SubElement(
-                x_3_2_2_6_rappresentante_fiscale,
-                etree.QName("Denominazione"))
-            x_3_2_2_6_2_denominazione.text = \
-                encode_for_export(partner_invoice.cedente_rf_Denominazione or '', 80)
-            # -----                 2.2.2.6.3 - Nome
-            x_3_2_2_6_3_nome = etree.SubElement(
-                x_3_2_2_6_rappresentante_fiscale,
-                etree.QName("Nome"))
-            x_3_2_2_6_3_nome.text = \
-                encode_for_export(partner_invoice.cedente_rf_Nome or '', 60)
-            # -----                 2.2.2.6.4 - Cognome
-            x_3_2_2_6_4_cognome = etree.SubElement(
-                x_3_2_2_6_rappresentante_fiscale,
-                etree.QName("Cognome"))
-            x_3_2_2_6_4_cognome.text = \
-                encode_for_export(partner_invoice.cedente_rf_Cognome or '', 60)
-
-            for invoice in partner_invoice.fatture_ricevute_body_ids:
-                # -----         2.2.3 - Dati Fattura Body DTE
-                x_3_2_3_dati_fattura_body_dte = etree.SubElement(
-                    x_3_2_cedente_prestatore,
-                    etree.QName("DatiFatturaBodyDTR"))
-                # -----             2.2.3.1 - Dati Generali
-                x_3_2_3_1_dati_generali = etree.SubElement(
-                    x_3_2_3_dati_fattura_body_dte,
-                    etree.QName("DatiGenerali"))
-                # -----                 2.2.3.1.1 - Tipo Documento
-                x_3_2_3_1_1_tipo_documento = etree.SubElement(
-                    x_3_2_3_1_dati_generali,
-                    etree.QName("TipoDocumento"))
-                x_3_2_3_1_1_tipo_documento.text = \
-                    invoice.dati_fattura_TipoDocumento.code or ''
-                # -----                 2.2.3.1.2 - Data
-                x_3_2_3_1_2_data = etree.SubElement(
-                    x_3_2_3_1_dati_generali,
-                    etree.QName("Data"))
-                x_3_2_3_1_2_data.text = fields.Date.to_string(
-                    invoice.dati_fattura_Data) or ''
-                # -----                 2.2.3.1.3 - Numero
-                x_3_2_3_1_3_numero = etree.SubElement(
-                    x_3_2_3_1_dati_generali,
-                    etree.QName("Numero"))
-                x_3_2_3_1_3_numero.text = invoice.dati_fattura_Numero or ''
-                # -----                 2.2.3.1.4 - Data Registrazione
-                x_3_2_3_1_4_data_registrazione = etree.SubElement(
-                    x_3_2_3_1_dati_generali,
-                    etree.QName("DataRegistrazione"))
-                x_3_2_3_1_4_data_registrazione.text = fields.Date.to_string(
-                    invoice.dati_fattura_DataRegistrazione) or ''
-                for tax in invoice.dati_fattura_iva_ids:
-                    # -----             2.2.3.2 - Dati Riepilogo
-                    x_3_2_3_2_riepilogo = etree.SubElement(
-                        x_3_2_3_dati_fattura_body_dte,
-                        etree.QName("DatiRiepilogo"))
-                    # -----                 2.2.3.2.1 - Imponibile Importo
-                    x_3_2_3_2_1_imponibile_importo = etree.SubElement(
-                        x_3_2_3_2_riepilogo,
-                        etree.QName("ImponibileImporto"))
-                    x_3_2_3_2_1_imponibile_importo.text = \
-                        format_decimal(tax.ImponibileImporto)
-                    # -----                 2.2.3.2.2 - Dati IVA
-                    x_3_2_3_2_2_dati_iva = etree.SubElement(
-                        x_3_2_3_2_riepilogo,
-                        etree.QName("DatiIVA"))
-                    # -----                     2.2.3.2.2.1 - Imposta
-                    x_3_2_3_2_2_1_imposta = etree.SubElement(
-                        x_3_2_3_2_2_dati_iva,
-                        etree.QName("Imposta"))
-                    x_3_2_3_2_2_1_imposta.text = format_decimal(tax.Imposta)
-                    # -----                     2.2.3.2.2.2 - Aliquota
-                    x_3_2_3_2_2_2_aliquota = etree.SubElement(
-                        x_3_2_3_2_2_dati_iva,
-                        etree.QName("Aliquota"))
-                    x_3_2_3_2_2_2_aliquota.text = format_decimal(tax.Aliquota)
-                    # -----                 2.2.3.2.3 - Natura
-                    x_3_2_3_2_3_natura = etree.SubElement(
-                        x_3_2_3_2_riepilogo,
-                        etree.QName("Natura"))
-                    x_3_2_3_2_3_natura.text = \
-                        tax.Natura_id.code if tax.Natura_id else ''
-                    # -----                 2.2.3.2.4 - Detraibile
-                    x_3_2_3_2_4_detraibile = etree.SubElement(
-                        x_3_2_3_2_riepilogo,
-                        etree.QName("Detraibile"))
-                    x_3_2_3_2_4_detraibile.text = format_decimal(
-                        tax.Detraibile)
-                    # -----                 2.2.3.2.5 - Deducibile
-                    x_3_2_3_2_5_deducibile = etree.SubElement(
-                        x_3_2_3_2_riepilogo,
-                        etree.QName("Deducibile"))
-                    x_3_2_3_2_5_deducibile.text = tax.Deducibile or ''
-                    # -----                 2.2.3.2.6 - Esigibilita IVA
-                    x_3_2_3_2_6_esagibilita_iva = etree.SubElement(
-                        x_3_2_3_2_riepilogo,
-                        etree.QName("EsigibilitaIVA"))
-                    x_3_2_3_2_6_esagibilita_iva.text = tax.EsigibilitaIVA or ''
+            x_3_2_1_1_2_id_codice.text = \
+                partner_invoice.cedente_IdFiscaleIVA_IdCodice or ''
+        # -----             2.2.1.2 - Codice Fiscale
+        x_3_2_1_2_codice_fiscale = etree.SubElement(
+            x_3_2_1_identificativi_fiscali,
+            etree.QName("CodiceFiscale"))
+        x_3_2_1_2_codice_fiscale.text = \
+            partner_invoice.cedente_CodiceFiscale or ''
+        # -----         2.2.2 - AltriDatiIdentificativi
+        x_3_2_2_altri_identificativi = etree.SubElement(
+            x_3_2_cedente_prestatore,
+            etree.QName("AltriDatiIdentificativi"))
+        # -----             2.2.2.1 - Denominazione
+        x_3_2_2_1_altri_identificativi_denominazione = etree.SubElement(
+            x_3_2_2_altri_identificativi,
+            etree.QName("Denominazione"))
+        x_3_2_2_1_altri_identificativi_denominazione.text = \
+            encode_for_export(partner_invoice.cedente_Denominazione or '', 80)
+        # -----             2.2.2.2 - Nome
+        x_3_2_2_2_nome = etree.SubElement(
+            x_3_2_2_altri_identificativi,
+            etree.QName("Nome"))
+        x_3_2_2_2_nome.text = \
+            encode_for_export(partner_invoice.cedente_Nome or '', 60)
+        # -----             2.2.2.3 - Cognome
+        x_3_2_2_3_cognome = etree.SubElement(
+            x_3_2_2_altri_identificativi,
+            etree.QName("Cognome"))
+        x_3_2_2_3_cognome.text = \
+            encode_for_export(partner_invoice.cedente_Cognome or '', 60)
+        # -----             2.2.2.4 - Sede
+        x_3_2_2_4_sede = etree.SubElement(
+            x_3_2_2_altri_identificativi,
+            etree.QName("Sede"))
+        # -----                 2.2.2.4.1 - Indirizzo
+        x_3_2_2_4_1_indirizzo = etree.SubElement(
+            x_3_2_2_4_sede,
+            etree.QName("Indirizzo"))
+        x_3_2_2_4_1_indirizzo.text = \
+            encode_for_export(partner_invoice.cedente_sede_Indirizzo or '', 60)
+        # -----                 2.2.2.4.2 - Numero Civico
+        x_3_2_2_4_2_numero_civico = etree.SubElement(
+            x_3_2_2_4_sede,
+            etree.QName("NumeroCivico"))
+        x_3_2_2_4_2_numero_civico.text = \
+            encode_for_export(partner_invoice.cedente_sede_NumeroCivico or '', 8,
+                              encoding='ascii')
+        # -----                 2.2.2.4.3 - CAP
+        x_3_2_2_4_3_cap = etree.SubElement(
+            x_3_2_2_4_sede,
+            etree.QName("CAP"))
+        x_3_2_2_4_3_cap.text = \
+            encode_for_export(partner_invoice.cedente_sede_Cap or '', 5,
+                              encoding='ascii')
+        # -----                 2.2.2.4.4 - Comune
+        x_3_2_2_4_4_comune = etree.SubElement(
+            x_3_2_2_4_sede,
+            etree.QName("Comune"))
+        x_3_2_2_4_4_comune.text = \
+            encode_for_export(partner_invoice.cedente_sede_Comune or '', 60)
+        # -----                 2.2.2.4.5 - Provincia
+        x_3_2_2_4_5_provincia = etree.SubElement(
+            x_3_2_2_4_sede,
+            etree.QName("Provincia"))
+        x_3_2_2_4_5_provincia.text = \
+            partner_invoice.cedente_sede_Provincia or ''
+        # -----                 2.2.2.4.6 - Nazione
+        x_3_2_2_4_6_nazione = etree.SubElement(
+            x_3_2_2_4_sede,
+            etree.QName("Nazione"))
+        x_3_2_2_4_6_nazione.text = \
+            partner_invoice.cedente_sede_Nazione or ''
+        # -----             2.2.2.5 - Stabile Organizzazione
+        x_3_2_2_5_stabile_organizzazione = etree.SubElement(
+            x_3_2_2_altri_identificativi,
+            etree.QName("StabileOrganizzazione"))
+        # -----                 2.2.2.5.1 - Indirizzo
+        x_3_2_2_5_1_indirizzo = etree.SubElement(
+            x_3_2_2_5_stabile_organizzazione,
+            etree.QName("Indirizzo"))
+        x_3_2_2_5_1_indirizzo.text = \
+            encode_for_export(partner_invoice.cedente_so_Indirizzo or '', 60)
+        # -----                 2.2.2.5.2 - Numero Civico
+        x_3_2_2_5_2_numero_civico = etree.SubElement(
+            x_3_2_2_5_stabile_organizzazione,
+            etree.QName("NumeroCivico"))
+        x_3_2_2_5_2_numero_civico.text = \
+            encode_for_export(partner_invoice.cedente_so_NumeroCivico or '', 8,
+                              encoding='ascii')
+        # -----                 2.2.2.5.3 - CAP
+        x_3_2_2_5_3_cap = etree.SubElement(
+            x_3_2_2_5_stabile_organizzazione,
+            etree.QName("CAP"))
+        x_3_2_2_5_3_cap.text = \
+            encode_for_export(partner_invoice.cedente_so_Cap or '', 5,
+                              encoding='ascii')
+        # -----                 2.2.2.5.4 - Comune
+        x_3_2_2_5_4_comune = etree.SubElement(
+            x_3_2_2_5_stabile_organizzazione,
+            etree.QName("Comune"))
+        x_3_2_2_5_4_comune.text = \
+            encode_for_export(partner_invoice.cedente_so_Comune or '', 60)
+        # -----                 2.2.2.5.5 - Provincia
+        x_3_2_2_5_5_provincia = etree.SubElement(
+            x_3_2_2_5_stabile_organizzazione,
+            etree.QName("Provincia"))
+        x_3_2_2_5_5_provincia.text = \
+            partner_invoice.cedente_so_Provincia or ''
+        # -----                 2.2.2.5.6 - Nazione
+        x_3_2_2_5_6_nazione = etree.SubElement(
+            x_3_2_2_5_stabile_organizzazione,
+            etree.QName("Nazione"))
+        x_3_2_2_5_6_nazione.text = \
+            partner_invoice.cedente_so_Nazione or ''
+        # -----             2.2.2.6 - Rappresentante Fiscale
+        x_3_2_2_6_rappresentante_fiscale = etree.SubElement(
+            x_3_2_2_altri_identificativi,
+            etree.QName("RappresentanteFiscale"))
+        # -----                 2.2.2.6.1 - Id Fiscale IVA
+        x_3_2_2_6_1_id_fiscale_iva = etree.SubElement(
+            x_3_2_2_6_rappresentante_fiscale,
+            etree.QName("IdFiscaleIVA"))
+        x_3_2_2_6_rappresentante_fiscale.text = \
+            partner_invoice.cedente_rf_IdFiscaleIVA_IdPaese or ''
+        # -----                     2.2.2.6.1.1 - Id Paese
+        x_3_2_2_6_1_1_id_paese = etree.SubElement(
+            x_3_2_2_6_1_id_fiscale_iva,
+            etree.QName("IdPaese"))
+        x_3_2_2_6_1_1_id_paese.text = \
+            partner_invoice.cedente_rf_IdFiscaleIVA_IdPaese or ''
+        # -----                     2.2.2.6.1.2 - Id Codice
+        x_3_2_2_6_1_2_id_codice = etree.SubElement(
+            x_3_2_2_6_1_id_fiscale_iva,
+            etree.QName("IdCodice"))
+        x_3_2_2_6_1_2_id_codice.text = \
+            partner_invoice.cedente_rf_IdFiscaleIVA_IdCodice or ''
+        # -----                 2.2.2.6.2 - Denominazione
+        x_3_2_2_6_2_denominazione = etree.SubElement(
+            x_3_2_2_6_rappresentante_fiscale,
+            etree.QName("Denominazione"))
+        x_3_2_2_6_2_denominazione.text = \
+            encode_for_export(partner_invoice.cedente_rf_Denominazione or '', 80)
+        # -----                 2.2.2.6.3 - Nome
+        x_3_2_2_6_3_nome = etree.SubElement(
+            x_3_2_2_6_rappresentante_fiscale,
+            etree.QName("Nome"))
+        x_3_2_2_6_3_nome.text = \
+            encode_for_export(partner_invoice.cedente_rf_Nome or '', 60)
+        # -----                 2.2.2.6.4 - Cognome
+        x_3_2_2_6_4_cognome = etree.SubElement(
+            x_3_2_2_6_rappresentante_fiscale,
+            etree.QName("Cognome"))
+        x_3_2_2_6_4_cognome.text = \
+            encode_for_export(partner_invoice.cedente_rf_Cognome or '', 60)
 
-        return x_3_dtr
+        for invoice in invoices:
+            # -----         2.2.3 - Dati Fattura Body DTE
+            x_3_2_3_dati_fattura_body_dte = etree.SubElement(
+                x_3_2_cedente_prestatore,
+                etree.QName("DatiFatturaBodyDTR"))
+            # -----             2.2.3.1 - Dati Generali
+            x_3_2_3_1_dati_generali = etree.SubElement(
+                x_3_2_3_dati_fattura_body_dte,
+                etree.QName("DatiGenerali"))
+            # -----                 2.2.3.1.1 - Tipo Documento
+            x_3_2_3_1_1_tipo_documento = etree.SubElement(
+                x_3_2_3_1_dati_generali,
+                etree.QName("TipoDocumento"))
+            x_3_2_3_1_1_tipo_documento.text = \
+                invoice.dati_fattura_TipoDocumento.code or ''
+            # -----                 2.2.3.1.2 - Data
+            x_3_2_3_1_2_data = etree.SubElement(
+                x_3_2_3_1_dati_generali,
+                etree.QName("Data"))
+            x_3_2_3_1_2_data.text = fields.Date.to_string(
+                invoice.dati_fattura_Data) or ''
+            # -----                 2.2.3.1.3 - Numero
+            x_3_2_3_1_3_numero = etree.SubElement(
+                x_3_2_3_1_dati_generali,
+                etree.QName("Numero"))
+            x_3_2_3_1_3_numero.text = invoice.dati_fattura_Numero or ''
+            # -----                 2.2.3.1.4 - Data Registrazione
+            x_3_2_3_1_4_data_registrazione = etree.SubElement(
+                x_3_2_3_1_dati_generali,
+                etree.QName("DataRegistrazione"))
+            x_3_2_3_1_4_data_registrazione.text = fields.Date.to_string(
+                invoice.dati_fattura_DataRegistrazione) or ''
+            for tax in invoice.dati_fattura_iva_ids:
+                # -----             2.2.3.2 - Dati Riepilogo
+                x_3_2_3_2_riepilogo = etree.SubElement(
+                    x_3_2_3_dati_fattura_body_dte,
+                    etree.QName("DatiRiepilogo"))
+                # -----                 2.2.3.2.1 - Imponibile Importo
+                x_3_2_3_2_1_imponibile_importo = etree.SubElement(
+                    x_3_2_3_2_riepilogo,
+                    etree.QName("ImponibileImporto"))
+                x_3_2_3_2_1_imponibile_importo.text = \
+                    format_decimal(tax.ImponibileImporto)
+                # -----                 2.2.3.2.2 - Dati IVA
+                x_3_2_3_2_2_dati_iva = etree.SubElement(
+                    x_3_2_3_2_riepilogo,
+                    etree.QName("DatiIVA"))
+                # -----                     2.2.3.2.2.1 - Imposta
+                x_3_2_3_2_2_1_imposta = etree.SubElement(
+                    x_3_2_3_2_2_dati_iva,
+                    etree.QName("Imposta"))
+                x_3_2_3_2_2_1_imposta.text = format_decimal(tax.Imposta)
+                # -----                     2.2.3.2.2.2 - Aliquota
+                x_3_2_3_2_2_2_aliquota = etree.SubElement(
+                    x_3_2_3_2_2_dati_iva,
+                    etree.QName("Aliquota"))
+                x_3_2_3_2_2_2_aliquota.text = format_decimal(tax.Aliquota)
+                # -----                 2.2.3.2.3 - Natura
+                x_3_2_3_2_3_natura = etree.SubElement(
+                    x_3_2_3_2_riepilogo,
+                    etree.QName("Natura"))
+                x_3_2_3_2_3_natura.text = \
+                    tax.Natura_id.code if tax.Natura_id else ''
+                # -----                 2.2.3.2.4 - Detraibile
+                x_3_2_3_2_4_detraibile = etree.SubElement(
+                    x_3_2_3_2_riepilogo,
+                    etree.QName("Detraibile"))
+                x_3_2_3_2_4_detraibile.text = format_decimal(
+                    tax.Detraibile)
+                # -----                 2.2.3.2.5 - Deducibile
+                x_3_2_3_2_5_deducibile = etree.SubElement(
+                    x_3_2_3_2_riepilogo,
+                    etree.QName("Deducibile"))
+                x_3_2_3_2_5_deducibile.text = tax.Deducibile or ''
+                # -----                 2.2.3.2.6 - Esigibilita IVA
+                x_3_2_3_2_6_esagibilita_iva = etree.SubElement(
+                    x_3_2_3_2_riepilogo,
+                    etree.QName("EsigibilitaIVA"))
+                x_3_2_3_2_6_esagibilita_iva.text = tax.EsigibilitaIVA or ''
+        return x_3_2_cedente_prestatore
 
     def _export_xml_get_ann(self):
         # ----- 4 - ANN
@@ -2087,6 +2126,89 @@ class ComunicazioneDatiIva(models.Model):
             x_0_dati_fattura, encoding='latin1', method='xml', pretty_print=True)
         return xml_string
 
+    def _export_xml_write_file(self, xml_file):
+        """
+        Write the XML file of the communication one partner block at a time,
+        so that only the block being written is kept in memory.
+        """
+        if self.dati_trasmissione == 'DTE':
+            section = "DTE"
+            get_company_block = self._export_xml_get_dte_cedente
+            get_partner_block = self._export_xml_get_dte_partner
+            partner_invoices = self.fatture_emesse_ids
+            body_field = 'fatture_emesse_body_ids'
+        else:
+            section = "DTR"
+            get_company_block = self._export_xml_get_dtr_cessionario
+            get_partner_block = self._export_xml_get_dtr_partner
+            partner_invoices = self.fatture_ricevute_ids
+            body_field = 'fatture_ricevute_body_ids'
+        # ----- 0 - Dati Fattura
+        x_0_dati_fattura = self._export_xml_get_dati_fattura()
+        with etree.xmlfile(xml_file, encoding='latin1') as xf:
+            xf.write_declaration()
+            with xf.element(
+                    x_0_dati_fattura.tag, x_0_dati_fattura.attrib,
+                    nsmap=x_0_dati_fattura.nsmap):
+                # ----- 1 - Dati Fattura header
+                write_xml_block(
+                    xf, self._export_xml_get_dati_fattura_header())
+                # ----- 2 - DTE / 3 - DTR
+                with xf.element(etree.QName(section)):
+                    write_xml_block(xf, get_company_block())
+                    for partner_invoice in partner_invoices:
+                        write_xml_block(xf, get_partner_block(
+                            partner_invoice, partner_invoice[body_field]))
+
+    @api.multi
+    def _get_export_xml_file(self):
+        """
+        Validate the communication and export it in an XML file on disk.
+
+        :return: (file name, file object) of the exported file.
+        """
+        self.ensure_one()
+        self._validate()
+        xml_file = tempfile.TemporaryFile()
+        try:
+            if self.dati_trasmissione in ('DTE', 'DTR'):
+                self._export_xml_write_file(xml_file)
+            else:
+                xml_file.write(self.get_export_xml())
+        except Exception:
+            xml_file.close()
+            raise
+        xml_file.seek(0)
+        return self.get_export_xml_filename(), xml_file
+
+    @api.multi
+    def get_export_xml_files(self):
+        """
+        Export the communication in XML files on disk.
+
+        When the limits of the Revenue Agency are exceeded
+        (see `check_1k_limit`), the communication is split
+        with `split_communications`: every resulting communication
+        has its own identifier and is exported in its own file.
+
+        :return: list of (file name, file object) of the exported files,
+            callers are responsible for closing the file objects.
+        """
+        self.ensure_one()
+        communications = self
+        if self.dati_trasmissione in ('DTE', 'DTR') \
+                and not self.check_1k_limit():
+            communications = self.split_communications()
+        xml_files = []
+        try:
+            for communication in communications:
+                xml_files.append(communication._get_export_xml_file())
+        except Exception:
+            for dummy, xml_file in xml_files:
+                xml_file.close()
+            raise
+        return xml_files
+
 
 class ComunicazioneDatiIvaFattureEmesse(models.Model):
     _name = 'comunicazione.dati.iva.fatture.emesse'
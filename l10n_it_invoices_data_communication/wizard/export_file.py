@@ -1,5 +1,9 @@
 
 import base64
+import os
+import tempfile
+import zipfile
+
 from odoo import api, fields, models, exceptions, _
 
 
@@ -11,6 +15,15 @@ class ComunicazioneDatiIvaExportFile(models.TransientModel):
     filename = fields.Char()
     name = fields.Char('File Name', readonly=True, default='dati_iva.xml')
 
+    @api.model
+    def _get_zip_content(self, xml_files):
+        with tempfile.TemporaryFile() as zip_file:
+            with zipfile.ZipFile(zip_file, 'w', zipfile.ZIP_DEFLATED) as zf:
+                for filename, xml_file in xml_files:
+                    zf.writestr(filename, xml_file.read())
+            zip_file.seek(0)
+            return zip_file.read()
+
     @api.multi
     def export(self):
 
@@ -27,8 +40,19 @@ class ComunicazioneDatiIvaExportFile(models.TransientModel):
         for wizard in self:
             for comunicazione in self.env['comunicazione.dati.iva'].\
                     browse(comunicazione_ids):
-                out = base64.encodebytes(comunicazione.get_export_xml())
-                filename = comunicazione.get_export_xml_filename()
+                xml_files = comunicazione.get_export_xml_files()
+                try:
+                    if len(xml_files) == 1:
+                        filename, xml_file = xml_files[0]
+                        out = base64.encodebytes(xml_file.read())
+                    else:
+                        filename = '%s.zip' % os.path.splitext(
+                            comunicazione.get_export_xml_filename())[0]
+                        out = base64.encodebytes(
+                            self._get_zip_content(xml_files))
+                finally:
+                    for dummy, xml_file in xml_files:
+                        xml_file.close()
                 wizard.sudo().file_export = out
                 wizard.filename = filename
             model_data_obj = self.env['ir.model.data']
@@ -37,6 +37,7 @@
         "views/partner_view.xml",
         "views/wizard_riba_issue.xml",
         "views/wizard_riba_file_export.xml",
+        "views/wizard_riba_outcome_import.xml",
         "views/account_config_view.xml",
         "views/distinta_report.xml",
         "views/riba_detail_view.xml",
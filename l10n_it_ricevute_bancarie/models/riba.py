@@ -125,18 +125,16 @@ class RibaList(models.Model):
                 line.state = 'cancel'
                 if line.acceptance_move_id:
                     line.acceptance_move_id.unlink()
-                if line.unsolved_move_id:
-                    line.unsolved_move_id.unlink()
+            # Past due moves can be shared by the lines of the slip
+            distinta.mapped('line_ids.unsolved_move_id').unlink()
             if distinta.accreditation_move_id:
                 distinta.accreditation_move_id.unlink()
             distinta.state = 'cancel'
 
     @api.multi
     def settle_all_line(self):
-        for riba_list in self:
-            for line in riba_list.line_ids:
-                if line.state == 'accredited':
-                    line.riba_line_settlement()
+        self.mapped('line_ids').filtered(
+            lambda l: l.state == 'accredited').riba_line_settlement()
 
     @api.onchange('date_accepted', 'date_accreditation')
     def _onchange_date(self):
@@ -394,66 +392,171 @@ class RibaListLine(models.Model):
                 line.distinta_id.date_accepted = \
                     fields.Date.context_today(self)
 
+    def _get_acceptance_account(self):
+        self.ensure_one()
+        return self.acceptance_account_id or \
+            self.distinta_id.config_id.acceptance_account_id
+
+    def _get_acceptance_move_lines(self):
+        """
+        Lines of the acceptance moves in the acceptance account,
+        for each C/O line.
+
+        :return: dictionary {C/O line: move lines}
+        """
+        move_line_model = self.env['account.move.line']
+        move_lines = move_line_model.search([
+            ('move_id', 'in', self.mapped('acceptance_move_id').ids),
+        ])
+        lines_by_account = {}
+        for move_line in move_lines:
+            key = (move_line.move_id, move_line.account_id)
+            lines_by_account[key] = lines_by_account.get(
+                key, move_line_model) | move_line
+        return {
+            riba_line: lines_by_account.get(
+                (riba_line.acceptance_move_id,
+                 riba_line._get_acceptance_account()),
+                move_line_model)
+            for riba_line in self
+        }
+
     @api.multi
     def riba_line_settlement(self):
-        for riba_line in self:
-            if not riba_line.distinta_id.config_id.settlement_journal_id:
+        """Settle the C/O lines, with one move for each slip"""
+        move_model = self.env['account.move']
+        move_line_model = self.env['account.move.line'].with_context({
+            'check_move_validity': False})
+        acceptance_lines = self._get_acceptance_move_lines()
+        for distinta in self.mapped('distinta_id'):
+            if not distinta.config_id.settlement_journal_id:
                 raise UserError(_('Please define a Settlement Journal.'))
+            riba_lines = self.filtered(
+                lambda l: l.distinta_id == distinta)
 
             # trovare le move line delle scritture da chiudere
-            move_model = self.env['account.move']
-            move_line_model = self.env['account.move.line']
-
-            settlement_move_line = move_line_model.search([
-                ('account_id', '=', riba_line.acceptance_account_id.id),
-                ('move_id', '=', riba_line.acceptance_move_id.id),
-                ('debit', '!=', 0)
-                ])
-
-            settlement_move_amount = settlement_move_line.debit
-
-            move_ref = "Settlement C/O {} - {}".format(
-                riba_line.distinta_id.name,
-                riba_line.partner_id.name,
-                )
+            settlement_move_lines = [
+                acceptance_lines[riba_line].filtered(lambda l: l.debit)
+                for riba_line in riba_lines]
+
+            move_ref = "Settlement C/O {}".format(distinta.name)
+            if len(riba_lines) == 1:
+                move_ref = "{} - {}".format(
+                    move_ref, riba_lines.partner_id.name)
             settlement_move = move_model.create({
-                'journal_id':
-                    riba_line.distinta_id.config_id.settlement_journal_id.id,
+                'journal_id': distinta.config_id.settlement_journal_id.id,
                 'date': date.today().strftime('%Y-%m-%d'),
                 'ref': move_ref,
                 })
 
-            move_line_credit = move_line_model.with_context({
-                'check_move_validity': False}).create(
-                {
-                    'name': move_ref,
+            move_lines_credit = move_line_model.create([{
+                'name': move_ref,
+                'partner_id': riba_line.partner_id.id,
+                'account_id': riba_line._get_acceptance_account().id,
+                'credit': settlement_move_line.debit,
+                'debit': 0.0,
+                'move_id': settlement_move.id,
+            } for riba_line, settlement_move_line in zip(
+                riba_lines, settlement_move_lines)])
+
+            accr_acc = distinta.config_id.accreditation_account_id
+            move_line_model.create({
+                'name': move_ref,
+                'account_id': accr_acc.id,
+                'credit': 0.0,
+                'debit': sum(move_lines_credit.mapped('credit')),
+                'move_id': settlement_move.id,
+            })
+
+            for move_line_credit, settlement_move_line in zip(
+                    move_lines_credit, settlement_move_lines):
+                (move_line_credit | settlement_move_line).reconcile()
+            settlement_move.post()
+
+    @api.multi
+    def riba_line_unsolved(self):
+        """
+        Register the C/O lines as past due, with one move for each slip,
+        using the accounts of the C/O configuration and no bank fees.
+        """
+        move_model = self.env['account.move']
+        move_line_model = self.env['account.move.line'].with_context({
+            'check_move_validity': False})
+        effects_lines = self._get_acceptance_move_lines()
+        for distinta in self.mapped('distinta_id'):
+            config = distinta.config_id
+            if (
+                not config.unsolved_journal_id or
+                not config.accreditation_account_id or
+                not config.overdue_effects_account_id or
+                not config.bank_account_id
+            ):
+                raise UserError(_(
+                    'Every account is mandatory in C/O configuration %s.')
+                    % config.name)
+            riba_lines = self.filtered(
+                lambda l: l.distinta_id == distinta)
+            move_ref = _('Past Due C/O %s') % distinta.name
+            if len(riba_lines) == 1:
+                move_ref = _('Past Due C/O %s - Line %s') % (
+                    distinta.name, riba_lines.sequence)
+            move = move_model.create({
+                'ref': move_ref,
+                'journal_id': config.unsolved_journal_id.id,
+            })
+            bills_vals = []
+            overdue_vals = []
+            for riba_line in riba_lines:
+                bills_vals.append({
+                    'name': _('Bills'),
+                    'account_id': riba_line._get_acceptance_account().id,
                     'partner_id': riba_line.partner_id.id,
-                    'account_id':
-                        riba_line.acceptance_account_id.id,
-                    'credit': settlement_move_amount,
+                    'credit': riba_line.amount,
                     'debit': 0.0,
-                    'move_id': settlement_move.id,
-                }
-            )
-
-            accr_acc = riba_line.distinta_id.config_id.accreditation_account_id
-            move_line_model.with_context({
-                'check_move_validity': False}).create(
-                {
-                    'name': move_ref,
-                    'account_id': accr_acc.id,
+                    'move_id': move.id,
+                })
+                overdue_vals.append({
+                    'name': _('Past Due Bills'),
+                    'account_id': config.overdue_effects_account_id.id,
+                    'debit': riba_line.amount,
                     'credit': 0.0,
-                    'debit': settlement_move_amount,
-                    'move_id': settlement_move.id,
-                }
-            )
-
-            to_be_settled = self.env['account.move.line']
-            to_be_settled |= move_line_credit
-            to_be_settled |= settlement_move_line
+                    'partner_id': riba_line.partner_id.id,
+                    'date_maturity': riba_line.due_date,
+                    'move_id': move.id,
+                })
+            bills_lines = move_line_model.create(bills_vals)
+            overdue_lines = move_line_model.create(overdue_vals)
+            amount = sum(riba_lines.mapped('amount'))
+            move_line_model.create([{
+                'name': _('C/O'),
+                'account_id': config.accreditation_account_id.id,
+                'debit': amount,
+                'credit': 0.0,
+                'move_id': move.id,
+            }, {
+                'name': _('A/C Bank'),
+                'account_id': config.bank_account_id.id,
+                'credit': amount,
+                'debit': 0.0,
+                'move_id': move.id,
+            }])
+            move.post()
 
-            to_be_settled.reconcile()
-            settlement_move.post()
+            for riba_line, overdue_line in zip(riba_lines, overdue_lines):
+                for riba_move_line in riba_line.move_line_ids:
+                    invoices = riba_move_line.move_line_id.invoice_id or \
+                        riba_move_line.move_line_id.unsolved_invoice_ids
+                    invoices.write({
+                        'unsolved_move_line_ids': [(4, overdue_line.id)],
+                    })
+            riba_lines.write({
+                'unsolved_move_id': move.id,
+                'state': 'unsolved',
+            })
+            for riba_line, bills_line in zip(riba_lines, bills_lines):
+                (bills_line | effects_lines[riba_line]).with_context({
+                    'unsolved_reconciliation': True}).reconcile()
+            distinta.state = 'unsolved'
 
 
 class RibaListMoveLine(models.Model):
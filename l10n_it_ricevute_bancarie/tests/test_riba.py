@@ -6,6 +6,7 @@
 import base64
 import os
 from . import riba_common
+from odoo.exceptions import UserError
 from odoo.tests import Form
 from odoo.tools import config, safe_eval
 
@@ -493,3 +494,214 @@ class TestInvoiceDueCost(riba_common.TestRibaCommon):
         self.assertTrue(
             b'CIG: 7987210EG5 CUP: H71N17000690125' in riba_txt
         )
+
+    def _create_accredited_riba_list(self):
+        recent_date = self.env['account.invoice'].search(
+            [('date_invoice', '!=', False)], order='date_invoice desc',
+            limit=1).date_invoice
+        riba_move_lines = self.move_line_model
+        for price in (100.00, 200.00):
+            invoice = self.env['account.invoice'].create({
+                'date_invoice': recent_date,
+                'journal_id': self.sale_journal.id,
+                'partner_id': self.partner.id,
+                'payment_term_id': self.account_payment_term_riba.id,
+                'account_id': self.account_rec1_id.id,
+                'invoice_line_ids': [(
+                    0, 0, {
+                        'name': 'product1',
+                        'product_id': self.product1.id,
+                        'quantity': 1.0,
+                        'price_unit': price,
+                        'account_id': self.sale_account.id
+                    }
+                )]
+            })
+            invoice.action_invoice_open()
+            riba_move_lines |= invoice.move_id.line_ids.filtered(
+                lambda x: x.account_id == self.account_rec1_id)
+        wizard_riba_issue = self.env['riba.issue'].create({
+            'configuration_id': self.riba_config.id
+        })
+        action = wizard_riba_issue.with_context(
+            {'active_ids': riba_move_lines.ids}
+        ).create_list()
+        riba_list = self.distinta_model.browse(action['res_id'])
+        riba_list.confirm()
+        wiz_accreditation = self.env['riba.accreditation'].with_context({
+            "active_model": "riba.distinta",
+            "active_ids": riba_list.ids,
+            "active_id": riba_list.id,
+        }).create({
+            'bank_amount': sum(riba_list.line_ids.mapped('amount')),
+        })
+        wiz_accreditation.create_move()
+        self.assertEqual(riba_list.state, 'accredited')
+        return riba_list
+
+    def _import_riba_outcome(self, riba_list, outcome):
+        # The return flow of the bank repeats the exported records
+        wizard_riba_export = self.env['riba.file.export'].create({})
+        wizard_riba_export.with_context(
+            {'active_ids': riba_list.ids}
+        ).act_getfile()
+        wizard_import = self.env['riba.outcome.import'].create({
+            'riba_file': wizard_riba_export.riba_txt,
+            'outcome': outcome,
+        })
+        wizard_import.import_file()
+        self.assertEqual(wizard_import.state, 'done')
+        return wizard_import
+
+    def test_riba_outcome_import_unsolved(self):
+        riba_list = self._create_accredited_riba_list()
+        self.assertEqual(len(riba_list.line_ids), 2)
+        self._import_riba_outcome(riba_list, 'unsolved')
+        self.assertEqual(riba_list.state, 'unsolved')
+        self.assertEqual(
+            riba_list.line_ids.mapped('state'), ['unsolved', 'unsolved'])
+        # One move for the whole slip
+        unsolved_move = riba_list.line_ids.mapped('unsolved_move_id')
+        self.assertEqual(len(unsolved_move), 1)
+        unsolved_move.assert_balanced()
+        for riba_line in riba_list.line_ids:
+            invoice = riba_line.move_line_ids.mapped(
+                'move_line_id.invoice_id')
+            self.assertTrue(invoice.unsolved_move_line_ids)
+            self.assertTrue(invoice.is_unsolved)
+
+    def test_riba_outcome_import_paid(self):
+        self.riba_config.settlement_journal_id = self.bank_journal
+        riba_list = self._create_accredited_riba_list()
+        wizard_import = self._import_riba_outcome(riba_list, 'paid')
+        self.assertIn('2 C/O lines updated', wizard_import.result)
+        self.assertEqual(riba_list.state, 'paid')
+        self.assertEqual(
+            riba_list.line_ids.mapped('state'), ['paid', 'paid'])
+
+        # Receipts already processed are not found again
+        wizard_import = self._import_riba_outcome(riba_list, 'paid')
+        self.assertIn('0 C/O lines updated', wizard_import.result)
+        self.assertIn('C/O not found or not credited', wizard_import.result)
+
+    def _get_bank_outcome_file(self, sections, reason='30000'):
+        """
+        Build a C/O outcome file as sent back by the bank:
+        only the records identifying the receipts, numbered by the bank.
+
+        :param sections: list of sections, each one a list of
+            (C/O line, invoice reference) to be written.
+        """
+        rows = []
+        for section in sections:
+            rows.append(' IB' + '01234' + '03069' + '010120' +
+                        'ESITI BANCA'.ljust(20))
+            for progressive, (line, invoice_ref) in enumerate(
+                    section, start=1):
+                prefix = '%07d' % (progressive * 10)
+                rows.append(
+                    ' 14' + prefix + ' ' * 12 +
+                    line.due_date.strftime('%d%m%y') + reason +
+                    '%013d' % round(line.amount * 100) + '-')
+                if invoice_ref is not None:
+                    rows.append(
+                        ' 50' + prefix +
+                        ('PER LA FATTURA N. %s DEL 010120' % invoice_ref
+                         ).ljust(80))
+                rows.append(' 51' + prefix + '%010d' % line.sequence)
+            rows.append(' EF' + '01234' + '03069' + '010120' +
+                        'ESITI BANCA'.ljust(20))
+        return base64.encodebytes(
+            '\r\n'.join(row.ljust(120) for row in rows).encode())
+
+    def _import_bank_outcome(self, riba_file, outcome):
+        wizard_import = self.env['riba.outcome.import'].create({
+            'riba_file': riba_file,
+            'outcome': outcome,
+        })
+        wizard_import.import_file()
+        return wizard_import
+
+    def test_riba_outcome_import_bank_file(self):
+        self.riba_config.settlement_journal_id = self.bank_journal
+        riba_list_1 = self._create_accredited_riba_list()
+        riba_list_2 = self._create_accredited_riba_list()
+        line_1, line_2 = riba_list_2.line_ids
+        other_line = riba_list_1.line_ids.filtered(
+            lambda l: l.sequence == line_2.sequence)
+
+        # A section mixing receipts of different slips is not matched
+        riba_file = self._get_bank_outcome_file([
+            [(line_1, line_1.invoice_number),
+             (other_line, other_line.invoice_number)],
+        ])
+        wizard_import = self._import_bank_outcome(riba_file, 'paid')
+        self.assertIn('0 C/O lines updated', wizard_import.result)
+
+        # A receipt without invoice reference is not matched
+        riba_file = self._get_bank_outcome_file([
+            [(line_1, line_1.invoice_number), (line_2, None)],
+        ])
+        wizard_import = self._import_bank_outcome(riba_file, 'paid')
+        self.assertIn('1 C/O lines updated', wizard_import.result)
+        self.assertIn('C/O not found or not credited', wizard_import.result)
+        self.assertEqual(line_1.state, 'paid')
+        self.assertEqual(line_2.state, 'accredited')
+        self.assertEqual(
+            riba_list_1.line_ids.mapped('state'),
+            ['accredited', 'accredited'])
+
+        # Receipts are matched in the slip of their section only
+        riba_file = self._get_bank_outcome_file([
+            [(line_2, line_2.invoice_number)],
+        ])
+        wizard_import = self._import_bank_outcome(riba_file, 'paid')
+        self.assertIn('1 C/O lines updated', wizard_import.result)
+        self.assertEqual(riba_list_2.state, 'paid')
+        self.assertEqual(
+            riba_list_1.line_ids.mapped('state'),
+            ['accredited', 'accredited'])
+
+    def test_riba_outcome_import_mixed_reasons(self):
+        riba_list = self._create_accredited_riba_list()
+        line_1, line_2 = riba_list.line_ids
+        paid_file = base64.decodebytes(self._get_bank_outcome_file(
+            [[(line_1, line_1.invoice_number)]]))
+        unsolved_file = base64.decodebytes(self._get_bank_outcome_file(
+            [[(line_2, line_2.invoice_number)]], reason='30001'))
+        riba_file = base64.encodebytes(paid_file + b'\r\n' + unsolved_file)
+        with self.assertRaises(UserError):
+            self._import_bank_outcome(riba_file, 'paid')
+        self.assertEqual(
+            riba_list.line_ids.mapped('state'),
+            ['accredited', 'accredited'])
+
+    def test_riba_file_export_multiple(self):
+        riba_lists = self._create_accredited_riba_list() | \
+            self._create_accredited_riba_list()
+        wizard_riba_export = self.env['riba.file.export'].create({})
+        wizard_riba_export.with_context(
+            {'active_ids': riba_lists.ids}
+        ).act_getfile()
+        self.assertTrue(wizard_riba_export.file_name.startswith('riba_'))
+        rows = base64.decodebytes(
+            wizard_riba_export.riba_txt).decode().split('\r\n')[:-1]
+        # One section for each slip
+        self.assertEqual(
+            [row[1:3] for row in rows if row[1:3] in ('IB', 'EF')],
+            ['IB', 'EF', 'IB', 'EF'])
+        self.assertEqual(len(rows), 2 * (2 * 7 + 2))
+        sections = [rows[:16], rows[16:]]
+        for riba_list, section in zip(riba_lists, sections):
+            self.assertEqual(
+                [row[3:10] for row in section if row[1:3] == '14'],
+                ['0000001', '0000002'])
+            # Receipt numbers are unique within the section
+            self.assertEqual(
+                [int(row[10:20]) for row in section if row[1:3] == '51'],
+                riba_list.line_ids.mapped('sequence'))
+            self.assertEqual(section[-1][45:52], '0000002')
+            self.assertEqual(section[-1][52:67], '%015d' % round(
+                sum(riba_list.mapped('line_ids.amount')) * 100))
+        # Sections have different names
+        self.assertNotEqual(rows[0][19:39], rows[16][19:39])
@@ -7,6 +7,7 @@
 
 
 import base64
+import io
 from odoo import fields, models, _
 from odoo.exceptions import UserError
 import datetime
@@ -158,38 +159,42 @@ class RibaFileExport(models.TransientModel):
             str(int(self._progressivo) * 7 + 2).rjust(7, '0') + " " * 24 +
             self._valuta + " " * 6 + "\r\n")
 
-    def _creaFile(self, intestazione, ricevute_bancarie):
-        accumulatore = self._RecordIB(
+    def _write_section(self, output, intestazione, ricevute_bancarie):
+        """
+        Scrive nello stream `output` una sezione del file,
+        dal record IB al record EF.
+        """
+        write = output.write
+        self._progressivo = 0
+        self._totale = 0
+        write(self._RecordIB(
             intestazione[0], intestazione[1], intestazione[4], intestazione[5],
-            intestazione[6])
+            intestazione[6]))
         for value in ricevute_bancarie:  # estraggo le ricevute dall'array
-            self._progressivo = self._progressivo + 1
-            accumulatore = accumulatore + self._Record14(
+            self._progressivo += 1
+            write(self._Record14(
                 value[1], value[2], intestazione[1], intestazione[2],
                 intestazione[3], value[9], value[10], intestazione[0],
-                value[12])
-            accumulatore = accumulatore + \
-                self._Record20(intestazione[7], intestazione[
-                               8], intestazione[9], intestazione[10])
-            accumulatore = accumulatore + self._Record30(value[3], value[4])
-            accumulatore = accumulatore + \
-                self._Record40(
-                    value[5], value[6], value[7], value[8], value[11])
-            accumulatore = accumulatore + \
-                self._Record50(
-                    value[2], value[13], value[14], intestazione[11],
-                    value[15], value[16]
-                )
-            accumulatore = accumulatore + self._Record51(value[0])
-            accumulatore = accumulatore + self._Record70()
-        accumulatore = accumulatore + self._RecordEF()
-        self._progressivo = 0
-        self._totale = 0
-        return accumulatore
+                value[12]))
+            write(self._Record20(
+                intestazione[7], intestazione[8], intestazione[9],
+                intestazione[10]))
+            write(self._Record30(value[3], value[4]))
+            write(self._Record40(
+                value[5], value[6], value[7], value[8], value[11]))
+            write(self._Record50(
+                value[2], value[13], value[14], intestazione[11],
+                value[15], value[16]))
+            write(self._Record51(value[0]))
+            write(self._Record70())
+        write(self._RecordEF())
 
-    def act_getfile(self):
-        active_ids = self.env.context.get('active_ids', [])
-        order_obj = self.env['riba.distinta'].browse(active_ids)[0]
+    def _creaFile(self, intestazione, ricevute_bancarie):
+        output = io.StringIO()
+        self._write_section(output, intestazione, ricevute_bancarie)
+        return output.getvalue()
+
+    def _get_riba_header(self, order_obj, creation_date, supporto_suffix=''):
         credit_bank = order_obj.config_id.bank_id
         name_company = order_obj.config_id.company_id.partner_id.name
         if not credit_bank.acc_number:
@@ -203,9 +208,9 @@ class RibaFileExport(models.TransientModel):
             raise UserError(
                 _('No SIA Code specified for ') + name_company)
         credit_sia = credit_bank.codice_sia
-        dataemissione = datetime.datetime.now().strftime("%d%m%y")
-        nome_supporto = datetime.datetime.now().strftime(
-            "%d%m%y%H%M%S") + credit_sia
+        dataemissione = creation_date.strftime("%d%m%y")
+        nome_supporto = creation_date.strftime(
+            "%d%m%y%H%M%S") + credit_sia + supporto_suffix
         creditor_address = order_obj.config_id.company_id.partner_id
         creditor_city = creditor_address.city or ''
         if (
@@ -214,7 +219,7 @@ class RibaFileExport(models.TransientModel):
         ):
             raise UserError(
                 _('No VAT or Fiscal Code specified for ') + name_company)
-        array_testata = [
+        return [
             credit_sia,
             credit_abi,
             credit_cab,
@@ -231,68 +236,93 @@ class RibaFileExport(models.TransientModel):
                 order_obj.config_id.company_id.partner_id.vat[2:] or
                 order_obj.config_id.company_id.partner_id.fiscalcode),
         ]
-        arrayRiba = []
-        for line in order_obj.line_ids:
-            debit_bank = line.bank_id
-            debitor_address = line.partner_id
-            debitor_street = debitor_address.street or ''
-            debitor_zip = debitor_address.zip or ''
-            if debit_bank.bank_abi and debit_bank.bank_cab:
-                debit_abi = debit_bank.bank_abi
-                debit_cab = debit_bank.bank_cab
-            elif debit_bank.acc_number:
-                debit_iban = debit_bank.acc_number.replace(" ", "")
-                debit_abi = debit_iban[5:10]
-                debit_cab = debit_iban[10:15]
-            else:
-                raise UserError(
-                    _('No IBAN or ABI/CAB specified for ') +
-                    line.partner_id.name)
-            debitor_city = debitor_address.city and debitor_address.city.ljust(
-                23)[0:23] or ''
-            debitor_province = (
-                debitor_address.state_id and debitor_address.state_id.code or
-                '')
-            if not line.due_date:  # ??? VERIFICARE
-                due_date = '000000'
-            else:
-                due_date = line.due_date.strftime("%d%m%y")
 
-            if not line.partner_id.vat and not line.partner_id.fiscalcode:
-                raise UserError(
-                    _('No VAT or Fiscal Code specified for ') +
-                    line.partner_id.name)
-            Riba = [
-                line.sequence,
-                due_date,
-                line.amount,
-                # using regex we remove chars outside letters, numbers, space,
-                # dot and comma because, special chars cause errors.
-                re.sub(r'[^\w\s,.]+', '', line.partner_id.name)[:60],
-                line.partner_id.vat and line.partner_id.vat[
-                    2:] or line.partner_id.fiscalcode,
-                re.sub(r'[^\w\s,.]+', '', debitor_street)[:30],
-                debitor_zip[:5],
-                debitor_city[:24],
-                debitor_province,
-                debit_abi,
-                debit_cab,
-                debit_bank.bank_name and debit_bank.bank_name[:50] or '',
-                line.partner_id.ref and line.partner_id.ref[:16] or '',
-                line.invoice_number[:40],
-                line.invoice_date,
-                'CIG: %s ' % line.cig if line.cig else '',
-                'CUP: %s ' % line.cup if line.cup else '',
-            ]
-            arrayRiba.append(Riba)
+    def _get_riba_values(self, line):
+        debit_bank = line.bank_id
+        debitor_address = line.partner_id
+        debitor_street = debitor_address.street or ''
+        debitor_zip = debitor_address.zip or ''
+        if debit_bank.bank_abi and debit_bank.bank_cab:
+            debit_abi = debit_bank.bank_abi
+            debit_cab = debit_bank.bank_cab
+        elif debit_bank.acc_number:
+            debit_iban = debit_bank.acc_number.replace(" ", "")
+            debit_abi = debit_iban[5:10]
+            debit_cab = debit_iban[10:15]
+        else:
+            raise UserError(
+                _('No IBAN or ABI/CAB specified for ') +
+                line.partner_id.name)
+        debitor_city = debitor_address.city and debitor_address.city.ljust(
+            23)[0:23] or ''
+        debitor_province = (
+            debitor_address.state_id and debitor_address.state_id.code or
+            '')
+        if not line.due_date:  # ??? VERIFICARE
+            due_date = '000000'
+        else:
+            due_date = line.due_date.strftime("%d%m%y")
+
+        if not line.partner_id.vat and not line.partner_id.fiscalcode:
+            raise UserError(
+                _('No VAT or Fiscal Code specified for ') +
+                line.partner_id.name)
+        return [
+            line.sequence,
+            due_date,
+            line.amount,
+            # using regex we remove chars outside letters, numbers, space,
+            # dot and comma because, special chars cause errors.
+            re.sub(r'[^\w\s,.]+', '', line.partner_id.name)[:60],
+            line.partner_id.vat and line.partner_id.vat[
+                2:] or line.partner_id.fiscalcode,
+            re.sub(r'[^\w\s,.]+', '', debitor_street)[:30],
+            debitor_zip[:5],
+            debitor_city[:24],
+            debitor_province,
+            debit_abi,
+            debit_cab,
+            debit_bank.bank_name and debit_bank.bank_name[:50] or '',
+            line.partner_id.ref and line.partner_id.ref[:16] or '',
+            line.invoice_number[:40],
+            line.invoice_date,
+            'CIG: %s ' % line.cig if line.cig else '',
+            'CUP: %s ' % line.cup if line.cup else '',
+        ]
+
+    def act_getfile(self):
+        active_ids = self.env.context.get('active_ids', [])
+        distinte = self.env['riba.distinta'].browse(active_ids)
+        if not distinte:
+            raise UserError(_('No C/O slip selected.'))
+        # Read partners, states and banks of all the lines at once
+        lines = distinte.mapped('line_ids')
+        lines.mapped('partner_id.state_id.code')
+        lines.mapped('bank_id.bank_name')
+
+        # One section for each slip: the receipt number of record 51
+        # is the number of the line, unique within its slip only
+        creation_date = datetime.datetime.now()
+        output = io.StringIO()
+        for index, distinta in enumerate(distinte):
+            supporto_suffix = str(index) if len(distinte) > 1 else ''
+            self._write_section(
+                output,
+                self._get_riba_header(
+                    distinta, creation_date, supporto_suffix),
+                (self._get_riba_values(line) for line in distinta.line_ids))
 
         out = base64.encodebytes(
-            self._creaFile(array_testata, arrayRiba).encode(
-                'ascii', errors='replace'))
+            output.getvalue().encode('ascii', errors='replace'))
+        if len(distinte) == 1:
+            file_name = '%s.txt' % distinte.name
+        else:
+            file_name = 'riba_%s.txt' % creation_date.strftime(
+                "%Y%m%d%H%M%S")
         self.write({
             'state': 'get',
             'riba_txt': out,
-            'file_name': '%s.txt' % order_obj.name
+            'file_name': file_name,
         })
 
         model_data_obj = self.env['ir.model.data']
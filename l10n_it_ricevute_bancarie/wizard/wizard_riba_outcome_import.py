@@ -0,0 +1,203 @@
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+import base64
+import datetime
+import re
+from collections import OrderedDict, defaultdict
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+# Invoice references written in record 50 by riba.file.export,
+# the description can be truncated
+re_invoice_ref = re.compile(r'PER LA FATTURA N\. (.*?)(?: DEL |$)')
+
+
+def parse_riba_file(data):
+    """
+    Read the receipts of a CBI C/O file, i.e. the bank's return flow.
+
+    Each receipt is made of the records 14 (due date and amount),
+    50 (invoice reference) and 51 (receipt number),
+    linked by their progressive number within a section
+    (from record IB to record EF).
+
+    :param data: text of the file.
+    :return: list of dictionaries with keys `section`, `sequence`,
+        `due_date`, `amount`, `reason` (the reason code of record 14)
+        and `invoice_ref`.
+    """
+    receipts = {}
+    section = 0
+    for row in data.splitlines():
+        if len(row) < 10:
+            continue
+        record_type = row[1:3]
+        if record_type == 'IB':
+            section += 1
+        if record_type not in ('14', '50', '51'):
+            continue
+        receipt = receipts.setdefault((section, row[3:10]), {
+            'section': section,
+            'sequence': False,
+            'due_date': False,
+            'amount': 0.0,
+            'reason': '',
+            'invoice_ref': '',
+        })
+        if record_type == '14':
+            try:
+                receipt['due_date'] = datetime.datetime.strptime(
+                    row[22:28], '%d%m%y').date()
+            except ValueError:
+                pass
+            receipt['reason'] = row[28:33]
+            receipt['amount'] = int(row[33:46] or 0) / 100.0
+        elif record_type == '50':
+            match = re_invoice_ref.search(row[10:90])
+            if match:
+                receipt['invoice_ref'] = match.group(1).strip()
+        elif record_type == '51':
+            receipt['sequence'] = int(row[10:20] or 0)
+    return [receipts[number] for number in sorted(receipts)]
+
+
+class RibaOutcomeImport(models.TransientModel):
+    _name = "riba.outcome.import"
+    _description = "C/O Bank Outcome Import Wizard"
+
+    riba_file = fields.Binary('File', required=True)
+    file_name = fields.Char('File Name')
+    outcome = fields.Selection([
+        ('paid', 'Paid'),
+        ('unsolved', 'Past Due'),
+    ], string='Outcome', required=True, default='paid',
+        help="Outcome of all the C/Os in the file.")
+    state = fields.Selection([
+        ('choose', 'choose'),
+        ('done', 'done'),
+    ], default='choose')
+    result = fields.Text('Result', readonly=True)
+
+    @api.model
+    def _receipt_matches_line(self, receipt, line):
+        """
+        Check that `receipt` refers to the C/O `line`,
+        by its invoice reference, due date and amount.
+        """
+        return bool(
+            receipt['invoice_ref'] and
+            line.invoice_number[:40].startswith(receipt['invoice_ref']) and
+            (not receipt['due_date'] or
+             line.due_date == receipt['due_date']) and
+            not line.company_id.currency_id.compare_amounts(
+                line.amount, receipt['amount']))
+
+    @api.model
+    def _match_riba_lines(self, receipts):
+        """
+        Find the credited C/O line of each receipt,
+        by its number, invoice reference, due date and amount.
+
+        Every section of the file refers to a single slip,
+        so the receipts of a section are searched in the only slip
+        containing all the receipts that can be found.
+
+        :return: tuple (C/O lines, receipts not matching a single line)
+        """
+        line_model = self.env['riba.distinta.line']
+        candidates = line_model.search([
+            ('sequence', 'in', [r['sequence'] for r in receipts]),
+            ('state', '=', 'accredited'),
+            ('type', '!=', 'incasso'),
+        ])
+        lines_by_sequence = defaultdict(list)
+        for line in candidates:
+            lines_by_sequence[line.sequence].append(line)
+
+        receipts_by_section = OrderedDict()
+        for receipt in receipts:
+            receipts_by_section.setdefault(
+                receipt['section'], []).append(receipt)
+
+        riba_lines = line_model
+        unmatched = []
+        for section_receipts in receipts_by_section.values():
+            lines_by_receipt = [
+                [line for line in lines_by_sequence[receipt['sequence']]
+                 if self._receipt_matches_line(receipt, line)]
+                for receipt in section_receipts
+            ]
+            distinte = None
+            for lines in lines_by_receipt:
+                if lines:
+                    receipt_distinte = {line.distinta_id for line in lines}
+                    distinte = receipt_distinte if distinte is None \
+                        else distinte & receipt_distinte
+            for receipt, lines in zip(section_receipts, lines_by_receipt):
+                if distinte is not None and len(distinte) == 1:
+                    lines = [
+                        line for line in lines
+                        if line.distinta_id in distinte and
+                        line not in riba_lines
+                    ]
+                else:
+                    lines = []
+                if len(lines) == 1:
+                    riba_lines |= lines[0]
+                else:
+                    unmatched.append(receipt)
+        return riba_lines, unmatched
+
+    @api.multi
+    def import_file(self):
+        self.ensure_one()
+        data = base64.b64decode(self.riba_file).decode(
+            'ascii', errors='replace')
+        try:
+            receipts = parse_riba_file(data)
+        except ValueError:
+            raise UserError(_('Invalid C/O file.'))
+        if not receipts:
+            raise UserError(_('No C/O found in file.'))
+        reasons = {receipt['reason'] for receipt in receipts}
+        if len(reasons) > 1:
+            raise UserError(_(
+                'The file contains C/Os with different reason codes (%s): '
+                'please import paid and past due C/Os '
+                'from separate files.') % ', '.join(sorted(reasons)))
+        riba_lines, unmatched = self._match_riba_lines(receipts)
+        if self.outcome == 'paid':
+            riba_lines.riba_line_settlement()
+        else:
+            riba_lines.riba_line_unsolved()
+
+        result = [_('%d C/O lines updated in slips: %s') % (
+            len(riba_lines),
+            ', '.join(riba_lines.mapped('distinta_id.name')))]
+        if unmatched:
+            result.append(_('C/O not found or not credited:'))
+            result.extend(
+                _('Number %s, invoice %s, amount %.2f') % (
+                    receipt['sequence'], receipt['invoice_ref'],
+                    receipt['amount'])
+                for receipt in unmatched)
+        self.write({
+            'state': 'done',
+            'result': '\n'.join(result),
+        })
+
+        model_data_obj = self.env['ir.model.data']
+        view_rec = model_data_obj.get_object_reference(
+            'l10n_it_ricevute_bancarie', 'wizard_riba_outcome_import')
+        view_id = view_rec and view_rec[1] or False
+
+        return {
+            'view_type': 'form',
+            'view_id': [view_id],
+            'view_mode': 'form',
+            'res_model': 'riba.outcome.import',
+            'res_id': self.id,
+            'type': 'ir.actions.act_window',
+            'target': 'new',
+        }
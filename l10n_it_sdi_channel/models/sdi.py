@@ -191,6 +191,26 @@ class SdiChannel(models.Model):
             )
         return attachments
 
+    @api.model
+    def _search_attachments_out_by_file_names(self, file_names):
+        """
+        Search Electronic Invoices referenced by notifications.
+
+        :param file_names: file names found in the notifications.
+        :return: dictionary mapping each file name
+            to its Electronic Invoice (`fatturapa.attachment.out`),
+            only for the file names that have been found.
+        """
+        attachment_model = self.env['fatturapa.attachment.out']
+        attachments_by_file_name = attachment_model.find_by_file_names(
+            file_names)
+        for file_name, attachment in attachments_by_file_name.items():
+            if len(attachment) > 1:
+                _logger.info('More than 1 out invoice found for incoming'
+                             'message')
+                attachments_by_file_name[file_name] = first(attachment)
+        return attachments_by_file_name
+
     @api.model
     def _search_attachment_out_by_notification(
         self,
@@ -198,25 +218,15 @@ class SdiChannel(models.Model):
         response_content,
     ):
         """Search Electronic Invoice referenced by this notification"""
-        attachment_model = self.env['fatturapa.attachment.out']
-        attachment = attachment_model.browse()
+        attachment = self.env['fatturapa.attachment.out'].browse()
 
         root = etree.fromstring(response_content)
         file_name = root.find('NomeFile')
 
         if file_name is not None:
             file_name = file_name.text
-            unsigned_file_name = file_name.replace('.p7m', '')
-            attachment = attachment_model.search(
-                [
-                    '|',
-                    ('datas_fname', '=', file_name),
-                    ('datas_fname', '=', unsigned_file_name),
-                ])
-            if len(attachment) > 1:
-                _logger.info('More than 1 out invoice found for incoming'
-                             'message')
-                attachment = first(attachment)
+            attachment = self._search_attachments_out_by_file_names(
+                [file_name]).get(file_name, attachment)
         return attachment
 
     def _process_single_notification(
@@ -380,21 +390,30 @@ class SdiChannel(models.Model):
             for each SdI notification.
         :return: the updated Electronic Invoices (`fatturapa.attachment.out`).
         """
-        attachments = self.env['fatturapa.attachment.out'].browse()
+        attachment_model = self.env['fatturapa.attachment.out']
+        attachments = attachment_model.browse()
+        notifications = []
         for response_name, response_content in \
                 response_name_content_dict.items():
             if response_name.lower().endswith('.zip'):
                 # not implemented, case of AT, todo
                 continue
 
-            message_type = response_name.split('_')[2]
             root = etree.fromstring(response_content)
             file_name = root.find('NomeFile')
-
-            attachment = self._search_attachment_out_by_notification(
-                response_name,
-                response_content,
-            )
+            file_name = file_name.text if file_name is not None else None
+            notifications.append((response_name, root, file_name))
+
+        # Find the Electronic Invoices of all the notifications at once
+        attachments_by_file_name = \
+            self._search_attachments_out_by_file_names([
+                file_name for _name, _root, file_name in notifications
+                if file_name
+            ])
+        for response_name, root, file_name in notifications:
+            message_type = response_name.split('_')[2]
+            attachment = attachments_by_file_name.get(
+                file_name, attachment_model.browse())
             if not attachment:
                 # Metadati
                 if message_type == 'MT':
@@ -18,14 +18,19 @@ class ReportRegistroIva(models.AbstractModel):
         # see addons/account/report/account_balance.py
 
         date_format = data['form']['date_format']
+        moves = self.env['account.move'].browse(data['ids'])
+        # Tax lines of all the moves are computed at once
+        tax_lines_by_move = self._get_tax_lines_by_move(moves, data['form'])
 
         docargs = {
             'doc_ids': data['ids'],
             'doc_model': self.env['account.move'],
             'data': data['form'],
-            'docs': self.env['account.move'].browse(data['ids']),
+            'docs': moves,
             'get_move': self._get_move,
-            'tax_lines': self._get_tax_lines,
+            'tax_lines': lambda move, form: (
+                tax_lines_by_move[move.id] if move.id in tax_lines_by_move
+                else self._get_tax_lines(move, form)),
             'format_date': self._format_date,
             'from_date': self._format_date(
                 data['form']['from_date'], date_format),
@@ -57,41 +62,82 @@ class ReportRegistroIva(models.AbstractModel):
             formatted_date = my_date.strftime(date_format)
         return formatted_date or ''
 
+    def _get_invoices_by_move(self, moves):
+        invoices = self.env['account.invoice'].search([
+            ('move_id', 'in', moves.ids)])
+        res = {move.id: invoices.browse() for move in moves}
+        for invoice in invoices:
+            res[invoice.move_id.id] |= invoice
+        return res
+
     def _get_invoice_from_move(self, move):
-        return self.env['account.invoice'].search([
-            ('move_id', '=', move.id)])
+        return self._get_invoices_by_move(move)[move.id]
 
     def _get_move_line(self, move, data):
         return [move_line for move_line in move.line_ids]
 
-    def _tax_amounts_by_tax_id(self, move, move_lines, registry_type):
-        res = {}
-
-        for move_line in move_lines:
-            set_cee_absolute_value = False
-            if not(move_line.tax_line_id or move_line.tax_ids):
-                continue
-
-            if move_line.tax_ids and len(move_line.tax_ids) != 1:
-                    raise UserError(
-                        _("Move line %s has too many base taxes")
-                        % move_line.name)
-
-            if move_line.tax_ids:
-                tax = move_line.tax_ids[0]
-                is_base = True
-            else:
-                tax = move_line.tax_line_id
-                is_base = False
+    def _tax_amounts_by_move(self, moves, move_lines, registry_type):
+        """
+        Compute the taxable and tax amounts of `moves`,
+        reading `move_lines` with one query grouped by move and tax.
 
+        Returns:
+            A dictionary {move ID: {tax ID: {'name', 'base', 'tax'}}},
+            taxes of each move are in the order of its move lines
+        """
+        res = {move.id: {} for move in moves}
+        if not move_lines:
+            return res
+
+        self.env.cr.execute("""
+            SELECT rel.account_move_line_id
+            FROM account_move_line_account_tax_rel rel
+            WHERE rel.account_move_line_id IN %s
+            GROUP BY rel.account_move_line_id
+            HAVING COUNT(*) > 1
+            LIMIT 1
+        """, (tuple(move_lines.ids), ))
+        row = self.env.cr.fetchone()
+        if row:
+            raise UserError(
+                _("Move line %s has too many base taxes")
+                % self.env['account.move.line'].browse(row[0]).name)
+
+        # Lines with a base tax are only considered as base lines;
+        # the absolute amount is summed by line for EU taxes
+        self.env.cr.execute("""
+            SELECT aml.move_id,
+                COALESCE(rel.account_tax_id, aml.tax_line_id),
+                rel.account_tax_id IS NOT NULL,
+                SUM(aml.debit - aml.credit),
+                SUM(ABS(aml.debit - aml.credit))
+            FROM account_move_line aml
+            LEFT JOIN account_move_line_account_tax_rel rel
+                ON rel.account_move_line_id = aml.id
+            WHERE aml.id IN %s
+                AND (rel.account_tax_id IS NOT NULL
+                     OR aml.tax_line_id IS NOT NULL)
+            GROUP BY 1, 2, 3
+            ORDER BY aml.move_id, MAX(aml.id) DESC
+        """, (tuple(move_lines.ids), ))
+        rows = self.env.cr.fetchall()
+
+        taxes = self.env['account.tax'].browse({row[1] for row in rows})
+        taxes_by_id = {tax.id: tax for tax in taxes}
+        moves_by_id = {move.id: move for move in moves}
+        for move_id, tax_id, is_base, amount, abs_amount in rows:
+            move = moves_by_id[move_id]
+            tax = taxes_by_id[tax_id]
             if (
                 (registry_type == 'customer' and tax.cee_type == 'sale') or
                 (registry_type == 'supplier' and tax.cee_type == 'purchase')
             ):
-                set_cee_absolute_value = True
-
+                tax_amount = abs_amount
             elif tax.cee_type:
                 continue
+            else:
+                tax_amount = amount
+            tax_amount = float(tax_amount)
 
             if tax.parent_tax_ids and len(tax.parent_tax_ids) == 1:
                 # we group by main tax
@@ -100,16 +146,13 @@ class ReportRegistroIva(models.AbstractModel):
             if tax.exclude_from_registries:
                 continue
 
-            if not res.get(tax.id):
-                res[tax.id] = {
+            move_res = res[move_id]
+            if not move_res.get(tax.id):
+                move_res[tax.id] = {
                     'name': tax.name,
                     'base': 0,
                     'tax': 0,
                 }
-            tax_amount = move_line.debit - move_line.credit
-
-            if set_cee_absolute_value:
-                tax_amount = abs(tax_amount)
 
             if (
                 'receivable' in move.move_type or
@@ -123,25 +166,25 @@ class ReportRegistroIva(models.AbstractModel):
 
             if is_base:
                 # recupero il valore dell'imponibile
-                res[tax.id]['base'] += tax_amount
+                move_res[tax.id]['base'] += tax_amount
             else:
                 # recupero il valore dell'imposta
-                res[tax.id]['tax'] += tax_amount
+                move_res[tax.id]['tax'] += tax_amount
 
         return res
 
-    def _get_tax_lines(self, move, data):
+    def _tax_amounts_by_tax_id(self, move, move_lines, registry_type):
+        move_lines = self.env['account.move.line'].browse(
+            [l.id for l in move_lines])
+        return self._tax_amounts_by_move(
+            move, move_lines, registry_type)[move.id]
 
+    def _prepare_tax_lines(
+            self, move, invoice, move_lines, amounts_by_tax_id):
         """
-
-        Args:
-            move: the account.move representing the invoice
-
         Returns:
-            A tuple of lists: (INVOICE_TAXES, TAXES_USED)
-            where INVOICE_TAXES is a list of dict
-            and TAXES_USED a recordset of account.tax
-
+            A tuple of lists: (INVOICE_TAXES, TAXES_USED),
+            see `_get_tax_lines`
         """
         inv_taxes = []
         used_taxes = self.env['account.tax']
@@ -149,19 +192,11 @@ class ReportRegistroIva(models.AbstractModel):
         # index è usato per non ripetere la stampa dei dati fattura quando ci
         # sono più codici IVA
         index = 0
-        invoice = self._get_invoice_from_move(move)
         if 'refund' in move.move_type:
             invoice_type = "NC"
         else:
             invoice_type = "FA"
 
-        move_lines = self._get_move_line(move, data)
-
-        amounts_by_tax_id = self._tax_amounts_by_tax_id(
-            move,
-            move_lines,
-            data['registry_type'])
-
         for tax_id in amounts_by_tax_id:
             tax = self.env['account.tax'].browse(tax_id)
             tax_item = {
@@ -192,6 +227,63 @@ class ReportRegistroIva(models.AbstractModel):
 
         return inv_taxes, used_taxes
 
+    def _get_tax_lines_by_move(self, moves, data):
+        """
+        Compute the tax lines of all the `moves` at once,
+        considering the move lines returned by `_get_move_line`.
+
+        Returns:
+            A dictionary {move ID: (INVOICE_TAXES, TAXES_USED)},
+            see `_get_tax_lines`
+
+        """
+        move_line_model = self.env['account.move.line']
+        move_lines_by_move = {
+            move.id: move_line_model.browse(
+                [l.id for l in self._get_move_line(move, data)])
+            for move in moves
+        }
+        invoices_by_move = self._get_invoices_by_move(moves)
+        amounts_by_move = self._tax_amounts_by_move(
+            moves,
+            move_line_model.union(*move_lines_by_move.values()),
+            data['registry_type'])
+        # read all the taxes at once
+        self.env['account.tax'].browse(
+            {tax_id for amounts in amounts_by_move.values()
+             for tax_id in amounts}).mapped('name')
+
+        return {
+            move.id: self._prepare_tax_lines(
+                move,
+                invoices_by_move[move.id],
+                move_lines_by_move[move.id],
+                amounts_by_move[move.id])
+            for move in moves
+        }
+
+    def _get_tax_lines(self, move, data):
+
+        """
+
+        Args:
+            move: the account.move representing the invoice
+
+        Returns:
+            A tuple of lists: (INVOICE_TAXES, TAXES_USED)
+            where INVOICE_TAXES is a list of dict
+            and TAXES_USED a recordset of account.tax
+
+        """
+        invoice = self._get_invoice_from_move(move)
+        move_lines = self._get_move_line(move, data)
+        amounts_by_tax_id = self._tax_amounts_by_tax_id(
+            move,
+            move_lines,
+            data['registry_type'])
+        return self._prepare_tax_lines(
+            move, invoice, move_lines, amounts_by_tax_id)
+
     def _get_move_total(self, move):
 
         total = 0.0
@@ -1,5 +1,7 @@
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 
+import mock
+
 from odoo.addons.account.tests.account_test_classes import AccountingTestCase
 from odoo import fields
 
@@ -76,3 +78,121 @@ class TestRegistry(AccountingTestCase):
         html = report.render_qweb_html(res['data']['ids'], res['data'])
 
         self.assertTrue(b'Tax 10.0' in html[0])
+
+
+class TestRegistryTaxLines(AccountingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.test_date = fields.Date.today()
+        self.journal = self.env['account.journal'].search(
+            [('type', '=', 'sale')])[0]
+        self.ova = self.env['account.account'].search([
+            (
+                'user_type_id', '=',
+                self.env.ref('account.data_account_type_current_assets').id)
+        ], limit=1)
+        self.tax = self.env['account.tax'].create({
+            'name': 'Tax 10.0',
+            'amount': 10.0,
+            'amount_type': 'fixed',
+            'account_id': self.ova.id,
+        })
+        self.invoice_account = self.env['account.account'].search([
+            (
+                'user_type_id', '=',
+                self.env.ref('account.data_account_type_receivable').id
+            )
+        ], limit=1).id
+        self.invoice_line_account = self.env['account.account'].search([
+            (
+                'user_type_id', '=',
+                self.env.ref('account.data_account_type_expenses').id)
+        ], limit=1).id
+
+    def _create_invoice(self, price_unit):
+        invoice = self.env['account.invoice'].create({
+            'partner_id': self.env.ref('base.res_partner_2').id,
+            'date_invoice': self.test_date,
+            'account_id': self.invoice_account,
+            'type': 'in_invoice',
+            'journal_id': self.journal.id,
+        })
+
+        self.env['account.invoice.line'].create({
+            'product_id': self.env.ref('product.product_product_4').id,
+            'quantity': 1.0,
+            'price_unit': price_unit,
+            'invoice_id': invoice.id,
+            'name': 'product that cost %s' % price_unit,
+            'account_id': self.invoice_line_account,
+            'invoice_line_tax_ids': [(6, 0, [self.tax.id])],
+        })
+        invoice.compute_taxes()
+        invoice.action_invoice_open()
+        return invoice
+
+    def test_tax_lines_by_move(self):
+        invoice_1 = self._create_invoice(100.0)
+        invoice_2 = self._create_invoice(200.0)
+        moves = invoice_1.move_id | invoice_2.move_id
+
+        report = self.env['report.l10n_it_vat_registries.report_registro_iva']
+        data = {'registry_type': 'supplier'}
+        tax_lines_by_move = report._get_tax_lines_by_move(moves, data)
+
+        for invoice, base in ((invoice_1, 100.0), (invoice_2, 200.0)):
+            inv_taxes, used_taxes = tax_lines_by_move[invoice.move_id.id]
+            self.assertEqual(used_taxes, self.tax)
+            self.assertEqual(len(inv_taxes), 1)
+            self.assertAlmostEqual(inv_taxes[0]['base'], base)
+            self.assertAlmostEqual(inv_taxes[0]['tax'], 10.0)
+            self.assertEqual(inv_taxes[0]['invoice_rec'], invoice)
+            self.assertEqual(
+                report._get_tax_lines(invoice.move_id, data)[0][0]['base'],
+                inv_taxes[0]['base'])
+
+    def test_tax_lines_customizations(self):
+        invoice = self._create_invoice(100.0)
+        move = invoice.move_id
+        report = self.env['report.l10n_it_vat_registries.report_registro_iva']
+        report_class = type(report)
+        data = {'registry_type': 'supplier'}
+
+        # Only the lines returned by _get_move_line are considered
+        base_lines = move.line_ids.filtered('tax_ids')
+        with mock.patch.object(
+                report_class, '_get_move_line', autospec=True,
+                return_value=list(base_lines)):
+            inv_taxes, used_taxes = report._get_tax_lines(move, data)
+        self.assertAlmostEqual(inv_taxes[0]['base'], 100.0)
+        self.assertAlmostEqual(inv_taxes[0]['tax'], 0.0)
+        self.assertEqual(inv_taxes[0]['move_line_rec'], base_lines)
+
+        # The template gets the precomputed tax lines,
+        # falling back to _get_tax_lines for the other moves
+        other_move = self._create_invoice(200.0).move_id
+        get_tax_lines = report_class._get_tax_lines
+        with mock.patch.object(
+                report_class, '_get_tax_lines', autospec=True,
+                side_effect=get_tax_lines) as mock_get_tax_lines:
+            values = report._get_report_values(move.ids, {
+                'ids': move.ids,
+                'form': dict(
+                    data,
+                    date_format='%d/%m/%Y',
+                    from_date=self.test_date,
+                    to_date=self.test_date,
+                    tax_registry_name='Test',
+                    fiscal_page_base=0,
+                    only_totals=False,
+                    year_footer='',
+                ),
+            })
+            inv_taxes, used_taxes = values['tax_lines'](move, data)
+            self.assertFalse(mock_get_tax_lines.called)
+            other_inv_taxes, dummy = values['tax_lines'](other_move, data)
+            self.assertEqual(mock_get_tax_lines.call_count, 1)
+        self.assertEqual(used_taxes, self.tax)
+        self.assertAlmostEqual(inv_taxes[0]['tax'], 10.0)
+        self.assertAlmostEqual(other_inv_taxes[0]['base'], 200.0)
@@ -1,4 +1,4 @@
-from odoo import fields, models
+from odoo import api, fields, models
 
 
 class AccountTax(models.Model):
@@ -9,3 +9,56 @@ class AccountTax(models.Model):
 
     vsc_exclude_vat = fields.Boolean(
         string='Exclude from VAT payable / deducted')
+
+    @api.multi
+    def get_base_balances_by_date(self):
+        """
+        Compute the `base_balance` of all the taxes with a single query,
+        grouped by tax and date of the move lines.
+
+        Dates, company and state of the moves are read from the context,
+        as `base_balance` does.
+
+        :return: dictionary {(tax id, date): base balance}
+        """
+        if not self:
+            return {}
+        tax = self[0]
+        from_date, to_date, company_ids, target_move = \
+            tax.get_context_values()
+        state_list = tax.get_target_state_list(target_move)
+        type_list = tax.get_target_type_list('regular') + \
+            tax.get_target_type_list('refund')
+        domain = tax.get_move_line_partial_domain(
+            from_date, to_date, company_ids)
+        # Taxes are filtered in the query, using the relation table
+        domain += [
+            leaf for leaf in tax.get_base_balance_domain(
+                state_list, type_list)
+            if leaf != ('tax_ids', 'in', tax.id)
+        ]
+        move_line_model = self.env['account.move.line']
+        query = move_line_model._where_calc(domain)
+        move_line_model._apply_ir_rules(query, 'read')
+        from_clause, where_clause, where_params = query.get_sql()
+        tax_ids_field = move_line_model._fields['tax_ids']
+        self.env.cr.execute("""
+            SELECT rel.{tax_column}, account_move_line.date,
+                SUM(account_move_line.balance)
+            FROM {from_clause}, {relation} rel
+            WHERE {where_clause}
+                AND rel.{line_column} = account_move_line.id
+                AND rel.{tax_column} IN %s
+            GROUP BY rel.{tax_column}, account_move_line.date
+        """.format(
+            tax_column=tax_ids_field.column2,
+            line_column=tax_ids_field.column1,
+            relation=tax_ids_field.relation,
+            from_clause=from_clause,
+            where_clause=where_clause,
+        ), where_params + [tuple(self.ids)])
+        # Same sign of `base_balance`
+        return {
+            (tax_id, date): -balance
+            for tax_id, date, balance in self.env.cr.fetchall()
+        }
@@ -1,4 +1,6 @@
 
+from collections import defaultdict
+
 from odoo import api, fields, models, _
 from odoo.exceptions import ValidationError
 from lxml import etree
@@ -116,6 +118,11 @@ class ComunicazioneLiquidazione(models.Model):
             self.taxpayer_fiscalcode = \
                 self.company_id.partner_id.fiscalcode
 
+    @api.multi
+    def compute_from_liquidazioni(self):
+        self.mapped('quadri_vp_ids').compute_from_liquidazioni()
+        return True
+
     def get_export_xml(self):
         self._validate()
         x1_Fornitura = self._export_xml_get_fornitura()
@@ -557,41 +564,90 @@ class ComunicazioneLiquidazioneVp(models.Model):
             quadro.metodo_calcolo_acconto = False
 
     def _get_tax_context(self, period):
-        return {
+        context = {
             'from_date': period.date_start,
             'to_date': period.date_end,
         }
+        company = self.comunicazione_id.company_id
+        if company:
+            context['company_id'] = company.id
+        return context
+
+    @api.multi
+    def _get_base_balances(self):
+        """
+        Base balances of the taxes of the VAT statements in the VP tables,
+        for each period of the statements.
+
+        The balances of each company are computed with a single query
+        covering all its periods and taxes.
 
-    def _compute_imponibile_operazioni_attive(self, liq, period):
+        :return: dictionary {(company id, period id, tax id): base balance}
+        """
+        periods_by_company = defaultdict(
+            lambda: self.env['date.range'])
+        taxes_by_company = defaultdict(
+            lambda: self.env['account.tax'])
+        for quadro in self:
+            company = quadro.comunicazione_id.company_id
+            for liq in quadro.liquidazioni_ids:
+                periods_by_company[company] |= liq.date_range_ids
+                taxes_by_company[company] |= (
+                    liq.debit_vat_account_line_ids |
+                    liq.credit_vat_account_line_ids).mapped('tax_id')
+
+        base_balances = defaultdict(float)
+        for company, periods in periods_by_company.items():
+            taxes = taxes_by_company[company].filtered(
+                lambda t: not t.vsc_exclude_operation)
+            if not periods or not taxes:
+                continue
+            context = {
+                'from_date': min(periods.mapped('date_start')),
+                'to_date': max(periods.mapped('date_end')),
+            }
+            if company:
+                context['company_id'] = company.id
+            balances = taxes.with_context(context) \
+                .get_base_balances_by_date()
+            for (tax_id, date), balance in balances.items():
+                for period in periods:
+                    if period.date_start <= date <= period.date_end:
+                        base_balances[company.id, period.id, tax_id] += \
+                            balance
+        return base_balances
+
+    def _get_base_balance(self, tax, period, base_balances=None):
+        if base_balances is None:
+            tax = tax.with_context(self._get_tax_context(period))
+            return tax.base_balance
+        return base_balances.get(
+            (self.comunicazione_id.company_id.id, period.id, tax.id), 0.0)
+
+    def _compute_imponibile_operazioni_attive(
+            self, liq, period, base_balances=None):
         self.ensure_one()
-        debit_taxes = self.env['account.tax']
-        for debit in liq.debit_vat_account_line_ids:
-            debit_taxes |= debit.tax_id
+        debit_taxes = liq.debit_vat_account_line_ids.mapped('tax_id')
         for debit_tax in debit_taxes:
             if debit_tax.vsc_exclude_operation:
                 continue
-            tax = debit_taxes.with_context(
-                self._get_tax_context(period)).browse(debit_tax.id)
-            self.imponibile_operazioni_attive += (
-                tax.base_balance)
+            self.imponibile_operazioni_attive += self._get_base_balance(
+                debit_tax, period, base_balances)
 
-    def _compute_imponibile_operazioni_passive(self, liq, period):
+    def _compute_imponibile_operazioni_passive(
+            self, liq, period, base_balances=None):
         self.ensure_one()
-        credit_taxes = self.env['account.tax']
-        for credit in liq.credit_vat_account_line_ids:
-            credit_taxes |= credit.tax_id
+        credit_taxes = liq.credit_vat_account_line_ids.mapped('tax_id')
         for credit_tax in credit_taxes:
             if credit_tax.vsc_exclude_operation:
                 continue
-            tax = credit_taxes.with_context(
-                self._get_tax_context(period)).browse(credit_tax.id)
-            self.imponibile_operazioni_passive -= (
-                tax.base_balance)
+            self.imponibile_operazioni_passive -= self._get_base_balance(
+                credit_tax, period, base_balances)
 
     @api.multi
     @api.onchange('liquidazioni_ids')
     def compute_from_liquidazioni(self):
-
+        base_balances = self._get_base_balances()
         for quadro in self:
             # Reset valori
             quadro._reset_values()
@@ -599,8 +655,10 @@ class ComunicazioneLiquidazioneVp(models.Model):
             for liq in quadro.liquidazioni_ids:
 
                 for period in liq.date_range_ids:
-                    quadro._compute_imponibile_operazioni_attive(liq, period)
-                    quadro._compute_imponibile_operazioni_passive(liq, period)
+                    quadro._compute_imponibile_operazioni_attive(
+                        liq, period, base_balances)
+                    quadro._compute_imponibile_operazioni_passive(
+                        liq, period, base_balances)
 
                 # Iva esigibile
                 for vat_amount in liq.debit_vat_account_line_ids:
@@ -2,6 +2,8 @@
 # Copyright 2018 Lorenzo Battistini - Agile Business Group
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+from collections import defaultdict
+
 from odoo import models, fields, api, _
 import odoo.addons.decimal_precision as dp
 from odoo.exceptions import ValidationError
@@ -55,6 +57,10 @@ class AccountPartialReconcile(models.Model):
                 ('move_id', 'in', moves.ids),
             ],
         )
+        return self._wt_select_paying_invoice(invoices)
+
+    @api.model
+    def _wt_select_paying_invoice(self, invoices):
         # If we are reconciling a vendor bill and its refund,
         # we do not need to generate Withholding Tax Moves
         # or change the reconciliation amount
@@ -66,6 +72,47 @@ class AccountPartialReconcile(models.Model):
             paying_invoice = self.env['account.invoice'].browse()
         return paying_invoice
 
+    @api.multi
+    def _wt_get_paying_invoices(self):
+        """
+        Paying invoice of each reconciliation in `self`,
+        searching the invoices of all the reconciled lines at once.
+        """
+        moves = self.mapped('debit_move_id.move_id') \
+            | self.mapped('credit_move_id.move_id')
+        invoices = self.env['account.invoice'].search(
+            [
+                ('move_id', 'in', moves.ids),
+            ],
+        )
+        paying_invoices = {}
+        for reconcile in self:
+            reconcile_moves = reconcile.debit_move_id.move_id \
+                | reconcile.credit_move_id.move_id
+            paying_invoices[reconcile] = self._wt_select_paying_invoice(
+                invoices.filtered(lambda i: i.move_id in reconcile_moves))
+        return paying_invoices
+
+    @api.multi
+    def _wt_get_reconciles_to_generate(self):
+        """
+        Reconciliations in `self` that need Withholding Tax Moves,
+        with the same criteria used when a reconciliation is created.
+        """
+        if self.env.context.get('no_generate_wt_move'):
+            return self.browse()
+        paying_invoices = self._wt_get_paying_invoices()
+        generated_reconciles = self.env['withholding.tax.move'].search([
+            ('reconcile_partial_id', 'in', self.ids),
+        ]).mapped('reconcile_partial_id')
+        return self.filtered(
+            lambda r:
+            paying_invoices[r].withholding_tax_line_ids
+            and r not in generated_reconciles
+            # Avoid re-generate wt moves if the move line is an wt move
+            and not (r.debit_move_id | r.credit_move_id).mapped(
+                'withholding_tax_generated_by_move_id'))
+
     @api.model
     def create(self, vals):
         # In case of WT The amount of reconcile mustn't exceed the tot net
@@ -92,7 +139,9 @@ class AccountPartialReconcile(models.Model):
         # Create reconciliation
         reconcile = super(AccountPartialReconcile, self).create(vals)
 
-        if paying_invoice:
+        # Wt moves of reconciliations created together
+        # are generated by the caller with `generate_wt_moves`
+        if paying_invoice and not self.env.context.get('wt_defer_moves'):
             # Avoid re-generate wt moves if the move line is an wt move.
             # It's possible if the user unreconciles a wt move under invoice
             wt_move = move_lines.mapped('withholding_tax_generated_by_move_id')
@@ -111,59 +160,73 @@ class AccountPartialReconcile(models.Model):
         """
         return vals
 
-    @api.model
+    @api.multi
     def generate_wt_moves(self):
+        """
+        Generate the Withholding Tax Moves, and their account moves,
+        of all the reconciliations in `self` at once.
+
+        :return: the generated `withholding.tax.move` records.
+        """
         wt_statement_obj = self.env['withholding.tax.statement']
         # Reconcile lines
-        line_payment_ids = []
-        line_payment_ids.append(self.debit_move_id.id)
-        line_payment_ids.append(self.credit_move_id.id)
+        line_payment_ids = self.mapped('debit_move_id').ids \
+            + self.mapped('credit_move_id').ids
         domain = [('id', 'in', line_payment_ids)]
-        rec_lines = self.env['account.move.line'].search(domain)
+        all_rec_lines = self.env['account.move.line'].search(domain)
 
         # Search statements of competence
-        wt_statements = False
-        rec_line_statement = False
-        for rec_line in rec_lines:
-            domain = [('move_id', '=', rec_line.move_id.id)]
-            wt_statements = wt_statement_obj.search(domain)
-            if wt_statements:
-                rec_line_statement = rec_line
-                break
-        # Search payment move
-        rec_line_payment = False
-        for rec_line in rec_lines:
-            if rec_line.id != rec_line_statement.id:
-                rec_line_payment = rec_line
-        # Generate wt moves
-        wt_moves = []
-        for wt_st in wt_statements:
-            amount_wt = wt_st.get_wt_competence(self.amount)
-            # Date maturity
-            p_date_maturity = False
-            payment_lines = wt_st.withholding_tax_id.payment_term.compute(
-                amount_wt,
-                rec_line_payment.date or False)
-            if payment_lines and payment_lines[0]:
-                p_date_maturity = payment_lines[0][0][0]
-            wt_move_vals = {
-                'statement_id': wt_st.id,
-                'date': rec_line_payment.date,
-                'partner_id': rec_line_statement.partner_id.id,
-                'reconcile_partial_id': self.id,
-                'payment_line_id': rec_line_payment.id,
-                'credit_debit_line_id': rec_line_statement.id,
-                'withholding_tax_id': wt_st.withholding_tax_id.id,
-                'account_move_id': rec_line_payment.move_id.id or False,
-                'date_maturity':
-                    p_date_maturity or rec_line_payment.date_maturity,
-                'amount': amount_wt
-            }
-            wt_move_vals = self._prepare_wt_move(wt_move_vals)
-            wt_move = self.env['withholding.tax.move'].create(wt_move_vals)
-            wt_moves.append(wt_move)
-            # Generate account move
-            wt_move.generate_account_move()
+        domain = [('move_id', 'in', all_rec_lines.mapped('move_id').ids)]
+        statements_by_move = defaultdict(lambda: wt_statement_obj)
+        for wt_statement in wt_statement_obj.search(domain):
+            statements_by_move[wt_statement.move_id] |= wt_statement
+
+        wt_move_vals_list = []
+        for reconcile in self:
+            rec_lines = all_rec_lines.filtered(
+                lambda l: l in (
+                    reconcile.debit_move_id | reconcile.credit_move_id))
+            wt_statements = wt_statement_obj
+            rec_line_statement = False
+            for rec_line in rec_lines:
+                wt_statements = statements_by_move[rec_line.move_id]
+                if wt_statements:
+                    rec_line_statement = rec_line
+                    break
+            if not rec_line_statement:
+                continue
+            # Search payment move
+            rec_line_payment = False
+            for rec_line in rec_lines:
+                if rec_line.id != rec_line_statement.id:
+                    rec_line_payment = rec_line
+            for wt_st in wt_statements:
+                amount_wt = wt_st.get_wt_competence(reconcile.amount)
+                # Date maturity
+                p_date_maturity = False
+                payment_lines = wt_st.withholding_tax_id.payment_term.compute(
+                    amount_wt,
+                    rec_line_payment.date or False)
+                if payment_lines and payment_lines[0]:
+                    p_date_maturity = payment_lines[0][0][0]
+                wt_move_vals = {
+                    'statement_id': wt_st.id,
+                    'date': rec_line_payment.date,
+                    'partner_id': rec_line_statement.partner_id.id,
+                    'reconcile_partial_id': reconcile.id,
+                    'payment_line_id': rec_line_payment.id,
+                    'credit_debit_line_id': rec_line_statement.id,
+                    'withholding_tax_id': wt_st.withholding_tax_id.id,
+                    'account_move_id': rec_line_payment.move_id.id or False,
+                    'date_maturity':
+                        p_date_maturity or rec_line_payment.date_maturity,
+                    'amount': amount_wt
+                }
+                wt_move_vals_list.append(
+                    reconcile._prepare_wt_move(wt_move_vals))
+        wt_moves = self.env['withholding.tax.move'].create(wt_move_vals_list)
+        # Generate account moves
+        wt_moves.generate_account_move()
         return wt_moves
 
     @api.multi
@@ -303,6 +366,22 @@ class AccountAbstractPayment(models.AbstractModel):
         return res
 
 
+class AccountPayment(models.Model):
+    _inherit = "account.payment"
+
+    @api.multi
+    def post(self):
+        """
+        Generate the Withholding Tax Moves of all the payments at once
+        """
+        res = super(
+            AccountPayment, self.with_context(wt_defer_moves=True)).post()
+        reconciles = self.mapped('move_line_ids.matched_debit_ids') \
+            | self.mapped('move_line_ids.matched_credit_ids')
+        reconciles._wt_get_reconciles_to_generate().generate_wt_moves()
+        return res
+
+
 class AccountMoveLine(models.Model):
     _inherit = "account.move.line"
 
@@ -237,11 +237,10 @@ class WithholdingTaxStatement(models.Model):
         amount_wt = 0
         for st in self:
             if st.invoice_id:
-                domain = [
-                    ('invoice_id', '=', st.invoice_id.id),
-                    ('withholding_tax_id', '=', st.withholding_tax_id.id)]
-                wt_inv = self.env['account.invoice.withholding.tax'].search(
-                    domain, limit=1)
+                # Invoice lines are read once for all the statements
+                wt_inv = st.invoice_id.withholding_tax_line_ids.filtered(
+                    lambda l: l.withholding_tax_id == st.withholding_tax_id
+                )[:1]
                 if wt_inv:
                     amount_base = st.invoice_id.amount_untaxed * \
                         (amount_reconcile /
@@ -318,14 +317,11 @@ class WithholdingTaxMove(models.Model):
                      state: {}').format(rec.state)))
         return super(WithholdingTaxMove, self).unlink()
 
-    def generate_account_move(self):
+    def _prepare_account_move(self):
         """
-        Creation of account move to increase credit/debit vs tax authority
+        Values of the account move to increase credit/debit vs tax authority
         """
-        if self.wt_account_move_id:
-            raise ValidationError(
-                _('Warning! Wt account move already exists: %s') % (
-                    self.wt_account_move_id.name))
+        self.ensure_one()
         # Move - head
         move_vals = {
             'ref': _('WT %s - %s') % (
@@ -382,11 +378,27 @@ class WithholdingTaxMove(models.Model):
             move_lines.append((0, 0, ml_vals))
 
         move_vals['line_ids'] = move_lines
-        move = self.env['account.move'].create(move_vals)
-        move.post()
-        # Save move in the wt move
-        self.wt_account_move_id = move.id
+        return move_vals
 
+    def generate_account_move(self):
+        """
+        Creation of account move to increase credit/debit vs tax authority
+        """
+        for wt_move in self:
+            if wt_move.wt_account_move_id:
+                raise ValidationError(
+                    _('Warning! Wt account move already exists: %s') % (
+                        wt_move.wt_account_move_id.name))
+        moves = self.env['account.move'].create(
+            [wt_move._prepare_account_move() for wt_move in self])
+        moves.post()
+        for wt_move, move in zip(self, moves):
+            # Save move in the wt move
+            wt_move.wt_account_move_id = move.id
+            wt_move._reconcile_account_move(move)
+
+    def _reconcile_account_move(self, move):
+        self.ensure_one()
         # Find lines for reconcile
         line_to_reconcile = False
         for line in move.line_ids:
@@ -277,3 +277,35 @@ class TestWithholdingTax(TransactionCase):
             ('reconcile_partial_id', '=', reconciliation.id),
         ])
         self.assertFalse(withholding_tax_moves)
+
+    def test_batch_payment(self):
+        """
+        Paying several bills at once generates the Withholding Tax Moves
+        of every bill, each with its own account move.
+        """
+        bills = self.invoice | self._create_bill()
+        ctx = {
+            'active_model': 'account.invoice',
+            'active_ids': bills.ids,
+            }
+        register_payments = self.env['account.register.payments']\
+            .with_context(ctx).create({
+                'payment_date': time.strftime('%Y') + '-07-15',
+                'journal_id': self.journal_bank.id,
+                'payment_method_id': self.env.ref(
+                    "account.account_payment_method_manual_out").id,
+                'group_invoices': False,
+                })
+        register_payments.create_payments()
+
+        wt_statements = self.env['withholding.tax.statement'].search([
+            ('invoice_id', 'in', bills.ids),
+        ])
+        self.assertEqual(len(wt_statements), 2)
+        self.assertEqual(wt_statements.mapped('amount'), [200, 200])
+        wt_moves = wt_statements.mapped('move_ids')
+        self.assertEqual(len(wt_moves), 2)
+        self.assertEqual(len(wt_moves.mapped('wt_account_move_id')), 2)
+        for bill in bills:
+            self.assertEqual(bill.state, 'paid')
+            self.assertEqual(bill.amount_net_pay_residual, 0)